@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from generator.config import GeneratorConfig
+from generator.generator import Generator
+from utils import Database, PostgresSink
+from utils.models import Event, EventType, Order, OrderLine, Product, User
+
+
+class RecordingPool:
+    """
+    stands in for an asyncpg pool, counts statements and rows instead of sending them
+    """
+
+    def __init__(
+        self,
+        columns: dict[str, list[str]] | None = None,
+        types: dict[str, str] | None = None,
+        delay: float = 0,
+        record: bool = False,
+    ):
+        self.columns = columns or {}
+        self.types = types or {}
+        # seconds every statement takes
+        self.delay = delay
+        self.calls: list[tuple] | None = [] if record else None
+        self.statements = 0
+        self.rows = 0
+
+    async def _call(self, *call):
+        self.statements += 1
+        if self.calls is not None:
+            self.calls.append(call)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def execute(self, query, *args):
+        await self._call("execute", query, args)
+
+    async def executemany(self, query, args):
+        args = list(args)
+        await self._call("executemany", query, args)
+        self.rows += len(args)
+
+    async def fetch(self, query, *args):
+        await self._call("fetch", query, args)
+        if "pg_attribute" in query:
+            return [
+                {"name": name, "type": self.types.get(name, "text")}
+                for name in self.columns[args[0]]
+            ]
+        return []
+
+    async def copy_records_to_table(self, table_name, records, **kwargs):
+        await self._call("copy", table_name, {"records": records, **kwargs})
+        self.rows += len(records)
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        if self.calls is not None:
+            self.calls.append(("begin",))
+        yield
+        if self.calls is not None:
+            self.calls.append(("commit",))
+
+    async def close(self):
+        await asyncio.sleep(0)
+
+
+def fake_columns(schema: str) -> dict[str, list[str]]:
+    return {
+        f'{schema}."{model.__name__.lower()}"': list(model.__dataclass_fields__)
+        for model in (User, Product, Event, Order, OrderLine)
+    }
+
+
+def new_event(**fields) -> Event:
+    """a browsing event, fields override the defaults"""
+    return Event.new(
+        **{
+            "user_name": "user",
+            "ip_address": "127.0.0.1",
+            "user_agent": "agent",
+            "event_type": EventType.BROWSING,
+            "metadata": {"page": "home", "scroll_depth": 1, "duration_ms": 1200},
+            **fields,
+        }
+    )
+
+
+def make_generator(
+    db: Database, users: int = 100, products: int = 100, **options
+) -> Generator:
+    """a generator writing to db, with catalogs filled in instead of loaded"""
+    generator = Generator(
+        GeneratorConfig(schema=db.schema, **options), logging.getLogger("fakes")
+    )
+    generator.db_writer = db
+    generator.sink = PostgresSink(db)
+    generator.users.extend(
+        [
+            {
+                "id": f"u{i}",
+                "username": f"user{i}",
+                "ip_address": "127.0.0.1",
+                "user_agent": "agent",
+            }
+            for i in range(users)
+        ]
+    )
+    generator.products.extend(
+        [
+            {"id": f"p{i}", "main_category": "main", "sub_category": "sub"}
+            for i in range(products)
+        ]
+    )
+    return generator
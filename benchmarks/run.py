@@ -0,0 +1,266 @@
+"""benchmarks for the generator hot paths, see python -m benchmarks.run --help"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import time
+from typing import Awaitable, Callable
+
+import asyncpg
+from faker import Faker
+
+from benchmarks.fakes import RecordingPool, fake_columns, make_generator, new_event
+from generator.synth import UserSynthesizer
+from user_workflow_state_machine.workflow_sm import HANDLERS, UserWorkflowStateMachine
+from utils import Database, EventBatcher
+from utils.codecs import register_codecs
+from utils.models import Event, Order, OrderLine, Product, User
+from utils.rng import random_uuid
+
+logger = logging.getLogger("benchmarks")
+
+Case = tuple[str, Callable[[], object | Awaitable[object]], int]
+
+
+async def measure(fn: Callable, number: int, repeat: int) -> float:
+    """best seconds per call over repeat runs of number calls"""
+    # warm up once, which also tells whether fn hands back something to await
+    warmup = fn()
+    is_async = inspect.isawaitable(warmup)
+    if is_async:
+        await warmup
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if is_async:
+            for _ in range(number):
+                await fn()
+        else:
+            for _ in range(number):
+                fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+class NoopHandlers:
+    pass
+
+
+for _name in HANDLERS.values():
+
+    async def _noop(self, _context_id):
+        pass
+
+    setattr(NoopHandlers, _name, _noop)
+
+
+def fake_cases(scale: float) -> list[Case]:
+    db = Database(
+        logger=logger, schema="bench", conn=RecordingPool(fake_columns("bench"))
+    )
+    events = [new_event() for _ in range(500)]
+    columns = list(Event.__dataclass_fields__)
+    sm = UserWorkflowStateMachine(handlers=NoopHandlers())
+    faker = Faker()
+    synth = UserSynthesizer(faker=faker)
+
+    generator = make_generator(db)
+    generator.event_batcher = EventBatcher(sink=generator.sink, logger=logger)
+
+    async def session():
+        generator.event_batcher.start()
+        await generator.session()
+
+    def n(number: int) -> int:
+        return max(1, int(number * scale))
+
+    return [
+        ("normalize_500_events", lambda: db._normalize(events), n(200)),
+        ("rows_500_events", lambda: db._rows(events), n(100)),
+        (
+            "upsert_sql_build",
+            lambda: db._upsert_query("EVENT", columns, [], None),
+            n(20000),
+        ),
+        ("upsert_500_events", lambda: db.upsert(table="EVENT", data=events), n(100)),
+        ("sm_handle", sm.handle, n(5000)),
+        ("user_new", lambda: User.new(faker), n(500)),
+        ("event_new", new_event, n(20000)),
+        ("user_synth_1000", lambda: synth.batch(1000), n(20)),
+        ("session", session, n(200)),
+    ]
+
+
+async def pg_cases(dsn: str, scale: float):
+    """cases against a real server, returns them with a cleanup coroutine"""
+    schema = f"bench_{os.getpid()}"
+    pool = await asyncpg.create_pool(dsn=dsn, init=register_codecs)
+    db = Database(logger=logger, schema=schema, conn=pool, native_json=True)
+    ddls = [model.ddl(schema) for model in (User, Product, Event, Order, OrderLine)]
+    await db.create_tables(f"CREATE SCHEMA IF NOT EXISTS {schema}", ddls)
+
+    user = User.new(Faker())
+    product = Product.new(
+        name="bench",
+        main_category="main",
+        sub_category="sub",
+        image="",
+        link="",
+        ratings=None,
+        no_of_ratings=None,
+        discount_price=None,
+        actual_price=None,
+    )
+    await db.upsert(table="USER", data=[user])
+    await db.upsert(table="PRODUCT", data=[product])
+
+    events = [new_event() for _ in range(500)]
+    bulk_events = [new_event() for _ in range(5000)]
+
+    def rekeyed(batch: list[Event]) -> list[Event]:
+        # EVENT keeps every row, a repeated id would violate its primary key
+        for event in batch:
+            event.id = random_uuid()
+        return batch
+
+    async def place_order():
+        order = Order.new(u_id=user.id)
+        lines = [
+            OrderLine.new(order_id=order.id, product_id=product.id, quantity=1)
+            for _ in range(3)
+        ]
+        await db.insert_atomic(
+            [("order", [order]), ("orderline", lines), ("EVENT", [new_event()])]
+        )
+
+    async def cleanup():
+        await db.drop_schema()
+        await db.close()
+
+    def n(number: int) -> int:
+        return max(1, int(number * scale))
+
+    cases = [
+        (
+            "pg_upsert_500_events",
+            lambda: db.upsert(table="EVENT", data=rekeyed(events)),
+            n(20),
+        ),
+        (
+            "pg_bulk_upsert_5000_events",
+            lambda: db.bulk_upsert(table="EVENT", data=rekeyed(bulk_events)),
+            n(10),
+        ),
+        ("pg_place_order", place_order, n(200)),
+    ]
+    return cases, cleanup
+
+
+async def run(
+    dsn: str | None = None, scale: float = 1.0, repeat: int = 5, only=None
+) -> dict:
+    cases = fake_cases(scale)
+    cleanup = None
+    if dsn:
+        extra, cleanup = await pg_cases(dsn, scale)
+        cases += extra
+
+    results = {}
+    try:
+        for name, fn, number in cases:
+            if only and name not in only:
+                continue
+            per_op = await measure(fn, number=number, repeat=repeat)
+            results[name] = {"per_op_us": per_op * 1e6, "ops_per_sec": 1 / per_op}
+            logger.info(f"{name}: {per_op * 1e6:.2f}us/op")
+    finally:
+        if cleanup:
+            await cleanup()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """one row per case present in both runs, regressed when slower than tolerance allows"""
+    rows = []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        ratio = cur["per_op_us"] / base["per_op_us"]
+        rows.append(
+            {
+                "name": name,
+                "baseline_us": base["per_op_us"],
+                "current_us": cur["per_op_us"],
+                "ratio": ratio,
+                "regressed": ratio > 1 + tolerance,
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks")
+    parser.add_argument("--output", help="write results as json to this file")
+    parser.add_argument("--baseline", help="json results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline, 0.25 is 25%%",
+    )
+    parser.add_argument("--dsn", help="also run the postgres cases against this dsn")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiplier for iterations per case"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="comma separated case names")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # sessions log every iteration, keep that out of the timings
+    logging.getLogger("benchmarks").setLevel(logging.WARNING)
+
+    only = set(args.only.split(",")) if args.only else None
+    current = asyncio.run(run(args.dsn, args.scale, args.repeat, only))
+    for name, res in current["results"].items():
+        print(
+            f"{name:32} {res['per_op_us']:12.2f} us/op {res['ops_per_sec']:14.1f} ops/s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(current, fp, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as fp:
+        baseline = json.load(fp)
+    rows = compare(current, baseline, args.tolerance)
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else "ok"
+        print(
+            f"{row['name']:32} {row['baseline_us']:12.2f} -> {row['current_us']:12.2f} us/op "
+            f"x{row['ratio']:.2f} {flag}"
+        )
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
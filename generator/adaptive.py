@@ -0,0 +1,192 @@
+"""sessions in flight sized by an aimd controller on write latency and pool wait"""
+
+import asyncio
+from collections import deque
+from logging import Logger
+from typing import Callable
+
+from utils.metrics import REGISTRY, MetricsRegistry, bucket_quantile
+
+# statements that write rows, see Database._observe
+WRITE_OPS = ("upsert", "copy", "merge", "atomic", "update", "delete")
+
+
+class ConcurrencyLimit:
+    """a semaphore whose size can change while it is held"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        while self.active >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done():
+                    # woken and cancelled at once, hand the slot on
+                    self._wake()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def resize(self, limit: int):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *_):
+        self.release()
+
+
+class _Window:
+    """quantiles of a set of histograms over the time since the last call"""
+
+    def __init__(self, metrics: MetricsRegistry, name: str, ops: tuple[str, ...]):
+        self.metrics = metrics
+        self.name = name
+        self.ops = ops
+        self._last: dict[int, list[int]] = {}
+
+    def take(self, q: float) -> tuple[float, int]:
+        """q-th quantile and number of observations since the last take"""
+        buckets = None
+        window = None
+        for labels, histogram in self.metrics.series(self.name):
+            if self.ops and labels.get("op") not in self.ops:
+                continue
+            last = self._last.get(id(histogram), [0] * len(histogram.counts))
+            counts = list(histogram.counts)
+            self._last[id(histogram)] = counts
+            delta = [c - p for c, p in zip(counts, last)]
+            if window is None:
+                buckets, window = histogram.buckets, delta
+            else:
+                window = [w + d for w, d in zip(window, delta)]
+        if window is None:
+            return 0.0, 0
+        return bucket_quantile(buckets, window, q), sum(window)
+
+
+class AimdController:
+    """drives resize(limit) from write p99, pool wait and rows written per interval"""
+
+    def __init__(
+        self,
+        resize: Callable[[int], None],
+        rows: Callable[[], int],
+        logger: Logger,
+        limit: int,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        latency_budget: float = 0.05,
+        wait_budget: float = 0.01,
+        step: int = 5,
+        backoff: float = 0.75,
+        tolerance: float = 0.05,
+        interval: float = 2.0,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.resize = resize
+        self.rows = rows
+        self.logger = logger
+        self.limit = limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_budget = latency_budget
+        self.wait_budget = wait_budget
+        self.step = step
+        self.backoff = backoff
+        # an increase that loses more than this share of rows/sec is undone
+        self.tolerance = tolerance
+        self.interval = interval
+        metrics = metrics or REGISTRY
+        self._latency = _Window(metrics, "db_statement_seconds", WRITE_OPS)
+        self._wait = _Window(metrics, "db_pool_acquire_seconds", ())
+        self._decisions = {
+            action: metrics.counter(
+                "adaptive_decisions_total",
+                "concurrency controller decisions",
+                action=action,
+            )
+            for action in ("increase", "decrease", "hold")
+        }
+        self._last_action = "hold"
+        self._last_rate = 0.0
+        self.best_rate = 0.0
+        self.best_limit = limit
+
+    def decide(
+        self, latency: float, wait: float, rate: float, writes: int
+    ) -> tuple[int, str, str]:
+        """next limit, the action and why, for one window"""
+        if not writes:
+            return self.limit, "hold", "no writes in window"
+        if latency > self.latency_budget:
+            reason = f"write p99 {latency * 1000:.1f}ms over budget"
+            return self._decrease(), "decrease", reason
+        if wait > self.wait_budget:
+            reason = f"pool wait p99 {wait * 1000:.1f}ms over budget"
+            return self._decrease(), "decrease", reason
+        if self._last_action == "increase" and rate < self._last_rate * (
+            1 - self.tolerance
+        ):
+            limit = max(self.min_limit, self.limit - self.step)
+            return limit, "decrease", "throughput fell after increase"
+        if self.limit >= self.max_limit:
+            return self.limit, "hold", "at max limit"
+        return min(self.max_limit, self.limit + self.step), "increase", "within budget"
+
+    def _decrease(self) -> int:
+        return max(self.min_limit, int(self.limit * self.backoff))
+
+    def tick(self, elapsed: float, rows: int):
+        latency, writes = self._latency.take(0.99)
+        wait, _ = self._wait.take(0.99)
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        limit, action, reason = self.decide(latency, wait, rate, writes)
+        self.logger.info(
+            f"adaptive: {action} {self.limit} -> {limit} ({reason}), "
+            f"write p99 {latency * 1000:.1f}ms, pool wait p99 {wait * 1000:.1f}ms, "
+            f"{rate:.0f} rows/s"
+        )
+        self._decisions[action].inc()
+        if writes and latency <= self.latency_budget and rate > self.best_rate:
+            self.best_rate, self.best_limit = rate, self.limit
+        self._last_action = action
+        self._last_rate = rate
+        if limit != self.limit:
+            self.limit = limit
+            self.resize(limit)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_time = loop.time()
+        last_rows = self.rows()
+        # drop whatever was observed before the controller started
+        self._latency.take(0.99)
+        self._wait.take(0.99)
+        while True:
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            rows = self.rows()
+            self.tick(now - last_time, rows - last_rows)
+            last_time, last_rows = now, rows
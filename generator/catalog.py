@@ -0,0 +1,120 @@
+import asyncio
+import dataclasses
+import random
+from logging import Logger
+from typing import Any, Sequence
+
+from utils import Database
+
+
+class Catalog:
+    """in memory copy of a few columns of a table, one list per column"""
+
+    def __init__(self, table: str, columns: list[str]):
+        self.table = table
+        self.columns = columns
+        # lists, or read only columns of a mapped snapshot until extended
+        self._data: dict[str, Sequence[Any]] = {col: [] for col in columns}
+        self._refresh_task: asyncio.Task | None = None
+        # False when it holds a slice of the table, refresh would load it whole
+        self.refreshable = True
+
+    def __len__(self) -> int:
+        return len(self._data[self.columns[0]])
+
+    def attach(self, columns: dict[str, Sequence[Any]]):
+        """serve rows from columns as they are, without copying them"""
+        self._data = {col: columns[col] for col in self.columns}
+
+    def _writable(self):
+        if not all(isinstance(values, list) for values in self._data.values()):
+            self._data = {col: list(values) for col, values in self._data.items()}
+
+    def extend(self, rows: list):
+        self._writable()
+        for row in rows:
+            is_dataclass = dataclasses.is_dataclass(row)
+            for col in self.columns:
+                value = getattr(row, col) if is_dataclass else row[col]
+                self._data[col].append(value)
+
+    def extend_columns(self, columns: dict[str, list]):
+        self._writable()
+        for col in self.columns:
+            self._data[col].extend(columns[col])
+
+    def row(self, index: int) -> dict[str, Any]:
+        return {col: self._data[col][index] for col in self.columns}
+
+    def sample(self, rng: random.Random | None = None) -> dict[str, Any]:
+        if not len(self):
+            raise LookupError(f"catalog for {self.table} is empty")
+        return self.row((rng or random).randrange(len(self)))
+
+    def sample_many(
+        self, k: int, rng: random.Random | None = None
+    ) -> list[dict[str, Any]]:
+        """k distinct rows, or every row when the catalog is smaller than k"""
+        indexes = (rng or random).sample(range(len(self)), min(k, len(self)))
+        return [self.row(i) for i in indexes]
+
+    def columns_data(self) -> dict[str, Sequence[Any]]:
+        return dict(self._data)
+
+    async def count(self, db: Database) -> int:
+        res = await db.select(table=self.table, columns=["count(*) AS count"])
+        return res[0]["count"]
+
+    async def check(self, db: Database) -> dict:
+        """row count and smallest and largest id, changes when rows are recreated"""
+        key = self.columns[0]
+        # one row off each end of the primary key index, ids compared as uuids
+        count, first, last = await asyncio.gather(
+            self.count(db),
+            db.select(table=self.table, columns=[key], order_by=[key], limit=1),
+            db.select(
+                table=self.table, columns=[key], order_by=[f"{key} DESC"], limit=1
+            ),
+        )
+        return {
+            "rows": count,
+            "first": str(first[0][key]) if first else None,
+            "last": str(last[0][key]) if last else None,
+        }
+
+    async def load(self, db: Database):
+        data = {col: [] for col in self.columns}
+        # ordered, so seeded runs sample the same rows from the same table
+        async for record in db.iterate(
+            table=self.table, columns=self.columns, order_by=[self.columns[0]]
+        ):
+            for col in self.columns:
+                data[col].append(record[col])
+        # swap at once so sessions never see a half loaded catalog
+        self._data = data
+
+    def start_refresh(self, db: Database, logger: Logger, interval: float = 30):
+        if self._refresh_task is None and self.refreshable:
+            self._refresh_task = asyncio.create_task(
+                self._refresh(db, logger, interval)
+            )
+
+    async def stop_refresh(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+    async def _refresh(self, db: Database, logger: Logger, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await self.count(db) != len(self):
+                    await self.load(db)
+                    logger.info(f"reloaded {self.table} catalog, {len(self)} rows")
+            except Exception as e:
+                logger.warning(f"error refreshing {self.table} catalog: {e}")
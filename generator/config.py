@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from generator.load import LoadProfile
+from user_workflow_state_machine.workflow_sm import TransitionTable
+
+
+@dataclass
+class GeneratorConfig:
+    """options of a run, built once by main.py and copied per worker"""
+
+    user_count: int = 0
+    schema: str = "test"
+    truncate_table: bool = False
+    rebuild_database: bool = False
+    bulk_threshold: int = 1000
+    sessions: int = 100
+    concurrency: int = 50
+    profile: LoadProfile | None = None
+    duration: float | None = None
+    load_target: str = "sessions"
+    soak: bool = False
+    drain_timeout: float = 30
+    user_batch_size: int = 50000
+    transitions: TransitionTable | None = None
+    backfill_sessions: int = 0
+    backfill_span: timedelta = timedelta(days=1)
+    metrics_path: str | None = None
+    metrics_interval: float = 10
+    sink: tuple[str, str | None] = ("postgres", None)
+    record_path: str | None = None
+    seed: int | None = None
+    worker: int = 0
+    products_csv: str = "static/products.csv"
+    product_chunk_size: int = 50000
+    parse_workers: int | None = None
+    catalog_snapshot: str | None = "static/.cache/catalog.snapshot"
+    pool_size: int = 10
+    adaptive: bool = False
+    # seconds
+    latency_budget: float = 0.05
+    max_concurrency: int = 500
+    # bytes
+    max_wal_lag: int | None = None
+    replication_slot: str | None = None
+    event_partition: str | None = None
+    partitions_ahead: int = 2
+    event_retention: timedelta | None = None
+    detach_expired: bool = False
+    event_brin: bool = False
+    mutation_mix: tuple[int, int, int] | None = None
+    recent_orders: int = 100_000
+    stamp_path: str | None = None
+    stamp_rate: float = 0.01
@@ -1,36 +1,127 @@
 import asyncio
+import os
+import random
+import signal
+from datetime import datetime, timedelta
 
-from utils import Database
+from utils import Database, EventBatcher, PendingWrites, Sink
 from faker import Faker
 from utils.models import User, Product, Event, Order, OrderLine
+from utils.metrics import REGISTRY
+from utils.cdc import StampingSink
+from utils.replay import RecordingSink
+from utils.rng import derive_seed, new_rng, random_uuid
+from utils.sinks import open_sink
+from utils.utils import timeit
 import logging
-import aiofiles
-from aiocsv import AsyncReader
 import traceback
-from asyncpg import Record
 from user_workflow_state_machine.workflow_sm import UserWorkflowStateMachine
 from user_workflow_state_machine.state_handlers import UserStateHandlers
+from generator.adaptive import AimdController, ConcurrencyLimit
+from generator.catalog import Catalog
+from generator.config import GeneratorConfig
+from generator.load import OpenLoopScheduler
+from generator.mutations import MutationStage, RecentOrders
+from generator.partitions import INTERVALS, PartitionManager
+from generator.products import ProductCsv
+from generator.replication import ReplicationMonitor
+from generator.snapshot import CatalogSnapshot, remove_snapshot, write_snapshot
+from generator.synth import SessionSynthesizer, UserSynthesizer, records
 
 
 class Generator:
-    def __init__(
-        self,
-        user_count: int,
-        schema: str,
-        logger: logging.Logger,
-        truncate_table: bool = False,
-        rebuild_database: bool = False,
-    ) -> None:
-        self.user_count = user_count
-        self.schema = schema
+    def __init__(self, config: GeneratorConfig, logger: logging.Logger) -> None:
+        self.config = config
+        self.user_count = config.user_count
+        self.schema = config.schema
 
+        # every session, worker and synthesizer draws from its own stream of
+        # the run seed, so a seeded run repeats however it is scheduled
+        self.seed = config.seed
+        self.worker = config.worker
         self.faker = Faker()
+        if config.seed is not None:
+            self.faker.seed_instance(derive_seed(config.seed, config.worker, "faker"))
+        self._sessions_started = 0
+        # parsed in chunks over parse_workers processes, cached by file hash
+        self.products_csv = config.products_csv
+        self.product_chunk_size = config.product_chunk_size
+        self.parse_workers = config.parse_workers
+        # catalogs loaded from the database are dumped here, later loads map it
+        self.catalog_snapshot = config.catalog_snapshot
+        self._snapshot: CatalogSnapshot | None = None
         self.tables = [User, Product, Event, Order, OrderLine]
 
         self.db_writer: Database | None = None
+        # every generated row goes through the sink, see utils.sinks.parse_sink
+        self.sink_spec = config.sink
+        self.sink: Sink | None = None
+        # every write is also logged here for replay
+        self.record_path = config.record_path
+        # write times of sampled rows, for utils.cdc.analyze
+        self.stamp_path = config.stamp_path
+        self.stamp_rate = config.stamp_rate
+        self.event_batcher: EventBatcher | None = None
+        # sessions sample users and products from memory instead of the database
+        self.users = Catalog(
+            table="USER", columns=["id", "username", "ip_address", "user_agent"]
+        )
+        self.products = Catalog(
+            table="PRODUCT", columns=["id", "main_category", "sub_category"]
+        )
         self.logger: logging.Logger = logger
-        self.truncate_table = truncate_table
-        self.rebuild_database = rebuild_database
+        self.truncate_table = config.truncate_table
+        self.rebuild_database = config.rebuild_database
+        # batches bigger than this go over COPY instead of INSERT
+        self.bulk_threshold = config.bulk_threshold
+        # users are synthesized and written this many at a time
+        self.user_batch_size = config.user_batch_size
+        # compiled once, shared by every session
+        self.transitions = config.transitions
+        # offline mode, sessions are synthesized in batches and bulk written
+        self.backfill_sessions = config.backfill_sessions
+        self.backfill_span = config.backfill_span
+        self.sessions = config.sessions
+        self.concurrency = config.concurrency
+        # sessions in flight, resized by the controller when adaptive
+        self.limit = ConcurrencyLimit(config.concurrency)
+        self.adaptive = config.adaptive
+        self.latency_budget = config.latency_budget
+        self.max_concurrency = max(config.max_concurrency, config.concurrency)
+        self.controller: AimdController | None = None
+        # connections per process, min and max alike
+        self.pool_size = config.pool_size
+        # new sessions wait while a logical slot retains more wal than this
+        self.max_wal_lag = config.max_wal_lag
+        self.replication_slot = config.replication_slot
+        self.lag_monitor: ReplicationMonitor | None = None
+        # EVENT ranged by created_at, "hour" or "day" per partition
+        self.event_partition = config.event_partition
+        self.partitions_ahead = config.partitions_ahead
+        self.event_retention = config.event_retention
+        self.detach_expired = config.detach_expired
+        self.event_brin = config.event_brin
+        # insert:update:delete, orders written are kept for the mutation stage
+        self.mutation_mix = config.mutation_mix
+        self.recent_orders = (
+            RecentOrders(config.recent_orders) if config.mutation_mix else None
+        )
+        self.mutations: MutationStage | None = None
+        self.sessions_completed = 0
+        # with a profile, concurrency caps sessions in flight instead
+        self.profile = config.profile
+        self.duration = config.duration
+        self.load_target = config.load_target
+        self.scheduler: OpenLoopScheduler | None = None
+        # without a profile, soak keeps concurrency sessions busy until duration
+        self.soak = config.soak
+        self.drain_timeout = config.drain_timeout
+        self.sessions_failed = 0
+        self.pending = PendingWrites()
+        self._stop = asyncio.Event()
+        # prometheus text, or a json snapshot when the path ends in .json
+        self.metrics_path = config.metrics_path
+        self.metrics_interval = config.metrics_interval
 
     async def run_ddl(self, db_writer: Database, rebuild_database: bool = False):
         if rebuild_database:
@@ -39,32 +130,75 @@ class Generator:
         # create schema first
         schema_str = f"CREATE SCHEMA IF NOT EXISTS {self.schema}"
 
-        ddls = [table.ddl("test") for table in self.tables]
+        ddls = [
+            (
+                table.ddl(
+                    self.schema,
+                    partitioned=bool(self.event_partition),
+                    brin=self.event_brin,
+                )
+                if table is Event
+                else table.ddl(self.schema)
+            )
+            for table in self.tables
+        ]
         await db_writer.create_tables(schema_str=schema_str, ddls=ddls)
 
+        if self.event_partition:
+            manager = self.partition_manager(db_writer)
+            # backfilled rows go back as far as the span
+            back = self.backfill_span if self.backfill_sessions else timedelta()
+            await manager.ensure(back=back)
+            await manager.expire()
+
+    def partition_manager(self, db_writer: Database) -> PartitionManager:
+        return PartitionManager(
+            db=db_writer,
+            logger=self.logger,
+            table="EVENT",
+            interval=INTERVALS[self.event_partition],
+            ahead=self.partitions_ahead,
+            retention=self.event_retention,
+            detach=self.detach_expired,
+        )
+
+    async def connect(self):
+        # create database writer
+        self.db_writer = await Database.create(
+            user="postgres",
+            database="test_database",
+            password="test_password",
+            port=5432,
+            host="localhost",
+            logger=self.logger,
+            schema=self.schema,
+            min_size=self.pool_size,
+            max_size=self.pool_size,
+        )
+
     async def initialize(self, skip_init: bool = False):
         tasks = []
         try:
-            # create database writer
-            self.db_writer = await Database.create(
-                user="postgres",
-                database="test_database",
-                password="test_password",
-                port=5432,
-                host="localhost",
-                logger=self.logger,
-                schema=self.schema,
-            )
+            if self.uses_database:
+                await self.connect()
+            self.open_sink()
 
             if skip_init:
+                if not self.uses_database:
+                    raise ValueError("skip_init loads users from postgres")
                 self.logger.warning("skipping creating database")
+                await self.load_catalogs()
                 return True
 
-            # run ddl
-            await self.run_ddl(self.db_writer, self.rebuild_database)
+            if self.uses_database:
+                # run ddl
+                await self.run_ddl(self.db_writer, self.rebuild_database)
 
-            if self.truncate_table:
-                await self.truncate_tables(self.db_writer)
+                if self.truncate_table:
+                    await self.truncate_tables(self.db_writer)
+
+                # the snapshot would map ids of rows that may be gone after this
+                remove_snapshot(self.catalog_snapshot)
 
             # create users
             create_user_task = asyncio.create_task(self.create_users())
@@ -75,70 +209,157 @@ class Generator:
             tasks.append(create_products_task)
 
             await asyncio.gather(*tasks)
+
+            # rows created by earlier runs are only known to the database
+            if self.uses_database and not (
+                self.truncate_table or self.rebuild_database
+            ):
+                await self.load_catalogs()
         except Exception as e:
             self.logger.error(f"error initializing generator: {e}")
             traceback.print_exc()
             return False
         return True
 
+    @timeit
+    async def load_catalogs(self, save: bool = True):
+        """save writes the snapshot when it is missing or stale"""
+        catalogs = (self.users, self.products)
+        checks = {}
+        if self.catalog_snapshot:
+            results = await asyncio.gather(*(c.check(self.db_writer) for c in catalogs))
+            checks = {c.table: check for c, check in zip(catalogs, results)}
+        if await self._attach_snapshot(checks):
+            source = "snapshot"
+        else:
+            await asyncio.gather(
+                self.users.load(self.db_writer), self.products.load(self.db_writer)
+            )
+            source = "database"
+            if self.catalog_snapshot and save:
+                await asyncio.to_thread(
+                    write_snapshot,
+                    self.catalog_snapshot,
+                    self.schema,
+                    {c.table: c.columns_data() for c in catalogs},
+                    checks,
+                )
+        self.logger.info(
+            f"loaded catalogs from {source}, users: {len(self.users)}, products: {len(self.products)}"
+        )
+
+    async def _attach_snapshot(self, checks: dict[str, dict]) -> bool:
+        """maps the catalog snapshot when its checks still match the tables"""
+        path = self.catalog_snapshot
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            snapshot = CatalogSnapshot(path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"ignoring catalog snapshot {path}: {e}")
+            return False
+
+        catalogs = (self.users, self.products)
+        stale = snapshot.schema != self.schema or any(
+            not snapshot.has(c.table, c.columns)
+            or snapshot.rows(c.table) != checks[c.table]["rows"]
+            or snapshot.check(c.table) != checks[c.table]
+            for c in catalogs
+        )
+        if stale:
+            self.logger.info(f"catalog snapshot {path} is stale, reloading")
+            snapshot.close()
+            return False
+
+        for catalog in catalogs:
+            catalog.attach(snapshot.columns(catalog.table))
+        self._snapshot = snapshot
+        return True
+
     async def truncate_tables(self, db_writer: Database):
+        tables = [table for table in self.tables if table is not Event]
+        if self.event_partition:
+            await self.partition_manager(db_writer).truncate()
+        else:
+            tables.append(Event)
         await db_writer.truncate_tables(
-            table_names=[table.__name__ for table in self.tables]
+            table_names=[table.__name__ for table in tables]
         )
 
-    async def create_users(self):
-        users = []
-        for _ in range(self.user_count):
-            u = User.new(faker=self.faker)
-            users.append(u)
-
-        await self.db_writer.upsert(
-            data=users, table="USER", conflict_keys=["username", "id"]
-        )
-
-    async def create_products(self):
-        async with aiofiles.open("static/products.csv", mode="r") as pfp:
-            reader = AsyncReader(pfp)
-            # skip header
-            await anext(reader)
-            products = []
-            async for row in reader:
-                try:
-                    ratings = None if row[5] == "" else float(row[5])
-                    no_of_ratings = (
-                        None if row[6] == "" else int(row[6].replace(",", ""))
-                    )
-                    discount_price = (
-                        None
-                        if row[7] == ""
-                        else float(row[7].replace("₹", "").replace(",", ""))
-                    )
-                    actual_price = (
-                        None
-                        if row[8] == ""
-                        else float(row[8].replace("₹", "").replace(",", ""))
-                    )
-                except Exception as e:
-                    # original dataset has some issues, so skipping some values
-                    self.logger.warning(e)
-                    continue
-
-                p = Product.new(
-                    name=row[0],
-                    main_category=row[1],
-                    sub_category=row[2],
-                    image=row[3],
-                    link=row[4],
-                    ratings=ratings,
-                    no_of_ratings=no_of_ratings,
-                    discount_price=discount_price,
-                    actual_price=actual_price,
-                )
-                products.append(p)
+    def stream(self, *path) -> random.Random:
+        return new_rng(self.seed, self.worker, *path)
+
+    @property
+    def uses_database(self) -> bool:
+        return self.sink_spec[0] == "postgres"
 
-            await self.db_writer.upsert(
-                data=products, table="PRODUCT", conflict_keys=["id", "name"]
+    def open_sink(self):
+        kind, path = self.sink_spec
+        self.sink = open_sink(
+            kind, path, db=self.db_writer, bulk_threshold=self.bulk_threshold
+        )
+        if self.stamp_path:
+            self.sink = StampingSink(self.sink, self.stamp_path, self.stamp_rate)
+        if self.record_path:
+            self.sink = RecordingSink(self.sink, self.record_path)
+
+    async def write_columns(
+        self,
+        table: str,
+        columns: dict[str, list],
+        conflict_keys: list[str] | None = None,
+    ):
+        await self.sink.write_records(
+            table=table,
+            columns=list(columns),
+            records=records(columns),
+            conflict_keys=conflict_keys,
+        )
+
+    @timeit
+    async def create_users(self):
+        if not self.user_count:
+            return
+        # pools are drawn once, no bigger than the number of users needed
+        synth = UserSynthesizer(
+            faker=self.faker,
+            pool_size=min(1000, self.user_count),
+            rng=self.stream("users"),
+        )
+        created = 0
+        while created < self.user_count:
+            n = min(self.user_batch_size, self.user_count - created)
+            columns = synth.batch(n)
+            await self.write_columns(
+                table="USER", columns=columns, conflict_keys=["username", "id"]
             )
+            self.users.extend_columns(columns)
+            created += n
+
+    @timeit
+    async def create_products(self, write: bool = True):
+        # not per worker, every worker has to end up with the same product ids
+        rng = new_rng(self.seed, "products")
+        source = ProductCsv(
+            self.products_csv,
+            logger=self.logger,
+            chunk_size=self.product_chunk_size,
+            workers=self.parse_workers,
+        )
+        async for columns in source.chunks():
+            columns = {
+                "id": [random_uuid(rng) for _ in columns["name"]],
+                **columns,
+            }
+            if write:
+                await self.write_columns(
+                    table="PRODUCT", columns=columns, conflict_keys=["id", "name"]
+                )
+            self.products.extend_columns(columns)
+        self.logger.info(
+            f"created {source.rows} products"
+            + (" from snapshot" if source.from_snapshot else "")
+        )
 
     async def start(self, skip_init: bool = False):
         try:
@@ -150,83 +371,367 @@ class Generator:
             self.logger.error(f"error starting generator: {e}")
             raise e
 
-    async def user_routine(self, semaphore: asyncio.Semaphore):
+    async def user_routine(
+        self, semaphore: asyncio.Semaphore | ConcurrencyLimit, index: int
+    ) -> int:
         async with semaphore:
-            try:
-                u = await self.db_writer.select(
-                    columns=["id", "username", "ip_address", "user_agent"],
-                    table="USER",
-                    limit=1,
-                    order_by=["RANDOM()"],
-                )
-                username = u[0]["username"]
-                user_ip = u[0]["ip_address"]
-                user_agent = u[0]["user_agent"]
-                u_id = u[0]["id"]
-
-                # simulate user viewing products
-                products: list[Record] = await self.db_writer.select(
-                    table="PRODUCT", limit=10, order_by=["RANDOM()"]
-                )
+            return await self.session(index)
 
-                usm = UserStateHandlers(
-                    db=self.db_writer,
-                    faker=self.faker,
-                    products=products,
-                    username=username,
-                    ip_address=user_ip,
-                    user_agent=user_agent,
-                    user_id=u_id,
-                )
-                user_workflow_sm = UserWorkflowStateMachine(handlers=usm)
-                # each user is expected to perform actions
-                for i in range(10):
-                    # kick start state machine
-                    await user_workflow_sm.handle()
-                    self.logger.info(
-                        f"completed iteration #{i + 1} for user : {username}"
-                    )
+    async def session(self, index: int | None = None) -> int:
+        """runs one simulated user, returns the number of events it produced"""
+        if index is None:
+            index = self._sessions_started
+        self._sessions_started += 1
+        if self.lag_monitor:
+            await self.lag_monitor.wait()
+        rng = self.stream("session", index)
+        u = self.users.sample(rng)
+        username = u["username"]
+        user_ip = u["ip_address"]
+        user_agent = u["user_agent"]
+        u_id = u["id"]
+        try:
+            # simulate user viewing products
+            products = self.products.sample_many(10, rng)
 
-            except asyncio.CancelledError:
-                self.logger.info(f"cancelling routine of {username}")
-                raise
-            finally:
-                self.logger.info(f"{username} done!!!")
+            usm = UserStateHandlers(
+                sink=self.sink,
+                faker=self.faker,
+                products=products,
+                username=username,
+                ip_address=user_ip,
+                user_agent=user_agent,
+                user_id=u_id,
+                events=self.event_batcher,
+                pending=self.pending,
+                rng=rng,
+                on_order=self.recent_orders.add if self.recent_orders else None,
+            )
+            user_workflow_sm = UserWorkflowStateMachine(
+                handlers=usm, transitions=self.transitions, rng=rng
+            )
+            # each user is expected to perform actions
+            for i in range(10):
+                # kick start state machine
+                await user_workflow_sm.handle()
+                self.logger.info(f"completed iteration #{i + 1} for user : {username}")
+            self.sessions_completed += 1
+            return usm.events_emitted
+
+        except asyncio.CancelledError:
+            self.logger.info(f"cancelling routine of {username}")
+            raise
+        finally:
+            self.logger.info(f"{username} done!!!")
 
     async def run(self):
-        # simulate x concurrent users
-        semaphore = asyncio.Semaphore(50)
+        if not len(self.users):
+            # nothing loads users into a file or null sink run, -u creates them
+            raise ValueError("no users to simulate, create some with -u/--user_count")
+        # every session pushes its events into one shared batcher
+        self.event_batcher = EventBatcher(sink=self.sink, logger=self.logger)
+        self.event_batcher.start()
+        if self.db_writer:
+            self.users.start_refresh(self.db_writer, self.logger)
+            self.products.start_refresh(self.db_writer, self.logger)
+        exporter = None
+        if self.metrics_path:
+            exporter = asyncio.create_task(
+                REGISTRY.export_periodically(
+                    self.metrics_path, self.metrics_interval, self.logger
+                )
+            )
+        controller = None
+        if self.adaptive:
+            controller = self.start_controller()
+        monitor = None
+        if self.max_wal_lag:
+            monitor = self.start_lag_monitor()
+        mutator = None
+        if self.mutation_mix:
+            mutator = self.start_mutations()
+        partitioner = None
+        runner = stopper = None
+
+        self._install_signal_handlers()
         try:
-            while True:
-                # create x users, but is limited by x limit in semaphore
-                user_flow_tasks = [self.user_routine(semaphore) for _ in range(100)]
-                await asyncio.gather(*user_flow_tasks)
-                break
+            # one process keeps the partitions, concurrent CREATEs would collide
+            if self.event_partition and self.db_writer and self.worker == 0:
+                manager = self.partition_manager(self.db_writer)
+                # a restart with skip_init runs no ddl, the current range has to
+                # exist before the first event or it lands in the default partition
+                await manager.ensure()
+                partitioner = asyncio.create_task(manager.run())
+            runner = asyncio.create_task(self._run_sessions())
+            stopper = asyncio.create_task(self._stop.wait())
+            await asyncio.wait({runner, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            if not runner.done():
+                self.logger.info("stop requested, cancelling sessions...")
+                runner.cancel()
+            # surfaces errors from the sessions, a cancelled runner is expected here
+            try:
+                await runner
+            except asyncio.CancelledError:
+                if not self._stop.is_set():
+                    raise
 
         except asyncio.CancelledError:
             self.logger.info("Runner cancelled, flushing buffer before exit...")
+            if runner:
+                runner.cancel()
             raise
         finally:
+            if stopper:
+                stopper.cancel()
+            if controller:
+                controller.cancel()
+                await asyncio.gather(controller, return_exceptions=True)
+                self.logger.info(
+                    f"adaptive: best {self.controller.best_rate:.0f} rows/s "
+                    f"at {self.controller.best_limit} sessions"
+                )
+            if mutator:
+                mutator.cancel()
+                await asyncio.gather(mutator, return_exceptions=True)
+                counts = self.mutations.counts
+                self.logger.info(
+                    f"order mutations: {counts['status']} status changes, "
+                    f"{counts['quantity']} quantity edits, {counts['delete']} cancellations"
+                )
+            if partitioner:
+                partitioner.cancel()
+                await asyncio.gather(partitioner, return_exceptions=True)
+            if monitor:
+                monitor.cancel()
+                await asyncio.gather(monitor, return_exceptions=True)
+                self.logger.info(
+                    f"replication: new sessions held back for "
+                    f"{self.lag_monitor.throttled_seconds:.1f}s"
+                )
+            self._remove_signal_handlers()
+            await self.users.stop_refresh()
+            await self.products.stop_refresh()
+            await self.drain()
+            if exporter:
+                # writes a last snapshot with the drained totals
+                exporter.cancel()
+                await asyncio.gather(exporter, return_exceptions=True)
+            await self.sink.close()
             if self.db_writer:
                 await self.db_writer.close()
 
+    def start_controller(self) -> asyncio.Task | None:
+        if not self.db_writer:
+            # latency and pool wait are only measured against postgres
+            self.logger.warning("adaptive concurrency needs the postgres sink")
+            return None
+        self.controller = AimdController(
+            resize=self._resize,
+            rows=lambda: sum(self.sink.rows_written.values()),
+            logger=self.logger,
+            limit=self.concurrency,
+            max_limit=self.max_concurrency,
+            latency_budget=self.latency_budget,
+            metrics=self.db_writer.metrics,
+        )
+        return asyncio.create_task(self.controller.run())
+
+    def start_lag_monitor(self) -> asyncio.Task | None:
+        if not self.db_writer:
+            self.logger.warning(
+                "replication lag is only watched with the postgres sink"
+            )
+            return None
+        self.lag_monitor = ReplicationMonitor(
+            db=self.db_writer,
+            logger=self.logger,
+            max_lag=self.max_wal_lag,
+            slot=self.replication_slot,
+            rows=lambda: sum(self.sink.rows_written.values()),
+            metrics=self.db_writer.metrics,
+        )
+        return asyncio.create_task(self.lag_monitor.run())
+
+    def start_mutations(self) -> asyncio.Task | None:
+        if not self.db_writer:
+            self.logger.warning("order mutations need the postgres sink")
+            return None
+        self.mutations = MutationStage(
+            db=self.db_writer,
+            orders=self.recent_orders,
+            logger=self.logger,
+            mix=self.mutation_mix,
+            rng=self.stream("mutations"),
+            metrics=self.db_writer.metrics,
+        )
+        return asyncio.create_task(self.mutations.run())
+
+    def _resize(self, limit: int):
+        self.limit.resize(limit)
+        if self.scheduler:
+            self.scheduler.max_in_flight = limit
+
+    async def _run_sessions(self):
+        if self.profile is not None:
+            # open loop, sessions arrive at the profile rate
+            self.scheduler = OpenLoopScheduler(
+                profile=self.profile,
+                session=self.session,
+                logger=self.logger,
+                duration=self.duration,
+                target=self.load_target,
+                max_in_flight=self.limit.limit,
+                rng=self.stream("arrivals"),
+            )
+            summary = await self.scheduler.run()
+            self.logger.info(
+                f"load summary: target {summary['target_rate']:.1f} {summary['target']}/s, "
+                f"achieved {summary['achieved_rate']:.1f} {summary['target']}/s, "
+                f"launched: {summary['launched']}, skipped: {summary['skipped']}, failed: {summary['failed']}"
+            )
+            return
+
+        if self.soak:
+            await self.soak_run()
+            return
+
+        if self.backfill_sessions:
+            await self.backfill()
+            return
+
+        # simulate x concurrent users
+        while True:
+            # create x users, but is limited by x limit in semaphore
+            user_flow_tasks = [
+                self.user_routine(self.limit, i) for i in range(self.sessions)
+            ]
+            await asyncio.gather(*user_flow_tasks)
+            break
+
+    async def soak_run(self):
+        """keeps concurrency sessions running until duration runs out or stopped"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.duration if self.duration else None
+        self.logger.info(
+            f"soak: {self.concurrency} concurrent sessions for "
+            + (f"{self.duration}s" if self.duration else "ever")
+        )
+
+        lanes = self.max_concurrency if self.controller else self.concurrency
+
+        async def lane():
+            while deadline is None or loop.time() < deadline:
+                try:
+                    async with self.limit:
+                        if deadline is not None and loop.time() >= deadline:
+                            break
+                        await self.session()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.sessions_failed += 1
+                    self.logger.error(f"session failed: {e}")
+                    # back off so a broken database is not hammered in a tight loop
+                    await asyncio.sleep(1)
+
+        await asyncio.gather(*(lane() for _ in range(lanes)))
+
+    async def backfill(self, batch_size: int = 10000):
+        """writes backfill_sessions synthesized sessions spread over backfill_span"""
+        synth = SessionSynthesizer(
+            users=self.users,
+            products=self.products,
+            transitions=self.transitions,
+            rng=self.stream("backfill"),
+        )
+        start = datetime.now() - self.backfill_span
+        done = 0
+        while done < self.backfill_sessions:
+            n = min(batch_size, self.backfill_sessions - done)
+            tables = synth.batch(n, start=start, span=self.backfill_span)
+            # events have no dependencies, orders must land before their lines
+            await asyncio.gather(
+                self.write_columns(table="EVENT", columns=tables["EVENT"]),
+                self._write_orders(tables["ORDER"], tables["ORDERLINE"]),
+            )
+            done += n
+            self.sessions_completed += n
+            self.logger.info(f"backfill: {done}/{self.backfill_sessions} sessions")
+
+    async def _write_orders(
+        self, orders: dict[str, list], order_lines: dict[str, list]
+    ):
+        await self.write_columns(table="order", columns=orders)
+        await self.write_columns(table="orderline", columns=order_lines)
+        if self.recent_orders is not None:
+            lines = {order_id: [] for order_id in orders["id"]}
+            for line_id, order_id in zip(order_lines["id"], order_lines["order_id"]):
+                lines[order_id].append(line_id)
+            for order_id, line_ids in lines.items():
+                self.recent_orders.add(order_id, line_ids)
+
+    def request_stop(self):
+        if self._stop.is_set():
+            # second signal, give up on the graceful shutdown
+            self.logger.warning("stop requested again, exiting without draining")
+            raise KeyboardInterrupt
+        self._stop.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                # not supported on this platform or outside the main thread
+                pass
+
+    def _remove_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    async def drain(self):
+        """waits for buffered events and in flight orders, then logs rows per table"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        self.logger.info(
+            f"draining writes, {len(self.pending)} orders in flight, timeout {self.drain_timeout}s"
+        )
+        cancelled = await self.pending.drain(timeout=self.drain_timeout)
+        if cancelled:
+            self.logger.error(f"{cancelled} order writes did not finish in time")
+        await self.event_batcher.close(timeout=max(0, deadline - loop.time()))
+
+        self.logger.info(
+            f"events written: {self.event_batcher.rows_written} in {self.event_batcher.batches} batches, dropped: {self.event_batcher.rows_dropped}"
+        )
+        totals = ", ".join(
+            f"{table}: {count}"
+            for table, count in sorted(self.sink.rows_written.items())
+        )
+        self.logger.info(f"rows written per table: {totals or 'none'}")
+
+    def stats(self) -> dict:
+        return {
+            "sessions": self.sessions_completed,
+            "sessions_failed": self.sessions_failed,
+            "rows": dict(self.sink.rows_written) if self.sink else {},
+            "events": self.event_batcher.rows_written if self.event_batcher else 0,
+            "events_dropped": (
+                self.event_batcher.rows_dropped if self.event_batcher else 0
+            ),
+        }
+
 
-def run_simulation(
-    user_count: int,
-    truncate_table: bool = False,
-    rebuild_database: bool = False,
-    skip_init: bool = False,
-):
+def run_simulation(config: GeneratorConfig, skip_init: bool = False):
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(name="ecom_debezium")
 
-    generator = Generator(
-        user_count=user_count,
-        schema="test",
-        logger=logger,
-        truncate_table=truncate_table,
-        rebuild_database=rebuild_database,
-    )
+    generator = Generator(config, logger)
     try:
         asyncio.run(generator.start(skip_init))
     except KeyboardInterrupt as e:
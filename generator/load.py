@@ -0,0 +1,280 @@
+import asyncio
+import math
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, replace
+from logging import Logger
+from typing import Awaitable, Callable
+
+
+class LoadProfile(ABC):
+    """target rate as a function of seconds since the run started"""
+
+    duration: float | None
+
+    @abstractmethod
+    def rate(self, t: float) -> float: ...
+
+    @abstractmethod
+    def scale(self, factor: float) -> "LoadProfile": ...
+
+
+@dataclass
+class ConstantProfile(LoadProfile):
+    target: float
+    duration: float | None = None
+
+    def rate(self, t: float) -> float:
+        return self.target
+
+    def scale(self, factor: float) -> "ConstantProfile":
+        return replace(self, target=self.target * factor)
+
+
+@dataclass
+class StepProfile(LoadProfile):
+    # (rate, seconds) pairs, the last rate is held once the steps run out
+    steps: list[tuple[float, float]]
+    duration: float | None = None
+
+    def __post_init__(self):
+        if self.duration is None:
+            self.duration = sum(seconds for _, seconds in self.steps)
+
+    def rate(self, t: float) -> float:
+        for rate, seconds in self.steps:
+            if t < seconds:
+                return rate
+            t -= seconds
+        return self.steps[-1][0]
+
+    def scale(self, factor: float) -> "StepProfile":
+        return replace(
+            self, steps=[(rate * factor, seconds) for rate, seconds in self.steps]
+        )
+
+
+@dataclass
+class RampProfile(LoadProfile):
+    start: float
+    end: float
+    duration: float
+
+    def rate(self, t: float) -> float:
+        progress = min(t / self.duration, 1.0) if self.duration else 1.0
+        return self.start + (self.end - self.start) * progress
+
+    def scale(self, factor: float) -> "RampProfile":
+        return replace(self, start=self.start * factor, end=self.end * factor)
+
+
+@dataclass
+class SineProfile(LoadProfile):
+    base: float
+    amplitude: float
+    period: float
+    duration: float | None = None
+
+    def rate(self, t: float) -> float:
+        return max(
+            0.0, self.base + self.amplitude * math.sin(2 * math.pi * t / self.period)
+        )
+
+    def scale(self, factor: float) -> "SineProfile":
+        return replace(self, base=self.base * factor, amplitude=self.amplitude * factor)
+
+
+def parse_profile(spec: str) -> LoadProfile:
+    """
+    constant:RATE, step:RATE@SECONDS,..., ramp:START,END@SECONDS or sine:BASE,AMP@PERIOD
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        match kind:
+            case "constant":
+                return ConstantProfile(target=float(args))
+            case "step":
+                steps = []
+                for step in args.split(","):
+                    rate, seconds = step.split("@")
+                    steps.append((float(rate), float(seconds)))
+                return StepProfile(steps=steps)
+            case "ramp":
+                rates, seconds = args.split("@")
+                start, end = rates.split(",")
+                return RampProfile(
+                    start=float(start),
+                    end=float(end),
+                    duration=float(seconds),
+                )
+            case "sine":
+                rates, period = args.split("@")
+                base, amplitude = rates.split(",")
+                if float(period) <= 0:
+                    raise ValueError("period must be positive")
+                return SineProfile(
+                    base=float(base),
+                    amplitude=float(amplitude),
+                    period=float(period),
+                )
+    except ValueError as e:
+        raise ValueError(f"invalid load profile {spec!r}: {e}") from e
+    raise ValueError(f"unknown load profile {kind!r}")
+
+
+class OpenLoopScheduler:
+    """
+    starts sessions at a profile's rate, skipping arrivals while too many are in flight
+    """
+
+    def __init__(
+        self,
+        profile: LoadProfile,
+        session: Callable[[], Awaitable[int]],
+        logger: Logger,
+        duration: float | None = None,
+        target: str = "sessions",
+        max_in_flight: int = 1000,
+        report_interval: float = 5.0,
+        poisson: bool = True,
+        max_lag: float = 1.0,
+        rng: random.Random | None = None,
+    ):
+        if target not in ("sessions", "events"):
+            raise ValueError(f"unknown target {target!r}")
+        self.profile = profile
+        self.session = session
+        self.logger = logger
+        self.duration = duration if duration is not None else profile.duration
+        self.target = target
+        self.max_in_flight = max_in_flight
+        self.report_interval = report_interval
+        self.poisson = poisson
+        # inter-arrival gaps, seeded so the arrival pattern repeats
+        self.rng = rng or random.Random()
+        # fall further behind than this and the missed arrivals are dropped
+        self.max_lag = max_lag
+
+        self.events_per_session = 20.0
+        self.expected = 0.0
+        self.launched = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.events = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._stopped = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stop(self):
+        self._stopped = True
+
+    def _arrival_rate(self, rate: float) -> float:
+        if self.target == "events":
+            return rate / max(self.events_per_session, 1.0)
+        return rate
+
+    def _achieved(self) -> float:
+        return self.events if self.target == "events" else self.launched
+
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        last = start
+        next_at = start
+        reporter = asyncio.create_task(self._report(start))
+        try:
+            while not self._stopped:
+                now = loop.time()
+                t = now - start
+                if self.duration is not None and t >= self.duration:
+                    break
+
+                rate = self.profile.rate(t)
+                self.expected += rate * (now - last)
+                last = now
+
+                arrival_rate = self._arrival_rate(rate)
+                if arrival_rate <= 0:
+                    await asyncio.sleep(0.1)
+                    next_at = loop.time()
+                    continue
+
+                gap = (
+                    self.rng.expovariate(arrival_rate)
+                    if self.poisson
+                    else 1 / arrival_rate
+                )
+                next_at += gap
+                delay = next_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif -delay > self.max_lag:
+                    next_at = loop.time()
+
+                self._launch()
+        except asyncio.CancelledError:
+            for task in self._tasks:
+                task.cancel()
+            raise
+        finally:
+            reporter.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        elapsed = loop.time() - start
+        return self.summary(elapsed)
+
+    def _launch(self):
+        if self.in_flight >= self.max_in_flight:
+            self.skipped += 1
+            return
+        self.launched += 1
+        task = asyncio.create_task(self.session())
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+            return
+        self.completed += 1
+        events = task.result() or 0
+        self.events += events
+        self.events_per_session = 0.9 * self.events_per_session + 0.1 * events
+
+    async def _report(self, start: float):
+        loop = asyncio.get_running_loop()
+        last_time = start
+        last_achieved = self._achieved()
+        last_expected = self.expected
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = loop.time()
+            window = now - last_time
+            achieved = self._achieved()
+            self.logger.info(
+                f"load: target {(self.expected - last_expected) / window:.1f} {self.target}/s, "
+                f"achieved {(achieved - last_achieved) / window:.1f} {self.target}/s, "
+                f"in flight: {self.in_flight}, skipped: {self.skipped}, failed: {self.failed}"
+            )
+            last_time, last_achieved, last_expected = now, achieved, self.expected
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "target": self.target,
+            "elapsed": elapsed,
+            "target_rate": self.expected / elapsed if elapsed else 0.0,
+            "achieved_rate": self._achieved() / elapsed if elapsed else 0.0,
+            "launched": self.launched,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "events": self.events,
+        }
@@ -0,0 +1,150 @@
+"""update and delete traffic on orders, in proportion to the orders placed"""
+
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime
+from logging import Logger
+
+from utils import Database
+from utils.metrics import REGISTRY, MetricsRegistry
+
+STATUSES = ("PLACED", "PAID", "SHIPPED", "DELIVERED")
+
+
+def parse_mix(spec: str) -> tuple[int, int, int]:
+    """insert:update:delete weights, e.g. 70:20:10"""
+    try:
+        insert, update, delete = (int(part) for part in spec.split(":"))
+    except ValueError:
+        raise ValueError(f"mutation mix must look like 70:20:10, got {spec!r}")
+    if insert <= 0 or update < 0 or delete < 0:
+        raise ValueError("mutation mix needs inserts, and no negative weights")
+    return insert, update, delete
+
+
+class RecentOrders:
+    """ring of the latest orders, entries are [order id, line ids, status index]"""
+
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self._slots: list[list | None] = []
+        self._next = 0
+        self.added = 0
+        self.live = 0
+
+    def __len__(self) -> int:
+        return self.live
+
+    def add(self, order_id: str, line_ids: list[str]):
+        entry = [order_id, line_ids, 0]
+        if len(self._slots) < self.capacity:
+            self._slots.append(entry)
+        else:
+            if self._slots[self._next] is not None:
+                self.live -= 1
+            self._slots[self._next] = entry
+        self._next = (self._next + 1) % self.capacity
+        self.added += 1
+        self.live += 1
+
+    def sample(self, k: int, rng: random.Random) -> list[tuple[int, list]]:
+        """up to k distinct live entries with their slots"""
+        picks = rng.sample(range(len(self._slots)), min(k, len(self._slots)))
+        return [(i, self._slots[i]) for i in picks if self._slots[i] is not None]
+
+    def remove(self, slot: int, entry: list):
+        # the slot may have been reused since it was sampled
+        if self._slots[slot] is entry:
+            self._slots[slot] = None
+            self.live -= 1
+
+
+class MutationStage:
+    def __init__(
+        self,
+        db: Database,
+        orders: RecentOrders,
+        logger: Logger,
+        mix: tuple[int, int, int],
+        rng: random.Random | None = None,
+        interval: float = 0.5,
+        max_batch: int = 1000,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.db = db
+        self.orders = orders
+        self.logger = logger
+        self.mix = mix
+        self.rng = rng or random.Random()
+        self.interval = interval
+        # per kind and round, the rest carries over
+        self.max_batch = max_batch
+        self.counts = Counter()
+        self._owed = {"update": 0.0, "delete": 0.0}
+        metrics = metrics or REGISTRY
+        self._counters = {
+            kind: metrics.counter(
+                "order_mutations_total", "order rows changed after insert", kind=kind
+            )
+            for kind in ("status", "quantity", "delete")
+        }
+
+    async def step(self, inserted: int):
+        insert, update, delete = self.mix
+        self._owed["update"] += inserted * update / insert
+        self._owed["delete"] += inserted * delete / insert
+        n_update = min(int(self._owed["update"]), self.max_batch)
+        n_delete = min(int(self._owed["delete"]), self.max_batch)
+        self._owed["update"] -= n_update
+        self._owed["delete"] -= n_delete
+
+        picked = self.orders.sample(n_update + n_delete, self.rng)
+        deletes, updates = picked[:n_delete], picked[n_delete:]
+
+        statuses, quantities, moved = [], [], []
+        now = datetime.now()
+        for slot, entry in updates:
+            order_id, line_ids, status = entry
+            if line_ids and (status + 1 >= len(STATUSES) or self.rng.random() < 0.5):
+                quantities.append(
+                    (self.rng.choice(line_ids), float(self.rng.randint(1, 20)))
+                )
+            elif status + 1 < len(STATUSES):
+                statuses.append((order_id, STATUSES[status + 1], now))
+                moved.append(entry)
+
+        await asyncio.gather(
+            self.db.update_records("order", "id", ["status", "updated_at"], statuses),
+            self.db.update_records("orderline", "id", ["quantity"], quantities),
+            self.db.delete_records(
+                "order",
+                "id",
+                [entry[0] for _, entry in deletes],
+                children=[("orderline", "order_id")],
+            ),
+        )
+        for entry in moved:
+            entry[2] += 1
+        for slot, entry in deletes:
+            self.orders.remove(slot, entry)
+        self._count("status", len(statuses))
+        self._count("quantity", len(quantities))
+        self._count("delete", len(deletes))
+
+    def _count(self, kind: str, n: int):
+        self.counts[kind] += n
+        self._counters[kind].inc(n)
+
+    async def run(self):
+        last_added = self.orders.added
+        while True:
+            await asyncio.sleep(self.interval)
+            added = self.orders.added
+            try:
+                await self.step(added - last_added)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"error mutating orders: {e}")
+            last_added = added
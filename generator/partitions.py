@@ -0,0 +1,145 @@
+"""keeps a range partitioned table supplied with partitions named after their start"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from logging import Logger
+
+from utils import Database
+
+INTERVALS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+class PartitionManager:
+    def __init__(
+        self,
+        db: Database,
+        logger: Logger,
+        table: str = "EVENT",
+        interval: timedelta = INTERVALS["day"],
+        ahead: int = 2,
+        retention: timedelta | None = None,
+        detach: bool = False,
+    ):
+        if interval not in INTERVALS.values():
+            raise ValueError(f"partition interval must be one of {list(INTERVALS)}")
+        self.db = db
+        self.logger = logger
+        self.table = table
+        self.interval = interval
+        # partitions kept ready past the current one
+        self.ahead = ahead
+        # None keeps every partition
+        self.retention = retention
+        # detached partitions stay around as plain tables
+        self.detach = detach
+        self._format = "%Y%m%d%H" if interval < INTERVALS["day"] else "%Y%m%d"
+        self._prefix = f"{table.lower()}_p"
+
+    def floor(self, t: datetime) -> datetime:
+        t = t.astimezone(timezone.utc)
+        if self.interval < INTERVALS["day"]:
+            return t.replace(minute=0, second=0, microsecond=0)
+        return t.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def name(self, start: datetime) -> str:
+        return f"{self._prefix}{start:{self._format}}"
+
+    def start_of(self, name: str) -> datetime | None:
+        """start of a partition's range, None for partitions not made here"""
+        if not name.startswith(self._prefix):
+            return None
+        try:
+            start = datetime.strptime(name[len(self._prefix) :], self._format)
+        except ValueError:
+            return None
+        return start.replace(tzinfo=timezone.utc)
+
+    async def ensure(self, now: datetime | None = None, back: timedelta = timedelta()):
+        """creates partitions from one interval back to ahead intervals after now"""
+        now = now or datetime.now(timezone.utc)
+        existing = await self._partitions()
+        start = self.floor(now - max(back, self.interval))
+        last = self.floor(now) + self.ahead * self.interval
+        created = []
+        while start <= last:
+            name = self.name(start)
+            if name not in existing:
+                try:
+                    await self.db.create_partition(
+                        self.table, name, start, start + self.interval
+                    )
+                    created.append(name)
+                except Exception as e:
+                    self.logger.warning(
+                        f"could not create partition {name}, its rows go to "
+                        f"{self.table.lower()}_default: {e}"
+                    )
+            start += self.interval
+        if created:
+            self.logger.info(f"created partitions {', '.join(created)}")
+        return created
+
+    async def truncate(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> list[str]:
+        """
+        empties partitions whose whole range is within [start, end), all without bounds
+        """
+        names = []
+        for name in await self._partitions():
+            begin = self.start_of(name)
+            if begin is None:
+                if start is None and end is None:
+                    names.append(name)
+            elif (start is None or begin >= start) and (
+                end is None or begin + self.interval <= end
+            ):
+                names.append(name)
+        for name in names:
+            await self.db.truncate_tables([name])
+        if names:
+            self.logger.info(f"truncated partitions {', '.join(names)}")
+        return names
+
+    async def _partitions(self) -> list[str]:
+        existing = await self.db.partitions(self.table)
+        if existing is None:
+            raise ValueError(
+                f"{self.table} is not partitioned, rebuild the schema to partition it"
+            )
+        return existing
+
+    async def expire(self, now: datetime | None = None) -> list[str]:
+        """drops, or detaches, partitions whose whole range is past retention"""
+        if self.retention is None:
+            return []
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - self.retention
+        expired = [
+            name
+            for name in await self.db.partitions(self.table) or []
+            if (start := self.start_of(name)) is not None
+            and start + self.interval <= cutoff
+        ]
+        if not expired:
+            return []
+        if self.detach:
+            for name in expired:
+                await self.db.detach_partition(self.table, name)
+        else:
+            await self.db.drop_tables(expired)
+        self.logger.info(
+            f"{'detached' if self.detach else 'dropped'} partitions {', '.join(expired)}"
+        )
+        return expired
+
+    async def run(self, check_interval: float = 60):
+        while True:
+            try:
+                await self.ensure()
+                await self.expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"error managing {self.table} partitions: {e}")
+            await asyncio.sleep(check_interval)
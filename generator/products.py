@@ -0,0 +1,168 @@
+"""product csv ingest in bounded chunks, parsed in a process pool and snapshotted"""
+
+# standard library only, pool workers import this module on start
+import asyncio
+import csv
+import hashlib
+import itertools
+import multiprocessing
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from logging import Logger
+from typing import AsyncIterator
+
+# bump when parse_rows changes what it produces
+SNAPSHOT_VERSION = 1
+
+COLUMNS = [
+    "name",
+    "main_category",
+    "sub_category",
+    "image",
+    "link",
+    "ratings",
+    "no_of_ratings",
+    "discount_price",
+    "actual_price",
+]
+
+# prices look like ₹1,299 and rating counts like 2,031
+_STRIP = str.maketrans("", "", "₹,")
+
+
+def parse_rows(rows: list[list[str]]) -> tuple[dict[str, list], int]:
+    """a chunk of csv rows as product columns without ids, and how many were skipped"""
+    columns = {col: [] for col in COLUMNS}
+    skipped = 0
+    for row in rows:
+        try:
+            ratings = None if row[5] == "" else float(row[5])
+            no_of_ratings = None if row[6] == "" else int(row[6].translate(_STRIP))
+            discount_price = None if row[7] == "" else float(row[7].translate(_STRIP))
+            actual_price = None if row[8] == "" else float(row[8].translate(_STRIP))
+        except (ValueError, IndexError):
+            # original dataset has some issues, so skipping some values
+            skipped += 1
+            continue
+        columns["name"].append(row[0])
+        columns["main_category"].append(row[1])
+        columns["sub_category"].append(row[2])
+        columns["image"].append(row[3])
+        columns["link"].append(row[4])
+        columns["ratings"].append(ratings)
+        columns["no_of_ratings"].append(no_of_ratings)
+        columns["discount_price"].append(discount_price)
+        columns["actual_price"].append(actual_price)
+    return columns, skipped
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while block := fp.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ProductCsv:
+    def __init__(
+        self,
+        path: str,
+        logger: Logger,
+        chunk_size: int = 50000,
+        workers: int | None = None,
+        cache_dir: str | None = None,
+    ):
+        self.path = path
+        self.logger = logger
+        self.chunk_size = chunk_size
+        # 0 parses on the event loop's thread pool, no processes
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(path), ".cache")
+        self.rows = 0
+        self.skipped = 0
+        self.from_snapshot = False
+
+    async def snapshot_path(self) -> str:
+        digest = await asyncio.to_thread(file_digest, self.path)
+        return os.path.join(
+            self.cache_dir, f"products-v{SNAPSHOT_VERSION}-{digest[:24]}.pickle"
+        )
+
+    async def chunks(self) -> AsyncIterator[dict[str, list]]:
+        """product columns in csv order, at most chunk_size rows at a time"""
+        snapshot = await self.snapshot_path()
+        if os.path.exists(snapshot):
+            self.from_snapshot = True
+            async for columns in self._read_snapshot(snapshot):
+                self.rows += len(columns["name"])
+                yield columns
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # unique per process, workers may parse the same file at once
+        tmp = f"{snapshot}.{os.getpid()}.tmp"
+        complete = False
+        try:
+            with open(tmp, "wb") as out:
+                async for columns, skipped in self._parse():
+                    self.rows += len(columns["name"])
+                    self.skipped += skipped
+                    pickle.dump(columns, out, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield columns
+            complete = True
+        finally:
+            if complete:
+                os.replace(tmp, snapshot)
+            elif os.path.exists(tmp):
+                os.remove(tmp)
+        if self.skipped:
+            self.logger.warning(f"skipped {self.skipped} malformed product rows")
+
+    async def _read_snapshot(self, path: str) -> AsyncIterator[dict[str, list]]:
+        with open(path, "rb") as fp:
+            while True:
+                columns = await asyncio.to_thread(_load_next, fp)
+                if columns is None:
+                    return
+                yield columns
+
+    async def _parse(self) -> AsyncIterator[tuple[dict[str, list], int]]:
+        loop = asyncio.get_running_loop()
+        pool = None
+        if self.workers:
+            pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        # parsed chunks waiting to be consumed, bounds memory
+        in_flight = deque()
+        try:
+            with open(self.path, newline="", encoding="utf-8") as fp:
+                reader = csv.reader(fp)
+                # skip header
+                await asyncio.to_thread(next, reader, None)
+                while True:
+                    rows = await asyncio.to_thread(
+                        list, itertools.islice(reader, self.chunk_size)
+                    )
+                    if not rows:
+                        break
+                    in_flight.append(loop.run_in_executor(pool, parse_rows, rows))
+                    if len(in_flight) > max(1, self.workers):
+                        yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _load_next(fp) -> dict[str, list] | None:
+    try:
+        return pickle.load(fp)
+    except EOFError:
+        return None
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+
+from generator.config import GeneratorConfig
+from generator.generator import Generator
+from utils.replay import replay
+
+
+async def _replay(
+    path: str,
+    speed: float,
+    truncate_table: bool,
+    rebuild_database: bool,
+    sink: tuple[str, str | None],
+    logger: logging.Logger,
+    event_partition: str | None = None,
+    event_brin: bool = False,
+) -> dict:
+    # only the connection, ddl and sink of a generator, nothing is generated
+    config = GeneratorConfig(
+        truncate_table=truncate_table,
+        rebuild_database=rebuild_database,
+        sink=sink,
+        event_partition=event_partition,
+        event_brin=event_brin,
+    )
+    generator = Generator(config, logger)
+    if generator.uses_database:
+        await generator.connect()
+        await generator.run_ddl(generator.db_writer, rebuild_database)
+        if truncate_table:
+            await generator.truncate_tables(generator.db_writer)
+    generator.open_sink()
+    try:
+        return await replay(path, generator.sink, logger, speed=speed)
+    finally:
+        await generator.sink.close()
+        if generator.db_writer:
+            await generator.db_writer.close()
+
+
+def run_replay(
+    path: str,
+    speed: float = 1.0,
+    truncate_table: bool = False,
+    rebuild_database: bool = False,
+    sink: tuple[str, str | None] = ("postgres", None),
+    event_partition: str | None = None,
+    event_brin: bool = False,
+):
+    """feeds a --record log back into the sink, ids are kept so use an empty schema"""
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(name="ecom_debezium")
+    try:
+        return asyncio.run(
+            _replay(
+                path,
+                speed,
+                truncate_table,
+                rebuild_database,
+                sink,
+                logger,
+                event_partition,
+                event_brin,
+            )
+        )
+    except KeyboardInterrupt as e:
+        print(f"User exit triggered, stopping: {e}")
@@ -0,0 +1,146 @@
+"""holds new sessions back while a logical slot retains too much wal"""
+
+import asyncio
+from logging import Logger
+from typing import Callable
+
+from utils import Database
+from utils.metrics import REGISTRY, MetricsRegistry
+
+
+class ReplicationMonitor:
+    def __init__(
+        self,
+        db: Database,
+        logger: Logger,
+        max_lag: int,
+        resume_lag: int | None = None,
+        slot: str | None = None,
+        interval: float = 1.0,
+        report_interval: float = 5.0,
+        rows: Callable[[], int] | None = None,
+        metrics: MetricsRegistry | None = None,
+    ):
+        self.db = db
+        self.logger = logger
+        # bytes of retained wal
+        self.max_lag = max_lag
+        self.resume_lag = max_lag // 2 if resume_lag is None else resume_lag
+        # None watches every logical slot
+        self.slot = slot
+        self.interval = interval
+        self.report_interval = report_interval
+        self.rows = rows
+        self.metrics = metrics or REGISTRY
+        self.retained = 0
+        self.lag = 0
+        self.lag_seconds: float | None = None
+        # slots nobody is consuming, they only ever grow
+        self.inactive: list[str] = []
+        self.throttled_seconds = 0.0
+        self._clear = asyncio.Event()
+        self._clear.set()
+        self._paused_at: float | None = None
+        self._warned = False
+        self._throttled = self.metrics.gauge(
+            "replication_throttled", "1 while new sessions wait on replication lag"
+        )
+
+    @property
+    def paused(self) -> bool:
+        return not self._clear.is_set()
+
+    async def wait(self):
+        """returns once the slots are under the lag threshold"""
+        if not self._clear.is_set():
+            await self._clear.wait()
+
+    async def poll(self):
+        slots = await self.db.replication_slots(self.slot)
+        if not slots:
+            if not self._warned:
+                self.logger.warning(
+                    f"no logical replication slot {self.slot or ''} found, not throttling"
+                )
+                self._warned = True
+            self.retained, self.lag, self.lag_seconds = 0, 0, None
+            self.inactive = []
+            self._update()
+            return
+
+        # the slowest consumer decides
+        self.retained = max(s["retained_bytes"] or 0 for s in slots)
+        self.lag = max(s["lag_bytes"] or 0 for s in slots)
+        seconds = [s["flush_lag_seconds"] for s in slots]
+        self.lag_seconds = None if None in seconds or not seconds else max(seconds)
+        for s in slots:
+            labels = {"slot": s["slot_name"]}
+            self.metrics.gauge(
+                "replication_retained_bytes", "wal held back by the slot", **labels
+            ).set(s["retained_bytes"] or 0)
+            self.metrics.gauge(
+                "replication_lag_bytes",
+                "wal not yet confirmed by the consumer",
+                **labels,
+            ).set(s["lag_bytes"] or 0)
+        self.inactive = [s["slot_name"] for s in slots if not s["active"]]
+        self._update()
+
+    def _update(self):
+        now = asyncio.get_running_loop().time()
+        if not self.paused and self.retained > self.max_lag:
+            self._clear.clear()
+            self._paused_at = now
+            self._throttled.set(1)
+            self.logger.warning(
+                f"replication: pausing new sessions, {_mb(self.retained)} retained "
+                f"over {_mb(self.max_lag)}"
+                + (
+                    f", no consumer on {', '.join(self.inactive)}"
+                    if self.inactive
+                    else ""
+                )
+            )
+        elif self.paused and self.retained <= self.resume_lag:
+            self._clear.set()
+            self.throttled_seconds += now - self._paused_at
+            self._throttled.set(0)
+            self.logger.info(
+                f"replication: resuming after {now - self._paused_at:.1f}s, "
+                f"{_mb(self.retained)} retained"
+            )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        last_rows = self.rows() if self.rows else 0
+        try:
+            while True:
+                try:
+                    await self.poll()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.warning(f"error polling replication slots: {e}")
+                now = loop.time()
+                if now - last_report >= self.report_interval:
+                    rows = self.rows() if self.rows else 0
+                    self.logger.info(
+                        self.report((rows - last_rows) / (now - last_report))
+                    )
+                    last_report, last_rows = now, rows
+                await asyncio.sleep(self.interval)
+        finally:
+            # never leave sessions waiting on a monitor that is gone
+            self._clear.set()
+
+    def report(self, rate: float) -> str:
+        seconds = "n/a" if self.lag_seconds is None else f"{self.lag_seconds:.1f}s"
+        return (
+            f"replication: {rate:.0f} rows/s written, lag {_mb(self.lag)} ({seconds}), "
+            f"{_mb(self.retained)} retained" + (", paused" if self.paused else "")
+        )
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1 << 20):.1f}MB"
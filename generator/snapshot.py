@@ -0,0 +1,161 @@
+"""catalogs dumped to one file that later runs map instead of reading the tables"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Any
+
+# magic | header length: uint32 | json header | pad to 8 | column sections
+# a column is n + 1 offsets then its utf-8 values, section offsets in the
+# header are relative to the first section
+MAGIC = b"ECATSNP1"
+_LENGTH = struct.Struct("<I")
+
+
+class MappedColumn:
+    """read only sequence of str over a column section"""
+
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        return str(self._blob[self._offsets[index] : self._offsets[index + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class CatalogSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self._fp = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            self._fp.close()
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self._view = memoryview(self._map)
+        if self._view[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a catalog snapshot")
+        start = len(MAGIC) + _LENGTH.size
+        (length,) = _LENGTH.unpack_from(self._view, len(MAGIC))
+        self.header = json.loads(bytes(self._view[start : start + length]))
+        self._base = _aligned(start + length)
+
+    @property
+    def schema(self) -> str:
+        return self.header["schema"]
+
+    def rows(self, table: str) -> int | None:
+        entry = self.header["tables"].get(table)
+        return entry["rows"] if entry else None
+
+    def check(self, table: str) -> dict | None:
+        entry = self.header["tables"].get(table)
+        return entry.get("check") if entry else None
+
+    def has(self, table: str, columns: list[str]) -> bool:
+        entry = self.header["tables"].get(table)
+        return entry is not None and all(col in entry["columns"] for col in columns)
+
+    def columns(self, table: str) -> dict[str, MappedColumn]:
+        entry = self.header["tables"][table]
+        n = entry["rows"]
+        columns = {}
+        for col, (offsets_at, blob_at, blob_len) in entry["columns"].items():
+            offsets_at += self._base
+            blob_at += self._base
+            offsets = self._view[offsets_at : offsets_at + 8 * (n + 1)].cast("Q")
+            columns[col] = MappedColumn(
+                offsets, self._view[blob_at : blob_at + blob_len]
+            )
+        return columns
+
+    def close(self):
+        # views into the mapping have to go before it can be closed
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # columns handed out still point into it, leave it to the gc
+            pass
+        self._fp.close()
+
+
+def write_snapshot(
+    path: str,
+    schema: str,
+    tables: dict[str, dict[str, Any]],
+    checks: dict[str, dict] | None = None,
+):
+    """tables is {table: {column: values}}, stored as str along with checks"""
+    sections: list[bytes] = []
+    header = {"schema": schema, "tables": {}}
+    at = 0
+    for table, columns in tables.items():
+        n = None
+        entry = {}
+        for col, values in columns.items():
+            encoded = [str(v).encode() for v in values]
+            n = len(encoded) if n is None else n
+            if len(encoded) != n:
+                raise ValueError(f"columns of {table} differ in length")
+            offsets = array("Q", [0])
+            total = 0
+            for value in encoded:
+                total += len(value)
+                offsets.append(total)
+            offsets_bytes = offsets.tobytes()
+            blob = _pad(b"".join(encoded))
+            entry[col] = [at, at + len(offsets_bytes), total]
+            sections.append(offsets_bytes)
+            sections.append(blob)
+            at += len(offsets_bytes) + len(blob)
+        header["tables"][table] = {"rows": n or 0, "columns": entry}
+        if checks and table in checks:
+            header["tables"][table]["check"] = checks[table]
+
+    encoded = json.dumps(header).encode()
+    base = _aligned(len(MAGIC) + _LENGTH.size + len(encoded))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp, "wb") as fp:
+        fp.write(MAGIC)
+        fp.write(_LENGTH.pack(len(encoded)))
+        fp.write(encoded)
+        fp.write(b"\0" * (base - fp.tell()))
+        for section in sections:
+            fp.write(section)
+    # readers that mapped the old file keep it, new ones get this one
+    os.replace(tmp, path)
+
+
+def remove_snapshot(path: str | None):
+    """for runs that create the catalogs, the ids in the file are gone then"""
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _aligned(n: int) -> int:
+    return (n + 7) // 8 * 8
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (_aligned(len(data)) - len(data))
@@ -0,0 +1,233 @@
+import random
+import socket
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from faker import Faker
+
+from generator.catalog import Catalog
+from user_workflow_state_machine.state import (
+    AddToCartState,
+    AuthenticatedState,
+    BrowsingState,
+    EntryState,
+    PlaceOrder,
+    RemoveFromCart,
+    TerminalState,
+    UnauthenticatedState,
+    ViewProductState,
+)
+from user_workflow_state_machine.workflow_sm import DEFAULT_TABLE, TransitionTable
+from utils.models import EventType
+from utils.rng import random_uuid
+
+
+class UserSynthesizer:
+    """builds users in batches from pools drawn from faker once"""
+
+    def __init__(
+        self, faker: Faker, pool_size: int = 1000, rng: random.Random | None = None
+    ):
+        self.rng = rng or random.Random()
+        self.male_first_names = [faker.first_name_male() for _ in range(pool_size)]
+        self.male_last_names = [faker.last_name_male() for _ in range(pool_size)]
+        self.female_first_names = [faker.first_name_female() for _ in range(pool_size)]
+        self.female_last_names = [faker.last_name_female() for _ in range(pool_size)]
+        self.user_names = [faker.user_name() for _ in range(pool_size)]
+        self.addresses = [faker.address() for _ in range(pool_size)]
+        self.user_agents = [faker.user_agent() for _ in range(pool_size)]
+
+    def batch(self, n: int) -> dict[str, list]:
+        """n users as one list per column, in User field order"""
+        genders = self.rng.choices(["M", "F", "O"], k=n)
+        male_first = self.rng.choices(self.male_first_names, k=n)
+        male_last = self.rng.choices(self.male_last_names, k=n)
+        female_first = self.rng.choices(self.female_first_names, k=n)
+        female_last = self.rng.choices(self.female_last_names, k=n)
+
+        # same rule as User.new, everyone but M gets female names
+        is_male = [g == "M" for g in genders]
+        first_names = [
+            m if male else f for male, m, f in zip(is_male, male_first, female_first)
+        ]
+        last_names = [
+            m if male else f for male, m, f in zip(is_male, male_last, female_last)
+        ]
+
+        # a numeric suffix spreads the pooled user names
+        suffixes = self.rng.choices(range(10000), k=n)
+        user_names = [
+            f"{name}{suffix}"
+            for name, suffix in zip(self.rng.choices(self.user_names, k=n), suffixes)
+        ]
+
+        now = datetime.now()
+        return {
+            "id": self._uuids(n),
+            "username": user_names,
+            "first_name": first_names,
+            "last_name": last_names,
+            "created_at": [now] * n,
+            "updated_at": [now] * n,
+            "address": self.rng.choices(self.addresses, k=n),
+            "gender": genders,
+            "ip_address": self._ipv4s(n),
+            "user_agent": self.rng.choices(self.user_agents, k=n),
+        }
+
+    def _uuids(self, n: int) -> list[str]:
+        raw = self.rng.randbytes(16 * n)
+        return [
+            str(uuid.UUID(bytes=raw[i : i + 16], version=4))
+            for i in range(0, 16 * n, 16)
+        ]
+
+    def _ipv4s(self, n: int) -> list[str]:
+        raw = self.rng.randbytes(4 * n)
+        return [socket.inet_ntoa(raw[i : i + 4]) for i in range(0, 4 * n, 4)]
+
+
+# event written when a session passes through a state, mirrors UserStateHandlers
+EVENT_TYPES = {
+    EntryState: EventType.ENTRY,
+    AuthenticatedState: EventType.LOGIN,
+    BrowsingState: EventType.BROWSING,
+    ViewProductState: EventType.VIEW_PRODUCT,
+    AddToCartState: EventType.ADD_TO_CART,
+    RemoveFromCart: EventType.REMOVE_FROM_CART,
+    PlaceOrder: EventType.PLACE_ORDER,
+    UnauthenticatedState: EventType.LOGOUT,
+    TerminalState: EventType.EXIT,
+}
+
+
+class SessionSynthesizer:
+    """walks many sessions through the transition table at once, for backfills"""
+
+    def __init__(
+        self,
+        users: Catalog,
+        products: Catalog,
+        transitions: TransitionTable | None = None,
+        max_steps: int = 200,
+        rng: random.Random | None = None,
+    ):
+        self.rng = rng or random.Random()
+        self.users = users
+        self.products = products
+        self.transitions = transitions or DEFAULT_TABLE
+        self.max_steps = max_steps
+        self.event_types = [EVENT_TYPES.get(state) for state in self.transitions.states]
+
+    def paths(self, n: int) -> list[list[int]]:
+        table = self.transitions
+        paths = [[table.entry] for _ in range(n)]
+        groups: dict[int, list[int]] = {table.entry: list(range(n))}
+        steps = 0
+        while groups and steps < self.max_steps:
+            next_groups = defaultdict(list)
+            for state, sessions in groups.items():
+                picks = self.rng.choices(
+                    table.next_states[state],
+                    cum_weights=table.cum_weights[state],
+                    k=len(sessions),
+                )
+                for session, nxt in zip(sessions, picks):
+                    paths[session].append(nxt)
+                    if nxt != table.terminal:
+                        next_groups[nxt].append(session)
+            groups = next_groups
+            steps += 1
+
+        # sessions cut off by max_steps still exit
+        for sessions in groups.values():
+            for session in sessions:
+                paths[session].append(table.terminal)
+        return paths
+
+    def batch(
+        self, n: int, start: datetime, span: timedelta
+    ) -> dict[str, dict[str, list]]:
+        """rows of n sessions starting in [start, start + span), in write order"""
+        paths = self.paths(n)
+        # users can run more than one session
+        users = [self.users.sample(self.rng) for _ in range(n)]
+        offsets = self.rng.choices(range(int(span.total_seconds()) or 1), k=n)
+
+        events = {
+            "id": [],
+            "context_id": [],
+            "ip_address": [],
+            "user_name": [],
+            "user_agent": [],
+            "event_type": [],
+            "created_at": [],
+            "metadata": [],
+        }
+        orders = {"id": [], "u_id": [], "created_at": []}
+        order_lines = {
+            "id": [],
+            "order_id": [],
+            "product_id": [],
+            "quantity": [],
+            "created_at": [],
+        }
+
+        for path, user, offset in zip(paths, users, offsets):
+            context_id = random_uuid(self.rng)
+            at = start + timedelta(seconds=offset)
+            for state in path:
+                event_type = self.event_types[state]
+                if event_type is None:
+                    continue
+                at += timedelta(milliseconds=self.rng.randint(200, 5000))
+                events["id"].append(random_uuid(self.rng))
+                events["context_id"].append(context_id)
+                events["ip_address"].append(user["ip_address"])
+                events["user_name"].append(user["username"])
+                events["user_agent"].append(user["user_agent"])
+                events["event_type"].append(event_type.value)
+                events["created_at"].append(at)
+                events["metadata"].append(self._metadata(event_type))
+
+                if event_type is EventType.PLACE_ORDER:
+                    order_id = random_uuid(self.rng)
+                    orders["id"].append(order_id)
+                    orders["u_id"].append(user["id"])
+                    orders["created_at"].append(at)
+                    for product in self.products.sample_many(
+                        self.rng.randint(1, 5), self.rng
+                    ):
+                        order_lines["id"].append(random_uuid(self.rng))
+                        order_lines["order_id"].append(order_id)
+                        order_lines["product_id"].append(product["id"])
+                        order_lines["quantity"].append(self.rng.randint(1, 20))
+                        order_lines["created_at"].append(at)
+
+        return {"EVENT": events, "ORDER": orders, "ORDERLINE": order_lines}
+
+    def _metadata(self, event_type: EventType) -> dict | None:
+        if event_type is EventType.BROWSING:
+            return {
+                "page": self.rng.choice(
+                    ["home", "search", "product", "cart", "checkout"]
+                ),
+                "scroll_depth": self.rng.randint(0, 1),
+                "duration_ms": self.rng.randint(0, 4000),
+            }
+        if event_type is EventType.VIEW_PRODUCT:
+            product = self.products.sample(self.rng)
+            return {
+                "product_id": str(product["id"]),
+                "main_category": product["main_category"],
+                "sub_category": product["sub_category"],
+                "referrer": self.rng.choice(["home", "search", "recommendation"]),
+                "duration_ms": self.rng.randint(1000, 30000),
+            }
+        return None
+
+
+def records(columns: dict[str, list]) -> list[tuple]:
+    """column lists to row tuples, in the order of the dict keys"""
+    return list(zip(*columns.values()))
@@ -0,0 +1,227 @@
+import asyncio
+from dataclasses import replace
+from collections import Counter
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import time
+import traceback
+
+from generator.config import GeneratorConfig
+from generator.generator import Generator
+from generator.snapshot import remove_snapshot
+
+
+def _share(total: int, workers: int, index: int) -> int:
+    """split total as evenly as possible, the first workers take the remainder"""
+    return total // workers + (1 if index < total % workers else 0)
+
+
+async def _prepare(config: GeneratorConfig, logger):
+    # shared init runs once, before any worker starts writing
+    generator = Generator(replace(config, user_count=0), logger)
+    await generator.connect()
+    try:
+        await generator.run_ddl(generator.db_writer, config.rebuild_database)
+        if config.truncate_table:
+            await generator.truncate_tables(generator.db_writer)
+        await generator.create_products()
+    finally:
+        await generator.db_writer.close()
+
+
+async def _resume(config: GeneratorConfig, logger):
+    # skip_init runs no ddl, the ranges must exist before any worker writes.
+    # the catalog snapshot is checked, and rebuilt, once here, workers only map it
+    generator = Generator(replace(config, user_count=0), logger)
+    await generator.connect()
+    try:
+        if config.event_partition:
+            await generator.partition_manager(generator.db_writer).ensure()
+        if config.catalog_snapshot:
+            await generator.load_catalogs()
+    finally:
+        await generator.db_writer.close()
+
+
+async def _work(generator: Generator, index: int, skip_init: bool):
+    if generator.uses_database:
+        await generator.connect()
+    generator.open_sink()
+    if skip_init:
+        # the parent wrote the snapshot, workers writing it too would race
+        await generator.load_catalogs(save=False)
+    elif generator.uses_database:
+        # each worker creates and only samples its own slice of users
+        await generator.create_users()
+        generator.users.refreshable = False
+        await generator.products.load(generator.db_writer)
+    else:
+        await generator.create_users()
+        # every worker needs the products, one of them writes them out
+        await generator.create_products(write=index == 0)
+    await generator.run()
+
+
+def _worker_main(
+    index: int,
+    config: GeneratorConfig,
+    skip_init: bool,
+    results: multiprocessing.Queue,
+):
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(name=f"ecom_debezium.worker{index}")
+
+    generator = Generator(config, logger)
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        asyncio.run(_work(generator, index, skip_init))
+    except KeyboardInterrupt:
+        status = "interrupted"
+    except Exception as e:
+        logger.error(f"worker {index} failed: {e}")
+        traceback.print_exc()
+        status = "failed"
+
+    results.put(
+        {
+            "worker": index,
+            "status": status,
+            "elapsed": time.perf_counter() - started,
+            **generator.stats(),
+        }
+    )
+
+
+def run_workers(config: GeneratorConfig, workers: int, skip_init: bool = False):
+    """runs the simulation in worker processes, splitting users, sessions and rate"""
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(name="ecom_debezium")
+
+    # workers need one seed between them, product ids are drawn from it
+    if config.seed is None:
+        config = replace(config, seed=random.getrandbits(63))
+    logger.info(f"seed: {config.seed}, pass --seed {config.seed} to repeat this run")
+    if not skip_init and config.user_count < workers:
+        raise ValueError(f"user_count ({config.user_count}) must be at least workers")
+
+    if skip_init and config.sink[0] != "postgres":
+        raise ValueError("skip_init loads users from postgres")
+
+    if config.sink[0] == "postgres":
+        try:
+            if skip_init:
+                asyncio.run(_resume(config, logger))
+            else:
+                # workers create the catalogs again, with new ids
+                remove_snapshot(config.catalog_snapshot)
+                asyncio.run(_prepare(config, logger))
+        except KeyboardInterrupt:
+            print("User exit triggered during init, stopping")
+            return
+        except Exception as e:
+            # same as Generator.initialize in a single process
+            logger.error(f"error initializing generator: {e}")
+            traceback.print_exc()
+            return
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = []
+    for i in range(workers):
+        procs.append(
+            ctx.Process(
+                target=_worker_main,
+                args=(i, _worker_config(config, workers, i), skip_init, results),
+                name=f"generator-{i}",
+            )
+        )
+
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+
+    reports = []
+    deadline = None
+    while len(reports) < workers:
+        try:
+            reports.append(results.get(timeout=0.5))
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                logger.warning("workers did not drain in time, terminating")
+                break
+        except KeyboardInterrupt:
+            # workers get the same SIGINT and drain their buffers on their own
+            logger.info("interrupt received, waiting for workers to drain")
+            deadline = time.perf_counter() + config.drain_timeout + 5
+
+    for p in procs:
+        p.join(timeout=1)
+        if p.is_alive():
+            p.terminate()
+            p.join()
+
+    elapsed = time.perf_counter() - started
+    _report(reports, elapsed, logger)
+    return reports
+
+
+def _worker_config(config: GeneratorConfig, workers: int, i: int) -> GeneratorConfig:
+    """the share of worker i, the snapshot and the wal lag threshold are not split"""
+    return replace(
+        config,
+        worker=i,
+        user_count=_share(config.user_count, workers, i),
+        sessions=_share(config.sessions, workers, i),
+        concurrency=max(1, _share(config.concurrency, workers, i)),
+        max_concurrency=max(1, _share(config.max_concurrency, workers, i)),
+        profile=config.profile.scale(1 / workers) if config.profile else None,
+        backfill_sessions=_share(config.backfill_sessions, workers, i),
+        metrics_path=_worker_path(config.metrics_path, i),
+        sink=_worker_sink(config.sink, i),
+        record_path=_worker_path(config.record_path, i),
+        stamp_path=_worker_path(config.stamp_path, i),
+    )
+
+
+def _worker_path(path: str | None, index: int) -> str | None:
+    """a file per worker, metrics.json -> metrics.0.json"""
+    if not path:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def _worker_sink(sink: tuple[str, str | None], index: int) -> tuple[str, str | None]:
+    """file sinks get a directory per worker, files are not shared"""
+    kind, path = sink
+    if path is None:
+        return sink
+    return kind, os.path.join(path, f"worker{index}")
+
+
+def _report(reports: list[dict], elapsed: float, logger: logging.Logger):
+    for r in sorted(reports, key=lambda r: r["worker"]):
+        logger.info(
+            f"worker {r['worker']} ({r['status']}): sessions: {r['sessions']}, events: {r['events']}, "
+            f"events/s: {r['events'] / r['elapsed'] if r['elapsed'] else 0:.1f}"
+        )
+
+    sessions = sum(r["sessions"] for r in reports)
+    events = sum(r["events"] for r in reports)
+    dropped = sum(r["events_dropped"] for r in reports)
+    logger.info(
+        f"total: workers: {len(reports)}, sessions: {sessions}, events: {events}, dropped: {dropped}, "
+        f"elapsed: {elapsed:.1f}s, events/s: {events / elapsed if elapsed else 0:.1f}"
+    )
+
+    rows = Counter()
+    for r in reports:
+        rows.update(r["rows"])
+    totals = ", ".join(f"{table}: {count}" for table, count in sorted(rows.items()))
+    logger.info(f"rows written per table: {totals or 'none'}")
@@ -1,6 +1,17 @@
 import argparse
+import logging
+from datetime import timedelta
 
+from generator.config import GeneratorConfig
 from generator.generator import run_simulation
+from generator.workers import run_workers
+from generator.load import parse_profile
+from generator.mutations import parse_mix
+from generator.partitions import INTERVALS
+from generator.replay import run_replay
+from user_workflow_state_machine.workflow_sm import TransitionTable
+from utils.cdc import analyze, stamp_files
+from utils.sinks import parse_sink
 
 
 def main():
@@ -12,19 +23,245 @@ def main():
     )
     parser.add_argument("--rebuild", action="store_true", help="delete database")
     parser.add_argument("--skip_init", action="store_true", help="skip initialization")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of generator processes, users and sessions are split between them",
+    )
+    # one way of driving sessions per run, the others would be ignored
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--profile",
+        type=parse_profile,
+        help="open loop load profile: constant:RATE, step:RATE@SECONDS,..., "
+        "ramp:START,END@SECONDS or sine:BASE,AMPLITUDE@PERIOD",
+    )
+    parser.add_argument(
+        "--duration", type=float, help="seconds to run an open loop profile for"
+    )
+    parser.add_argument(
+        "--load_target",
+        choices=["sessions", "events"],
+        default="sessions",
+        help="whether profile rates are sessions/sec or events/sec",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=50,
+        help="max concurrent sessions",
+    )
+    mode.add_argument(
+        "--soak",
+        action="store_true",
+        help="keep --concurrency sessions running for --duration seconds, or until stopped",
+    )
+    parser.add_argument(
+        "--drain_timeout",
+        type=float,
+        default=30,
+        help="seconds to wait for buffered writes on shutdown",
+    )
+    parser.add_argument(
+        "--transitions",
+        type=TransitionTable.from_json,
+        help="json file overriding per state transition weights",
+    )
+    mode.add_argument(
+        "--backfill",
+        type=int,
+        default=0,
+        help="synthesize this many sessions over the last day and bulk write them",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="export metrics to this file, prometheus text or json when it ends in .json",
+    )
+    parser.add_argument(
+        "--metrics_interval",
+        type=float,
+        default=10,
+        help="seconds between metrics exports",
+    )
+    parser.add_argument(
+        "--sink",
+        type=parse_sink,
+        default="postgres",
+        help="where rows go: postgres, null, jsonl:DIR or csv:DIR",
+    )
+    parser.add_argument(
+        "--record",
+        help="also log every write to this file, for --replay",
+    )
+    parser.add_argument(
+        "--replay",
+        help="write a log made with --record instead of generating",
+    )
+    parser.add_argument(
+        "--replay_speed",
+        type=float,
+        default=1,
+        help="1 keeps the recorded pacing, N is N times faster, 0 is as fast as possible",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="seed every session and worker from this, so the run can be repeated",
+    )
+    parser.add_argument(
+        "--catalog_snapshot",
+        default="static/.cache/catalog.snapshot",
+        help="users and products loaded from postgres are cached here and "
+        "mapped by later --skip_init runs while row counts match, empty to disable",
+    )
+    parser.add_argument(
+        "--pool_size",
+        type=int,
+        default=10,
+        help="database connections per process",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="grow and shrink concurrent sessions from write latency and pool wait",
+    )
+    parser.add_argument(
+        "--latency_budget",
+        type=float,
+        default=50,
+        help="write p99 in ms the adaptive controller stays under",
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=500,
+        help="upper bound on concurrent sessions for --adaptive",
+    )
+    parser.add_argument(
+        "--max_wal_lag",
+        type=float,
+        help="hold back new sessions while a logical slot retains more than this many MB of wal",
+    )
+    parser.add_argument(
+        "--replication_slot",
+        help="slot to watch for --max_wal_lag, every logical slot by default",
+    )
+    parser.add_argument(
+        "--partition_events",
+        choices=list(INTERVALS),
+        help="range partition EVENT by created_at, one partition per hour or day",
+    )
+    parser.add_argument(
+        "--partitions_ahead",
+        type=int,
+        default=2,
+        help="partitions created ahead of the current one",
+    )
+    parser.add_argument(
+        "--event_retention",
+        type=float,
+        help="drop EVENT partitions older than this many hours",
+    )
+    parser.add_argument(
+        "--detach_expired",
+        action="store_true",
+        help="detach expired partitions instead of dropping them",
+    )
+    parser.add_argument(
+        "--event_brin",
+        action="store_true",
+        help="add a BRIN index on EVENT.created_at",
+    )
+    parser.add_argument(
+        "--mutation_mix",
+        type=parse_mix,
+        help="insert:update:delete weights for orders, e.g. 70:20:10 updates and "
+        "cancels recently placed orders alongside the inserts",
+    )
+    parser.add_argument(
+        "--stamps",
+        help="write the commit time of sampled rows here, or read them back with --cdc_latency",
+    )
+    parser.add_argument(
+        "--stamp_rate",
+        type=float,
+        default=0.01,
+        help="share of rows stamped for --stamps",
+    )
+    parser.add_argument(
+        "--cdc_latency",
+        help="measure capture latency from debezium json envelopes in this file, - for stdin",
+    )
+    parser.add_argument(
+        "--cdc_window",
+        type=float,
+        default=10,
+        help="seconds per throughput and latency line of --cdc_latency",
+    )
     args = parser.parse_args()
 
-    user_count = args.user_count
-    truncate_table = args.truncate_table
-    rebuild_database = args.rebuild
-    skip_init = args.skip_init
+    if args.cdc_latency:
+        logging.basicConfig(level=logging.INFO)
+        analyze(
+            args.cdc_latency,
+            logging.getLogger(name="ecom_debezium"),
+            stamp_paths=stamp_files(args.stamps),
+            window=args.cdc_window,
+        )
+        return
+
+    if args.replay:
+        run_replay(
+            path=args.replay,
+            speed=args.replay_speed,
+            truncate_table=args.truncate_table,
+            rebuild_database=args.rebuild,
+            sink=args.sink,
+            event_partition=args.partition_events,
+            event_brin=args.event_brin,
+        )
+        return
 
-    run_simulation(
-        user_count=user_count,
-        truncate_table=truncate_table,
-        rebuild_database=rebuild_database,
-        skip_init=skip_init,
+    config = GeneratorConfig(
+        user_count=args.user_count or 0,
+        truncate_table=args.truncate_table,
+        rebuild_database=args.rebuild,
+        concurrency=args.concurrency,
+        profile=args.profile,
+        duration=args.duration,
+        load_target=args.load_target,
+        soak=args.soak,
+        drain_timeout=args.drain_timeout,
+        transitions=args.transitions,
+        backfill_sessions=args.backfill,
+        metrics_path=args.metrics,
+        metrics_interval=args.metrics_interval,
+        sink=args.sink,
+        record_path=args.record,
+        seed=args.seed,
+        catalog_snapshot=args.catalog_snapshot or None,
+        pool_size=args.pool_size,
+        adaptive=args.adaptive,
+        latency_budget=args.latency_budget / 1000,
+        max_concurrency=args.max_concurrency,
+        max_wal_lag=int(args.max_wal_lag * (1 << 20)) if args.max_wal_lag else None,
+        replication_slot=args.replication_slot,
+        event_partition=args.partition_events,
+        partitions_ahead=args.partitions_ahead,
+        event_retention=(
+            timedelta(hours=args.event_retention) if args.event_retention else None
+        ),
+        detach_expired=args.detach_expired,
+        event_brin=args.event_brin,
+        mutation_mix=args.mutation_mix,
+        stamp_path=args.stamps,
+        stamp_rate=args.stamp_rate,
     )
+    if args.workers > 1:
+        run_workers(config, workers=args.workers, skip_init=args.skip_init)
+    else:
+        run_simulation(config, skip_init=args.skip_init)
 
 
 if __name__ == "__main__":
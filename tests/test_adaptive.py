@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+import pytest
+
+from generator.adaptive import AimdController, ConcurrencyLimit
+from utils.metrics import MetricsRegistry
+
+
+@pytest.mark.asyncio
+async def test_limit_admits_more_when_resized_up_and_fewer_when_down():
+    limit = ConcurrencyLimit(1)
+    release = asyncio.Event()
+    running = []
+
+    async def task(i):
+        async with limit:
+            running.append(i)
+            await release.wait()
+
+    tasks = [asyncio.create_task(task(i)) for i in range(4)]
+    await asyncio.sleep(0)
+    assert running == [0]
+
+    limit.resize(3)
+    await asyncio.sleep(0)
+    assert running == [0, 1, 2]
+
+    # shrinking never preempts, it only stops new admissions
+    limit.resize(1)
+    release.set()
+    await asyncio.gather(*tasks)
+    assert running == [0, 1, 2, 3]
+    assert limit.active == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_no_gap():
+    limit = ConcurrencyLimit(1)
+    await limit.acquire()
+    waiter = asyncio.create_task(limit.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    limit.release()
+    await asyncio.wait_for(limit.acquire(), 1)
+    assert limit.active == 1
+
+
+def make_controller(registry, resized):
+    return AimdController(
+        resize=resized.append,
+        rows=lambda: 0,
+        logger=logging.getLogger("test"),
+        limit=20,
+        max_limit=30,
+        latency_budget=0.01,
+        wait_budget=0.001,
+        step=5,
+        backoff=0.5,
+        metrics=registry,
+    )
+
+
+def test_controller_grows_backs_off_and_undoes_costly_steps():
+    registry = MetricsRegistry()
+    upsert = registry.histogram("db_statement_seconds", op="upsert", table="event")
+    select = registry.histogram("db_statement_seconds", op="select", table="user")
+    wait = registry.histogram("db_pool_acquire_seconds")
+    resized = []
+    controller = make_controller(registry, resized)
+
+    # nothing written, nothing to go on
+    controller.tick(1, 0)
+    assert resized == []
+
+    upsert.observe(0.002)
+    controller.tick(1, 1000)
+    assert resized == [25]
+
+    # slower selects do not count against the write budget
+    select.observe(1.0)
+    upsert.observe(0.002)
+    controller.tick(1, 800)
+    assert resized == [25, 20]
+
+    upsert.observe(0.002)
+    controller.tick(1, 900)
+    upsert.observe(0.002)
+    controller.tick(1, 1000)
+    upsert.observe(0.002)
+    controller.tick(1, 1000)
+    assert resized == [25, 20, 25, 30]
+    assert controller.best_rate == 1000
+
+    # the window only holds what happened since the last tick
+    upsert.observe(0.5)
+    controller.tick(1, 1000)
+    assert resized[-1] == 15
+    upsert.observe(0.002)
+    wait.observe(0.1)
+    controller.tick(1, 1000)
+    assert resized[-1] == 7
+    assert registry.counter("adaptive_decisions_total", action="decrease").value == 3
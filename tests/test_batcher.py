@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+import pytest
+
+from benchmarks.fakes import new_event
+from utils import EventBatcher
+
+
+class RecordingSink:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.batches = []
+
+    async def write(self, table, data, **_):
+        await asyncio.sleep(self.delay)
+        self.batches.append((table, list(data)))
+
+
+def make_batcher(sink, **kwargs):
+    return EventBatcher(sink=sink, logger=logging.getLogger("test"), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_flushes_on_row_count():
+    sink = RecordingSink()
+    batcher = make_batcher(sink, max_rows=3, linger=10)
+    batcher.start()
+    for _ in range(7):
+        await batcher.add(new_event())
+    await asyncio.sleep(0.01)
+
+    assert [len(rows) for _, rows in sink.batches] == [3, 3]
+    await batcher.close()
+    assert [len(rows) for _, rows in sink.batches] == [3, 3, 1]
+    assert batcher.rows_written == 7
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_linger():
+    sink = RecordingSink()
+    batcher = make_batcher(sink, max_rows=100, linger=0.02)
+    batcher.start()
+    await batcher.add(new_event())
+    await asyncio.sleep(0.05)
+
+    assert len(sink.batches) == 1
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_flush_signal_skips_linger():
+    sink = RecordingSink()
+    batcher = make_batcher(sink, max_rows=100, linger=10)
+    batcher.start()
+    await batcher.add(new_event())
+    batcher.flush()
+    await asyncio.sleep(0.01)
+
+    assert len(sink.batches) == 1
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_blocks_producers():
+    sink = RecordingSink(delay=0.05)
+    batcher = make_batcher(sink, max_rows=2, max_pending=2, linger=0)
+    batcher.start()
+    await batcher.add(new_event())
+    await batcher.add(new_event())
+
+    blocked = asyncio.create_task(batcher.add(new_event()))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    await asyncio.sleep(0.06)
+    assert blocked.done()
+    await batcher.close()
+    assert batcher.rows_written == 3
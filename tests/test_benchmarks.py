@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+import benchmarks.run as bench
+from benchmarks.fakes import RecordingPool
+from benchmarks.run import compare, fake_columns, main
+
+
+def test_compare_flags_slowdowns_beyond_tolerance():
+    baseline = {"results": {"a": {"per_op_us": 10.0}, "b": {"per_op_us": 10.0}}}
+    current = {"results": {"a": {"per_op_us": 12.0}, "b": {"per_op_us": 13.0}}}
+
+    rows = {row["name"]: row for row in compare(current, baseline, tolerance=0.25)}
+    assert not rows["a"]["regressed"]
+    assert rows["b"]["regressed"]
+
+
+def test_main_fails_on_regression(tmp_path):
+    output = tmp_path / "current.json"
+    args = ["--only", "event_new", "--scale", "0.01", "--repeat", "1"]
+    assert main(args + ["--output", str(output)]) == 0
+    assert "event_new" in json.loads(output.read_text())["results"]
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": {"event_new": {"per_op_us": 1e-6}}}))
+    assert main(args + ["--baseline", str(baseline)]) == 1
+
+
+class UniquePool(RecordingPool):
+    """rejects a row id it has seen before, like the EVENT primary key"""
+
+    def __init__(self, columns):
+        super().__init__(columns)
+        self.ids = set()
+
+    def _insert(self, records):
+        for record in records:
+            if record[0] in self.ids:
+                raise ValueError(f"duplicate key {record[0]}")
+            self.ids.add(record[0])
+
+    async def executemany(self, query, args):
+        await super().executemany(query, args)
+        self._insert(args)
+
+    async def copy_records_to_table(self, table_name, records, **kwargs):
+        await super().copy_records_to_table(table_name, records, **kwargs)
+        self._insert(records)
+
+
+@pytest.mark.asyncio
+async def test_pg_cases_insert_new_events_on_every_call(monkeypatch):
+    pool = UniquePool(fake_columns(f"bench_{os.getpid()}"))
+
+    async def create_pool(**_):
+        return pool
+
+    monkeypatch.setattr(bench.asyncpg, "create_pool", create_pool)
+    only = ["pg_upsert_500_events", "pg_bulk_upsert_5000_events"]
+    result = await bench.run(dsn="postgres://bench", scale=0.1, repeat=2, only=only)
+    assert set(result["results"]) == set(only)
+    # warmup and two repeats of two and one calls, plus the seeded user and product
+    assert len(pool.ids) == 500 * 5 + 5000 * 3 + 2
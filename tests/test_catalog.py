@@ -0,0 +1,62 @@
+import logging
+
+import pytest
+
+from generator.catalog import Catalog
+from utils.models import Order
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def iterate(self, table, columns, **_):
+        for row in self.rows:
+            yield row
+
+
+def test_extend_keeps_one_list_per_column():
+    catalog = Catalog(table="ORDER", columns=["id", "u_id"])
+    orders = [Order.new(u_id=f"u{i}") for i in range(5)]
+    catalog.extend(orders)
+
+    assert len(catalog) == 5
+    assert catalog.row(2) == {"id": orders[2].id, "u_id": "u2"}
+    assert catalog.sample()["u_id"] in {f"u{i}" for i in range(5)}
+
+
+def test_sample_many_is_distinct_and_bounded():
+    catalog = Catalog(table="PRODUCT", columns=["id"])
+    catalog.extend([{"id": i} for i in range(20)])
+
+    sample = catalog.sample_many(10)
+    assert len({row["id"] for row in sample}) == 10
+    assert len(catalog.sample_many(50)) == 20
+
+
+def test_sample_from_empty_catalog_raises():
+    with pytest.raises(LookupError):
+        Catalog(table="USER", columns=["id"]).sample()
+
+
+@pytest.mark.asyncio
+async def test_load_replaces_rows():
+    catalog = Catalog(table="USER", columns=["id", "username"])
+    catalog.extend([{"id": 0, "username": "stale"}])
+
+    await catalog.load(FakeDatabase([{"id": i, "username": f"u{i}"} for i in range(3)]))
+    assert len(catalog) == 3
+    assert catalog.row(0) == {"id": 0, "username": "u0"}
+
+
+@pytest.mark.asyncio
+async def test_slices_are_not_refreshed():
+    catalog = Catalog(table="USER", columns=["id"])
+    catalog.refreshable = False
+    catalog.start_refresh(FakeDatabase([]), logging.getLogger("test"), interval=0)
+    assert catalog._refresh_task is None
+
+    catalog.refreshable = True
+    catalog.start_refresh(FakeDatabase([]), logging.getLogger("test"), interval=0)
+    assert catalog._refresh_task is not None
+    await catalog.stop_refresh()
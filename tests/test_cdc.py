@@ -0,0 +1,137 @@
+import io
+import json
+import logging
+
+import pytest
+
+from utils.cdc import (
+    LatencyAnalyzer,
+    StampingSink,
+    analyze,
+    read_envelopes,
+    read_stamps,
+)
+from utils.models import Order
+
+
+class FakeSink:
+    def __init__(self):
+        self.rows_written = 0
+        self.writes = []
+        self.closed = False
+
+    async def write(self, table, data, conflict_keys=None):
+        self.writes.append((table, len(data)))
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        self.writes.append((table, len(records)))
+
+    async def write_atomic(self, writes):
+        self.writes.extend((table, len(data)) for table, data in writes)
+
+    async def write_atomic_records(self, writes):
+        self.writes.extend((table, len(records)) for table, _, records in writes)
+
+    async def close(self):
+        self.closed = True
+
+
+def envelope(row_id, committed_ms, seen_us, op="c", wrapped=True):
+    payload = {
+        "op": op,
+        "after": {"id": row_id},
+        "source": {"ts_ms": committed_ms},
+        "ts_us": seen_us,
+    }
+    return {"schema": {}, "payload": payload} if wrapped else payload
+
+
+@pytest.mark.asyncio
+async def test_stamping_sink_keeps_its_stride_across_writes(tmp_path):
+    inner = FakeSink()
+    path = tmp_path / "stamps.csv"
+    sink = StampingSink(inner, str(path), rate=0.25)
+
+    await sink.write("EVENT", [{"id": f"e{i}"} for i in range(3)])
+    await sink.write_records("EVENT", ["x", "id"], [(0, f"e{i}") for i in range(3, 7)])
+    await sink.write_atomic_records(
+        [("ORDER", ["id"], [("o0",), ("o1",)]), ("ORDERLINE", ["id"], [("l0",)])]
+    )
+    await sink.write_atomic([("ORDER", [Order("o2", "u", None)])])
+    await sink.close()
+
+    assert inner.closed and len(inner.writes) == 5
+    lines = path.read_text().splitlines()
+    assert [line.rsplit(",", 1)[0] for line in lines] == [
+        "event,e0",
+        "event,e4",
+        "order,o1",
+    ]
+    assert sink.stamped == 3
+    assert set(read_stamps([str(path)])) == {"e0", "e4", "o1"}
+
+    with pytest.raises(ValueError):
+        StampingSink(inner, str(path), rate=0)
+
+
+def test_analyzer_measures_capture_and_end_to_end():
+    analyzer = LatencyAnalyzer(stamps={"r1": 1_000_000, "gone": 0}, window=10)
+    # source.ts in ms, seen in us: 20ms, 40ms and 2s of capture latency
+    assert analyzer.feed(envelope("r0", 1_000, 1_020_000)) is None
+    analyzer.feed(envelope("r1", 1_000, 1_040_000, wrapped=False))
+    analyzer.feed(None)
+    analyzer.feed({"payload": {"op": "c", "after": {"id": "x"}}})
+    analyzer.feed({"payload": {"source": {"ts_ns": 1}, "after": {"id": "x"}}})
+    closed = analyzer.feed(envelope("r2", 10_000, 12_000_000))
+    assert closed["events"] == 2 and closed["events_per_sec"] == 0.2
+    assert closed["capture_p99"] == pytest.approx(0.04, rel=0.1)
+
+    summary = analyzer.finish()
+    assert summary["envelopes"] == 3 and summary["skipped"] == 3
+    assert summary["span"] == pytest.approx(10.98)
+    assert summary["capture"]["count"] == 3
+    assert summary["capture"]["p50"] == pytest.approx(0.04, rel=0.1)
+    assert summary["capture"]["max"] == pytest.approx(2.0)
+    assert summary["end_to_end"]["count"] == 1
+    assert summary["end_to_end"]["max"] == pytest.approx(0.04)
+    assert summary["end_to_end"]["unmatched"] == 1
+    assert summary["last_window"]["events"] == 1
+
+
+def test_read_envelopes_handles_tombstones_and_keys():
+    fp = io.StringIO(
+        "\n".join(
+            [
+                json.dumps(envelope("a", 1, 1000)),
+                "",
+                "null",
+                '{"id": "b"}\t' + json.dumps(envelope("b", 1, 2000)),
+                "not json",
+            ]
+        )
+    )
+    envelopes = list(read_envelopes(fp))
+    assert envelopes[0]["payload"]["after"]["id"] == "a"
+    assert envelopes[1] is None
+    assert envelopes[2]["payload"]["after"]["id"] == "b"
+    assert envelopes[3] is None
+
+
+def test_analyze_reads_a_capture_file(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    capture.write_text(
+        "".join(
+            json.dumps(envelope(f"r{i}", 1_000 + i, 1_005_000 + i * 1_000)) + "\n"
+            for i in range(100)
+        )
+    )
+    stamps = tmp_path / "stamps.csv"
+    stamps.write_text("event,r0,1000000\nevent,r50,1050000\n")
+
+    summary = analyze(
+        str(capture), logging.getLogger("test"), stamp_paths=[str(stamps)], window=1
+    )
+    assert summary["envelopes"] == 100
+    assert summary["capture"]["max"] == pytest.approx(0.005)
+    assert summary["end_to_end"]["count"] == 2
+    assert summary["end_to_end"]["unmatched"] == 0
@@ -0,0 +1,70 @@
+import ipaddress
+import logging
+
+import pytest
+
+from benchmarks.fakes import RecordingPool
+from utils import Database
+from utils.codecs import (
+    JsonText,
+    decode_cidr,
+    decode_jsonb,
+    encode_cidr,
+    encode_jsonb,
+    register_codecs,
+)
+from utils.models import Event, EventType
+
+
+def test_jsonb_round_trip_and_passes_marked_text_through():
+    assert encode_jsonb({"a": [1, "ü"]}) == b'\x01{"a":[1,"\xc3\xbc"]}'
+    assert decode_jsonb(encode_jsonb({"a": [1, "ü"]})) == {"a": [1, "ü"]}
+    # a plain str is a json string value, only JsonText is sent as it is
+    assert decode_jsonb(encode_jsonb('{"a": 1}')) == '{"a": 1}'
+    assert encode_jsonb(JsonText('{"a": 1}')) == b'\x01{"a": 1}'
+
+
+def test_cidr_matches_postgres_binary_format():
+    assert encode_cidr("10.1.2.3") == bytes((2, 32, 1, 4, 10, 1, 2, 3))
+    assert encode_cidr("10.0.0.0/8") == bytes((2, 8, 1, 4, 10, 0, 0, 0))
+    assert encode_cidr(ipaddress.ip_network("10.1.2.3/32")) == encode_cidr("10.1.2.3")
+    v6 = encode_cidr("2001:db8::1")
+    assert v6[:4] == bytes((3, 128, 1, 16)) and len(v6) == 20
+    assert decode_cidr(encode_cidr("10.1.2.3")) == "10.1.2.3/32"
+    assert decode_cidr(v6) == "2001:db8::1/128"
+
+
+class CodecConnection:
+    def __init__(self):
+        self.codecs = {}
+
+    async def set_type_codec(self, name, *, schema, encoder, decoder, format):
+        self.codecs[name] = (schema, format)
+
+
+@pytest.mark.asyncio
+async def test_register_codecs_sets_binary_codecs():
+    conn = CodecConnection()
+    await register_codecs(conn)
+    assert conn.codecs == {
+        "jsonb": ("pg_catalog", "binary"),
+        "cidr": ("pg_catalog", "binary"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_native_json_database_sends_dicts_unencoded():
+    pool = RecordingPool(record=True)
+    db = Database(
+        logger=logging.getLogger("test"),
+        schema="test",
+        conn=pool,
+        native_json=True,
+    )
+    event = Event.new("bob", "10.0.0.1", "agent", EventType.CLICK, metadata={"x": 1})
+    await db.upsert(table="event", data=[event])
+    await db.upsert(table="event", data=[{"id": event.id, "metadata": {"x": 1}}])
+
+    (_, _, first), (_, _, second) = pool.calls
+    assert first[0][-1] == {"x": 1}
+    assert second == [(event.id, {"x": 1})]
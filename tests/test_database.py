@@ -0,0 +1,227 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.fakes import RecordingPool
+from utils import Database
+from utils.metrics import MetricsRegistry
+from utils.models import Event, EventType, Order, OrderLine
+
+COLUMNS = {
+    'test."order"': ["id", "u_id", "created_at", "status", "updated_at"],
+    'test."orderline"': ["id", "order_id", "product_id", "quantity", "created_at"],
+    'test."event"': ["id", "event_type", "metadata"],
+}
+
+
+def make_db():
+    pool = RecordingPool(COLUMNS, types={"metadata": "jsonb"}, record=True)
+    db = Database(logger=logging.getLogger("test"), schema="test", conn=pool)
+    return db, pool
+
+
+@pytest.mark.asyncio
+async def test_upsert_uses_executemany():
+    db, pool = make_db()
+    order = Order.new(u_id="u1")
+    await db.upsert(table="order", data=[order])
+
+    kind, query, args = pool.calls[0]
+    assert kind == "executemany"
+    assert query.startswith("INSERT INTO test.order (id, u_id, created_at)")
+    assert args == [(order.id, "u1", order.created_at)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_without_conflict_copies_directly():
+    db, pool = make_db()
+    orders = [Order.new(u_id="u1") for _ in range(3)]
+    await db.bulk_upsert(table="ORDER", data=orders)
+
+    kind, table, kwargs = pool.calls[0]
+    assert kind == "copy"
+    assert table == "order"
+    assert kwargs["schema_name"] == "test"
+    assert kwargs["columns"] == ["id", "u_id", "created_at"]
+    assert len(kwargs["records"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_with_conflict_merges_from_temp_table():
+    db, pool = make_db()
+    await db.bulk_upsert(
+        table="USER",
+        data=[{"id": "1", "username": "a", "metadata": {"k": 1}}],
+        conflict_keys=["id"],
+    )
+
+    kinds = [call[0] for call in pool.calls]
+    assert kinds == ["begin", "execute", "copy", "execute", "commit"]
+    assert "CREATE TEMP TABLE _bulk_user" in pool.calls[1][1]
+    assert pool.calls[2][2]["records"] == [("1", "a", '{"k": 1}')]
+    merge = pool.calls[3][1]
+    assert "SELECT DISTINCT ON (id) id, username, metadata FROM _bulk_user" in merge
+    assert "ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username" in merge
+
+
+@pytest.mark.asyncio
+async def test_select_binds_where_and_limit():
+    db, pool = make_db()
+    await db.select(
+        table="USER",
+        columns=["id"],
+        where_clause={"username": "a", "gender": "F"},
+        order_by=["RANDOM()"],
+        limit=5,
+    )
+
+    _, query, args = pool.calls[0]
+    assert "WHERE username = $1 AND gender = $2" in query
+    assert "LIMIT $3" in query
+    assert args == ("a", "F", 5)
+
+
+@pytest.mark.asyncio
+async def test_statement_cache_reuses_query_text():
+    db, pool = make_db()
+    for _ in range(3):
+        await db.upsert(table="order", data=[Order.new(u_id="u1")])
+    await db.upsert(table="order", data=[Order.new(u_id="u1")], conflict_keys=["id"])
+
+    queries = [call[1] for call in pool.calls]
+    assert queries[0] is queries[1] is queries[2]
+    assert "ON CONFLICT (id)" in queries[3]
+    assert db.statements.stats() == {"hits": 2, "misses": 2, "size": 2}
+
+
+@pytest.mark.asyncio
+async def test_insert_atomic_writes_tables_in_one_statement():
+    db, pool = make_db()
+    order = Order.new(u_id="u1")
+    lines = [OrderLine.new(order_id=order.id, product_id="p1", quantity=2)] * 2
+
+    for _ in range(2):
+        await db.insert_atomic([("order", [order]), ("orderline", lines)])
+
+    statements = [call for call in pool.calls if call[0] == "execute"]
+    assert len(statements) == 2
+    _, query, args = statements[0]
+    assert query.startswith("WITH w0 AS (INSERT INTO test.order (id, u_id, created_at)")
+    assert "w1 AS (INSERT INTO test.orderline" in query
+    assert "unnest($4::text[], $5::text[]" in query
+    assert args[0] == [order.id]
+    assert args[4] == [order.id, order.id]
+    # column types are looked up once per table
+    assert len([call for call in pool.calls if call[0] == "fetch"]) == 2
+    assert db.rows_written == {"order": 2, "orderline": 4}
+
+
+@pytest.mark.asyncio
+async def test_database_records_statement_latency_and_pool_wait():
+    registry = MetricsRegistry()
+    db = Database(
+        logger=logging.getLogger("test"),
+        schema="test",
+        conn=RecordingPool(COLUMNS),
+        metrics=registry,
+    )
+    await db.upsert(table="order", data=[Order.new(u_id="u1"), Order.new(u_id="u2")])
+
+    latency = registry.histogram("db_statement_seconds", op="upsert", table="order")
+    rows = registry.histogram("db_statement_rows", op="upsert", table="order")
+    assert latency.count == 1
+    assert rows.sum == 2
+    assert registry.histogram("db_pool_acquire_seconds").count == 1
+
+
+def test_rows_builds_model_tuples_in_column_order():
+    events = [
+        Event.new("bob", "127.0.0.1", "agent", EventType.CLICK, metadata={"x": 1}),
+        Event.new("bob", "127.0.0.1", "agent", EventType.EXIT),
+    ]
+    columns, records = Database._rows(events)
+
+    assert columns == list(Event.COLUMNS)
+    assert columns[-1] == "metadata"
+    assert records[0][-1] == '{"x": 1}'
+    assert records[0][:-1] == events[0].values()[:-1]
+    assert records[1][-1] is None
+    # slots, no per instance dict
+    assert not hasattr(events[0], "__dict__")
+    assert Database._normalize(events)[0]["metadata"] == {"x": 1}
+
+
+@pytest.mark.asyncio
+async def test_replication_slots_filters_logical_slots():
+    db, pool = make_db()
+    await db.replication_slots()
+    await db.replication_slots("debezium")
+
+    (_, every, no_args), (_, one, args) = pool.calls
+    assert "FROM pg_replication_slots s" in every
+    assert "s.slot_type = 'logical'" in every and "$1" not in every
+    assert no_args == ()
+    assert one.endswith("AND s.slot_name = $1") and args == ("debezium",)
+
+
+@pytest.mark.asyncio
+async def test_partition_ddl_is_schema_qualified():
+    db, pool = make_db()
+    start = datetime(2026, 10, 18, tzinfo=timezone.utc)
+    await db.create_partition(
+        "EVENT", "event_p20261018", start, start + timedelta(days=1)
+    )
+    await db.detach_partition("EVENT", "event_p20261018")
+    await db.drop_tables(["event_p20261018"])
+
+    create, detach, drop = [call[1] for call in pool.calls]
+    assert create == (
+        "CREATE TABLE IF NOT EXISTS test.event_p20261018 PARTITION OF test.EVENT "
+        "FOR VALUES FROM ('2026-10-18T00:00:00+00:00') TO ('2026-10-19T00:00:00+00:00')"
+    )
+    assert detach == "ALTER TABLE test.EVENT DETACH PARTITION test.event_p20261018"
+    assert drop == "DROP TABLE IF EXISTS test.event_p20261018"
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_are_set_based():
+    db, pool = make_db()
+    updated = await db.update_records(
+        "order", "id", ["status", "updated_at"], [("o1", "PAID", None)] * 2
+    )
+    deleted = await db.delete_records(
+        "order", "id", ["o1", "o2"], children=[("orderline", "order_id")]
+    )
+    assert (updated, deleted) == (2, 2)
+
+    (_, update, update_args), (_, delete, delete_args) = [
+        call for call in pool.calls if call[0] == "execute"
+    ]
+    assert update == (
+        "UPDATE test.order AS t SET status = u.status, updated_at = u.updated_at "
+        "FROM unnest($1::text[], $2::text[], $3::text[]) AS u(id, status, updated_at) "
+        "WHERE t.id = u.id"
+    )
+    assert update_args == (["o1", "o1"], ["PAID", "PAID"], [None, None])
+    assert delete == (
+        "WITH c0 AS (DELETE FROM test.orderline WHERE order_id = ANY($1::text[])) "
+        "DELETE FROM test.order WHERE id = ANY($1::text[])"
+    )
+    assert delete_args == (["o1", "o2"],)
+
+
+@pytest.mark.asyncio
+async def test_records_encode_json_columns_without_the_codec():
+    records = [("e1", "BROWSING", {"page": "home"}), ("e2", "USER_EXIT", None)]
+    db, pool = make_db()
+    await db.bulk_upsert_records("EVENT", ["id", "event_type", "metadata"], records)
+    assert pool.calls[-1][2]["records"] == [
+        ("e1", "BROWSING", '{"page": "home"}'),
+        ("e2", "USER_EXIT", None),
+    ]
+
+    # the binary codec takes the dicts as they are
+    db.native_json = True
+    await db.bulk_upsert_records("EVENT", ["id", "event_type", "metadata"], records)
+    assert pool.calls[-1][2]["records"] == records
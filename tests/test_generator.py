@@ -0,0 +1,162 @@
+import asyncio
+import logging
+
+import pytest
+
+from benchmarks.fakes import RecordingPool, fake_columns, make_generator
+from generator.config import GeneratorConfig
+from generator.generator import Generator
+from utils import Database, NullSink
+
+
+def generator_on(pool: RecordingPool, **options) -> Generator:
+    db = Database(logger=logging.getLogger("test"), schema="test", conn=pool)
+    return make_generator(db, users=5, products=20, **options)
+
+
+@pytest.mark.asyncio
+async def test_soak_runs_for_duration_and_counts_rows():
+    pool = RecordingPool(fake_columns("test"))
+    generator = generator_on(pool, soak=True, duration=0.2, concurrency=4)
+    await generator.run()
+
+    rows = generator.db_writer.rows_written
+    assert generator.sessions_completed > 0
+    assert generator.event_batcher.rows_written > 0
+    # PLACE_ORDER events are written together with their order
+    assert rows["event"] == generator.event_batcher.rows_written + rows["order"]
+    assert rows["orderline"] >= rows["order"]
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_buffered_events():
+    pool = RecordingPool(fake_columns("test"), delay=0.01)
+    generator = generator_on(pool, soak=True, concurrency=4)
+    run = asyncio.create_task(generator.run())
+    await asyncio.sleep(0.1)
+    generator.request_stop()
+    await asyncio.wait_for(run, timeout=5)
+
+    assert generator.event_batcher.rows_dropped == 0
+    assert len(generator.pending) == 0
+    assert generator.db_writer.rows_written["event"] > 0
+
+
+@pytest.mark.asyncio
+async def test_backfill_writes_every_table():
+    pool = RecordingPool(fake_columns("test"))
+    generator = generator_on(pool, backfill_sessions=300)
+    await generator.run()
+
+    rows = generator.db_writer.rows_written
+    assert generator.sessions_completed == 300
+    assert rows["event"] >= 300 * 4
+    assert rows["order"] > 0 and rows["orderline"] >= rows["order"]
+
+
+class CollectingSink(NullSink):
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        await super().write_records(table, columns, records, conflict_keys)
+        for record in records:
+            row = dict(zip(columns, record))
+            # timestamps are wall clock, the only thing a seed does not fix
+            row.pop("created_at", None)
+            row.pop("updated_at", None)
+            self.rows.append((table.lower(), sorted(row.items())))
+
+    async def write(self, table, data, conflict_keys=None):
+        await self.write_records(table, *Database._rows(data))
+
+
+async def seeded_rows(concurrency: int):
+    config = GeneratorConfig(
+        user_count=50,
+        sessions=30,
+        concurrency=concurrency,
+        seed=7,
+        sink=("null", None),
+    )
+    generator = Generator(config, logging.getLogger("test"))
+    generator.sink = CollectingSink()
+    await generator.create_users()
+    generator.products.extend(
+        [
+            {"id": f"p{i}", "main_category": "main", "sub_category": "sub"}
+            for i in range(20)
+        ]
+    )
+    await generator.run()
+    return sorted(generator.sink.rows)
+
+
+@pytest.mark.asyncio
+async def test_seeded_runs_repeat_at_any_concurrency():
+    one = await seeded_rows(concurrency=1)
+    many = await seeded_rows(concurrency=10)
+    assert len(one) > 30 * 10
+    assert one == many
+
+
+class FakePartitionManager:
+    def __init__(self, pool, error=None):
+        self.pool = pool
+        self.error = error
+        self.rows_at_ensure = None
+        self.running = False
+
+    async def ensure(self):
+        if self.error:
+            raise self.error
+        self.rows_at_ensure = self.pool.rows
+
+    async def run(self):
+        self.running = True
+        await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_ensured_before_the_first_write():
+    pool = RecordingPool(fake_columns("test"))
+    generator = generator_on(
+        pool, soak=True, duration=0.1, concurrency=2, event_partition="day"
+    )
+    manager = FakePartitionManager(pool)
+    generator.partition_manager = lambda db: manager
+    await generator.run()
+
+    assert manager.rows_at_ensure == 0 and manager.running
+    assert generator.db_writer.rows_written["event"] > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_partition_check_still_closes_the_sink():
+    pool = RecordingPool(fake_columns("test"))
+    generator = generator_on(pool, soak=True, event_partition="day")
+    generator.partition_manager = lambda db: FakePartitionManager(
+        pool, error=ValueError("EVENT is not partitioned")
+    )
+    closed = []
+    sink_close = generator.sink.close
+
+    async def close():
+        closed.append(True)
+        await sink_close()
+
+    generator.sink.close = close
+    with pytest.raises(ValueError, match="not partitioned"):
+        await generator.run()
+    assert closed and not pool.rows
+
+
+@pytest.mark.asyncio
+async def test_run_without_users_fails_up_front():
+    pool = RecordingPool(fake_columns("test"))
+    db = Database(logger=logging.getLogger("test"), schema="test", conn=pool)
+    generator = make_generator(db, users=0, sink=("null", None))
+    with pytest.raises(ValueError, match="no users to simulate"):
+        await generator.run()
+    assert pool.statements == 0
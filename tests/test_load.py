@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+import pytest
+
+from generator.load import (
+    OpenLoopScheduler,
+    RampProfile,
+    SineProfile,
+    StepProfile,
+    parse_profile,
+)
+
+
+def test_profiles():
+    step = parse_profile("step:10@2,50@3")
+    assert isinstance(step, StepProfile)
+    assert step.duration == 5
+    assert [step.rate(t) for t in (0, 1.9, 2, 4.9, 10)] == [10, 10, 50, 50, 50]
+
+    ramp = parse_profile("ramp:0,100@10")
+    assert isinstance(ramp, RampProfile)
+    assert ramp.rate(5) == 50
+    assert ramp.rate(20) == 100
+
+    sine = parse_profile("sine:10,20@4")
+    assert isinstance(sine, SineProfile)
+    assert sine.duration is None
+    assert sine.rate(1) == pytest.approx(30)
+    assert sine.rate(3) == 0
+
+    assert parse_profile("constant:8").scale(0.5).rate(0) == 4
+
+
+def test_invalid_profile():
+    with pytest.raises(ValueError):
+        parse_profile("square:1")
+    with pytest.raises(ValueError):
+        parse_profile("ramp:1@2")
+    for period in ("0", "-5"):
+        with pytest.raises(ValueError, match="invalid load profile"):
+            parse_profile(f"sine:10,5@{period}")
+
+
+@pytest.mark.asyncio
+async def test_scheduler_holds_rate_without_waiting_on_sessions():
+    async def session():
+        await asyncio.sleep(0.2)
+        return 3
+
+    scheduler = OpenLoopScheduler(
+        profile=parse_profile("constant:200"),
+        session=session,
+        logger=logging.getLogger("test"),
+        duration=0.3,
+        poisson=False,
+    )
+    summary = await scheduler.run()
+
+    # sessions take longer than the run, a closed loop would have started 1
+    assert 50 <= summary["launched"] <= 65
+    assert summary["completed"] == summary["launched"]
+    assert summary["events"] == 3 * summary["launched"]
+    assert summary["skipped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_skips_arrivals_when_saturated():
+    async def session():
+        await asyncio.sleep(0.5)
+        return 1
+
+    scheduler = OpenLoopScheduler(
+        profile=parse_profile("constant:100"),
+        session=session,
+        logger=logging.getLogger("test"),
+        duration=0.2,
+        max_in_flight=5,
+        poisson=False,
+    )
+    summary = await scheduler.run()
+
+    assert summary["launched"] == 5
+    assert summary["skipped"] > 10
@@ -0,0 +1,75 @@
+import json
+import math
+
+import pytest
+
+from user_workflow_state_machine.workflow_sm import UserWorkflowStateMachine
+from utils.metrics import Histogram, MetricsRegistry
+from utils.utils import timeit
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = Histogram([1, 2, 4])
+    for value in [0.5, 1.5, 1.5, 3, 10]:
+        hist.observe(value)
+    assert hist.counts == [1, 2, 1, 1]
+    assert hist.count == 5
+    assert hist.sum == 16.5
+    assert hist.quantile(0.5) == 2
+    assert hist.quantile(1) == math.inf
+
+
+def test_series_are_shared_per_label_set():
+    registry = MetricsRegistry()
+    a = registry.counter("hits", table="event")
+    assert registry.counter("hits", table="event") is a
+    assert registry.counter("hits", table="order") is not a
+    with pytest.raises(ValueError):
+        registry.histogram("hits")
+
+
+def test_prometheus_and_json_export(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("hits", "cache hits", table="event").inc(3)
+    registry.histogram("latency", buckets=[0.1, 1]).observe(0.5)
+
+    text = registry.to_prometheus()
+    assert "# HELP hits cache hits" in text
+    assert 'hits{table="event"} 3' in text
+    assert 'latency_bucket{le="0.1"} 0' in text
+    assert 'latency_bucket{le="1"} 1' in text
+    assert 'latency_bucket{le="+Inf"} 1' in text
+    assert "latency_count 1" in text
+
+    path = tmp_path / "metrics.json"
+    registry.write(str(path))
+    snapshot = json.loads(path.read_text())
+    assert snapshot["hits"]["series"][0] == {"labels": {"table": "event"}, "value": 3}
+    assert snapshot["latency"]["series"][0]["p50"] == 1
+
+
+@pytest.mark.asyncio
+async def test_state_machine_counts_visits_and_duration():
+    class Handlers:
+        pass
+
+    registry = MetricsRegistry()
+    sm = UserWorkflowStateMachine(handlers=Handlers(), metrics=registry)
+    await sm.handle()
+    await sm.handle()
+
+    assert registry.counter("sm_state_visits_total", state="EntryState").value == 2
+    assert registry.counter("sm_state_visits_total", state="TerminalState").value == 2
+    assert registry.histogram("sm_session_seconds").count == 2
+
+
+@pytest.mark.asyncio
+async def test_timeit_records_async_calls():
+    registry = MetricsRegistry()
+
+    @timeit(name="work", metrics=registry)
+    async def work():
+        return 1
+
+    assert await work() == 1
+    assert registry.histogram("function_seconds", function="work").count == 1
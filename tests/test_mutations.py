@@ -0,0 +1,92 @@
+import logging
+import random
+
+import pytest
+
+from generator.mutations import MutationStage, RecentOrders, parse_mix
+from utils.metrics import MetricsRegistry
+
+
+def test_parse_mix():
+    assert parse_mix("70:20:10") == (70, 20, 10)
+    for bad in ("70:20", "0:1:1", "a:b:c", "1:-1:0"):
+        with pytest.raises(ValueError):
+            parse_mix(bad)
+
+
+def test_ring_overwrites_oldest_and_ignores_stale_removes():
+    orders = RecentOrders(capacity=3)
+    for i in range(4):
+        orders.add(f"o{i}", [f"l{i}"])
+    assert len(orders) == 3 and orders.added == 4
+    ids = sorted(entry[0] for _, entry in orders.sample(10, random.Random(1)))
+    assert ids == ["o1", "o2", "o3"]
+
+    # the next add reuses the slot of o1, the oldest
+    ((slot, entry),) = [
+        p for p in orders.sample(3, random.Random(2)) if p[1][0] == "o1"
+    ]
+    orders.remove(slot, entry)
+    assert len(orders) == 2
+    orders.remove(slot, entry)
+    assert len(orders) == 2
+    # a stale remove after the slot was reused changes nothing
+    orders.add("o4", ["l4"])
+    orders.remove(slot, entry)
+    assert len(orders) == 3
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.updates = {}
+        self.deletes = []
+
+    async def update_records(self, table, key, columns, records):
+        if records:
+            self.updates[table] = (key, columns, records)
+        return len(records)
+
+    async def delete_records(self, table, key, keys, children=()):
+        if keys:
+            self.deletes.append((table, key, list(keys), list(children)))
+        return len(keys)
+
+
+@pytest.mark.asyncio
+async def test_step_follows_mix_and_forgets_deleted_orders():
+    orders = RecentOrders()
+    for i in range(100):
+        orders.add(f"o{i}", [f"o{i}-l0", f"o{i}-l1"])
+    db = FakeDatabase()
+    registry = MetricsRegistry()
+    stage = MutationStage(
+        db,
+        orders,
+        logging.getLogger("test"),
+        mix=(70, 20, 10),
+        rng=random.Random(3),
+        metrics=registry,
+    )
+
+    await stage.step(inserted=70)
+    assert stage.counts["status"] + stage.counts["quantity"] == 20
+    assert stage.counts["delete"] == 10
+    assert len(orders) == 90
+
+    ((table, key, deleted, children),) = db.deletes
+    assert (table, key, children) == ("order", "id", [("orderline", "order_id")])
+    live = {entry[0] for _, entry in orders.sample(100, random.Random())}
+    assert not live & set(deleted)
+
+    _, columns, records = db.updates["order"]
+    assert columns == ["status", "updated_at"]
+    assert {status for _, status, _ in records} == {"PAID"}
+    _, columns, records = db.updates["orderline"]
+    assert columns == ["quantity"] and all(1 <= q <= 20 for _, q in records)
+    assert registry.counter("order_mutations_total", kind="delete").value == 10
+
+    # fractions carry over between rounds
+    await stage.step(inserted=3)
+    assert stage.counts["delete"] == 10
+    await stage.step(inserted=4)
+    assert stage.counts["delete"] == 11
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from generator.partitions import INTERVALS, PartitionManager
+from utils.models import Event
+
+
+class FakeDatabase:
+    def __init__(self, partitioned=True):
+        self.tables = [] if partitioned else None
+        self.calls = []
+        # ranges the default partition already holds rows for
+        self.blocked = set()
+
+    async def partitions(self, table):
+        return None if self.tables is None else sorted(self.tables)
+
+    async def create_partition(self, table, partition, start, end):
+        if partition in self.blocked:
+            raise RuntimeError(
+                "updated partition constraint for default partition would be violated"
+            )
+        self.calls.append(("create", partition, start, end))
+        self.tables.append(partition)
+
+    async def detach_partition(self, table, partition):
+        self.calls.append(("detach", partition))
+        self.tables.remove(partition)
+
+    async def truncate_tables(self, names):
+        self.calls.append(("truncate", list(names)))
+
+    async def drop_tables(self, names):
+        self.calls.append(("drop", list(names)))
+        for name in names:
+            self.tables.remove(name)
+
+
+def make_manager(db, **kwargs):
+    return PartitionManager(db, logging.getLogger("test"), **kwargs)
+
+
+NOW = datetime(2026, 10, 18, 13, 30, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_ensure_creates_previous_current_and_ahead_once():
+    db = FakeDatabase()
+    manager = make_manager(db, ahead=2)
+
+    created = await manager.ensure(NOW)
+    assert created == [
+        "event_p20261017",
+        "event_p20261018",
+        "event_p20261019",
+        "event_p20261020",
+    ]
+    _, _, start, end = db.calls[1]
+    assert start == datetime(2026, 10, 18, tzinfo=timezone.utc)
+    assert end - start == timedelta(days=1)
+
+    assert await manager.ensure(NOW) == []
+    # the next day only adds the new head
+    assert await manager.ensure(NOW + timedelta(days=1)) == ["event_p20261021"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_reaches_back_for_backfill_in_hours():
+    db = FakeDatabase()
+    manager = make_manager(db, interval=INTERVALS["hour"], ahead=1)
+    created = await manager.ensure(NOW, back=timedelta(hours=3))
+    assert created[0] == "event_p2026101810"
+    assert created[-1] == "event_p2026101814"
+    assert manager.start_of("event_p2026101810") == datetime(
+        2026, 10, 18, 10, tzinfo=timezone.utc
+    )
+
+
+@pytest.mark.asyncio
+async def test_restart_past_the_ahead_window_creates_what_it_can():
+    # the last run made partitions up to the 12th, then events of the 18th
+    # went to the default partition before any ensure ran
+    db = FakeDatabase()
+    db.tables = ["event_default", "event_p20261011", "event_p20261012"]
+    db.blocked = {"event_p20261018"}
+    manager = make_manager(db, ahead=2)
+
+    task = asyncio.create_task(manager.run(check_interval=3600))
+    for _ in range(5):
+        await asyncio.sleep(0)
+    # run ensures before its first sleep
+    assert [c for c in db.calls if c[0] == "create"]
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    db.tables = ["event_default", "event_p20261011", "event_p20261012"]
+    assert await manager.ensure(NOW) == [
+        "event_p20261017",
+        "event_p20261019",
+        "event_p20261020",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_expire_drops_or_detaches_whole_old_ranges_only():
+    db = FakeDatabase()
+    db.tables = [
+        "event_default",
+        "event_p20261015",
+        "event_p20261016",
+        "event_p20261017",
+    ]
+    manager = make_manager(db, retention=timedelta(days=1, hours=12))
+
+    # cutoff is 2026-10-17 01:30, the 16th ended before it, the 17th did not
+    assert await manager.expire(NOW) == ["event_p20261015", "event_p20261016"]
+    assert db.calls == [("drop", ["event_p20261015", "event_p20261016"])]
+    assert db.tables == ["event_default", "event_p20261017"]
+
+    db.calls = []
+    manager = make_manager(db, retention=timedelta(hours=1), detach=True)
+    assert await manager.expire(NOW) == ["event_p20261017"]
+    assert db.calls == [("detach", "event_p20261017")]
+
+
+@pytest.mark.asyncio
+async def test_truncate_empties_one_partition_at_a_time():
+    db = FakeDatabase()
+    db.tables = ["event_default", "event_p20261016", "event_p20261017"]
+    manager = make_manager(db)
+
+    day = datetime(2026, 10, 17, tzinfo=timezone.utc)
+    assert await manager.truncate(start=day) == ["event_p20261017"]
+    assert await manager.truncate(end=day + timedelta(hours=12)) == ["event_p20261016"]
+    assert await manager.truncate() == db.tables
+    assert db.calls == [
+        ("truncate", ["event_p20261017"]),
+        ("truncate", ["event_p20261016"]),
+        ("truncate", ["event_default"]),
+        ("truncate", ["event_p20261016"]),
+        ("truncate", ["event_p20261017"]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_unpartitioned_table_is_reported():
+    for call in ("ensure", "truncate"):
+        with pytest.raises(ValueError, match="not partitioned"):
+            await getattr(make_manager(FakeDatabase(partitioned=False)), call)()
+
+
+def test_event_ddl_partitions_by_created_at():
+    plain = Event.ddl("test")
+    assert "PRIMARY KEY (id)" in plain and "PARTITION" not in plain
+
+    ddl = Event.ddl("test", partitioned=True, brin=True)
+    assert "PRIMARY KEY (id, created_at)" in ddl
+    assert "PARTITION BY RANGE (created_at)" in ddl
+    assert "test.Event_default PARTITION OF test.Event DEFAULT" in ddl
+    assert "USING brin (created_at)" in ddl
@@ -0,0 +1,87 @@
+import csv
+import logging
+import os
+
+import pytest
+
+from generator.products import ProductCsv, parse_rows
+
+HEADER = [
+    "name",
+    "main_category",
+    "sub_category",
+    "image",
+    "link",
+    "ratings",
+    "no_of_ratings",
+    "discount_price",
+    "actual_price",
+]
+
+
+def write_csv(path, n):
+    with open(path, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(HEADER)
+        for i in range(n):
+            writer.writerow(
+                [f"p{i}", "main", "sub", "img", "link", "4.2", "1,024", "₹1,299", ""]
+            )
+        writer.writerow(["broken", "main", "sub", "img", "link", "Get", "", "", ""])
+
+
+def test_parse_rows_strips_currency_and_skips_bad_rows():
+    columns, skipped = parse_rows(
+        [
+            ["a", "m", "s", "i", "l", "3.9", "2,031", "₹1,299", "₹2,000"],
+            ["b", "m", "s", "i", "l", "", "", "", ""],
+            ["c", "m", "s", "i", "l", "FREE", "", "", ""],
+        ]
+    )
+    assert skipped == 1
+    assert columns["name"] == ["a", "b"]
+    assert columns["no_of_ratings"] == [2031, None]
+    assert columns["discount_price"] == [1299.0, None]
+    assert columns["actual_price"] == [2000.0, None]
+
+
+async def collect(source):
+    return [columns async for columns in source.chunks()]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_bounded_and_snapshot_is_reused(tmp_path):
+    path = tmp_path / "products.csv"
+    write_csv(path, 25)
+    logger = logging.getLogger("test")
+
+    first = ProductCsv(str(path), logger, chunk_size=10, workers=0)
+    parsed = await collect(first)
+    assert [len(c["name"]) for c in parsed] == [10, 10, 5]
+    assert first.skipped == 1 and not first.from_snapshot
+    assert len(os.listdir(tmp_path / ".cache")) == 1
+
+    second = ProductCsv(str(path), logger, chunk_size=10, workers=0)
+    assert await collect(second) == parsed
+    assert second.from_snapshot and second.rows == 25
+
+    # a changed file misses the snapshot
+    write_csv(path, 3)
+    third = ProductCsv(str(path), logger, chunk_size=10, workers=0)
+    assert [len(c["name"]) for c in await collect(third)] == [3]
+    assert not third.from_snapshot
+
+
+@pytest.mark.asyncio
+async def test_process_pool_keeps_file_order(tmp_path):
+    path = tmp_path / "products.csv"
+    write_csv(path, 40)
+    source = ProductCsv(
+        str(path),
+        logging.getLogger("test"),
+        chunk_size=7,
+        workers=2,
+        cache_dir=str(tmp_path / "cache"),
+    )
+    names = [name for c in await collect(source) for name in c["name"]]
+    assert names == [f"p{i}" for i in range(40)]
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+import pytest
+
+from generator.replication import ReplicationMonitor
+from utils.metrics import MetricsRegistry
+
+MB = 1 << 20
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.slots = []
+        self.asked = []
+
+    async def replication_slots(self, slot=None):
+        self.asked.append(slot)
+        return self.slots
+
+
+def slot(retained, lag=None, active=True, name="debezium"):
+    return {
+        "slot_name": name,
+        "active": active,
+        "retained_bytes": retained,
+        "lag_bytes": retained if lag is None else lag,
+        "flush_lag_seconds": 0.5 if active else None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_pauses_over_threshold_and_resumes_under_half():
+    db = FakeDatabase()
+    registry = MetricsRegistry()
+    monitor = ReplicationMonitor(
+        db, logging.getLogger("test"), max_lag=100 * MB, metrics=registry
+    )
+
+    db.slots = [slot(10 * MB), slot(150 * MB, active=False, name="stale")]
+    await monitor.poll()
+    assert monitor.paused
+    assert monitor.inactive == ["stale"]
+    assert monitor.lag_seconds is None
+    assert registry.gauge("replication_throttled").value == 1
+    assert registry.gauge("replication_retained_bytes", slot="stale").value == 150 * MB
+
+    waiter = asyncio.create_task(monitor.wait())
+    db.slots = [slot(80 * MB)]
+    await monitor.poll()
+    await asyncio.sleep(0)
+    # between resume_lag and max_lag, still paused
+    assert monitor.paused and not waiter.done()
+
+    db.slots = [slot(40 * MB, lag=MB)]
+    await monitor.poll()
+    await asyncio.wait_for(waiter, 1)
+    assert not monitor.paused
+    assert monitor.lag == MB and monitor.lag_seconds == 0.5
+    assert registry.gauge("replication_throttled").value == 0
+    assert "1.0MB (0.5s)" in monitor.report(1000)
+
+
+@pytest.mark.asyncio
+async def test_missing_slot_never_throttles_and_stopping_releases_waiters():
+    db = FakeDatabase()
+    monitor = ReplicationMonitor(
+        db, logging.getLogger("test"), max_lag=MB, slot="debezium", interval=0.01
+    )
+    await monitor.poll()
+    assert not monitor.paused and db.asked == ["debezium"]
+
+    db.slots = [slot(2 * MB)]
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+    assert monitor.paused
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await asyncio.wait_for(monitor.wait(), 1)
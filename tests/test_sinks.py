@@ -0,0 +1,57 @@
+import csv
+import json
+
+import pytest
+
+from benchmarks.fakes import new_event
+from utils import FileSink, NullSink
+from utils.models import Order
+from utils.sinks import parse_sink
+
+
+def test_parse_sink():
+    assert parse_sink("postgres") == ("postgres", None)
+    assert parse_sink("jsonl:/tmp/out") == ("jsonl", "/tmp/out")
+    for spec in ["kafka", "csv", "null:/tmp"]:
+        with pytest.raises(ValueError):
+            parse_sink(spec)
+
+
+@pytest.mark.asyncio
+async def test_null_sink_only_counts():
+    sink = NullSink()
+    await sink.write("EVENT", [new_event(), new_event()])
+    await sink.write_atomic(
+        [("order", [Order.new(u_id="u1")]), ("EVENT", [new_event()])]
+    )
+    assert sink.rows_written == {"event": 3, "order": 1}
+
+
+@pytest.mark.asyncio
+async def test_jsonl_sink_buffers_until_close(tmp_path):
+    sink = FileSink(str(tmp_path), fmt="jsonl")
+    events = [new_event() for _ in range(3)]
+    await sink.write("EVENT", events)
+    # still in the buffer
+    assert (tmp_path / "event.jsonl").read_text() == ""
+
+    await sink.close()
+    rows = [
+        json.loads(line) for line in (tmp_path / "event.jsonl").read_text().splitlines()
+    ]
+    assert [row["id"] for row in rows] == [e.id for e in events]
+    assert rows[0]["metadata"] == events[0].metadata
+    assert rows[0]["created_at"] == events[0].created_at.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_csv_sink_writes_header_once(tmp_path):
+    for _ in range(2):
+        sink = FileSink(str(tmp_path), fmt="csv", buffer_size=1)
+        await sink.write_records("USER", ["id", "username"], [("u1", "a"), ("u2", "b")])
+        await sink.close()
+
+    with open(tmp_path / "user.csv", newline="") as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0] == ["id", "username"]
+    assert len(rows) == 5
@@ -1,7 +1,13 @@
+import json
+
 import pytest
 
-from user_workflow_state_machine.workflow_sm import UserWorkflowStateMachine
-from user_workflow_state_machine.state import TerminalState
+from user_workflow_state_machine.workflow_sm import (
+    DEFAULT_TRANSITIONS,
+    TransitionTable,
+    UserWorkflowStateMachine,
+)
+from user_workflow_state_machine.state import BrowsingState, EntryState, TerminalState
 
 
 class MockHandlers:
@@ -36,3 +42,57 @@ async def test_uasm():
     out_state = await sm.handle()
 
     assert isinstance(out_state, TerminalState)
+
+
+def test_transition_table_normalizes_weights():
+    table = TransitionTable(DEFAULT_TRANSITIONS)
+    probabilities = table.probabilities()
+
+    assert probabilities["EntryState"] == {"AuthenticatedState": 1.0}
+    assert sum(probabilities["ViewProductState"].values()) == pytest.approx(1.0)
+    assert probabilities["AddToCartState"]["PlaceOrder"] == pytest.approx(0.4)
+
+
+def test_transition_table_follows_weights():
+    browsing = BrowsingState
+    table = TransitionTable(
+        {
+            EntryState: {browsing: 1},
+            browsing: {browsing: 3, TerminalState: 1},
+            TerminalState: {},
+        }
+    )
+    i = table.index[browsing]
+    assert table.step(i, 0.0) == i
+    assert table.step(i, 0.74) == i
+    assert table.step(i, 0.76) == table.terminal
+    assert table.step(i, 0.9999999999999999) == table.terminal
+
+    with pytest.raises(ValueError):
+        TransitionTable({EntryState: {browsing: 1}, TerminalState: {}})
+    with pytest.raises(ValueError):
+        TransitionTable({EntryState: {}, TerminalState: {}})
+    # every state has a way out, but browsing only loops on itself
+    with pytest.raises(ValueError, match="BrowsingState, EntryState can't reach"):
+        TransitionTable(
+            {
+                EntryState: {browsing: 1},
+                browsing: {browsing: 1},
+                TerminalState: {},
+            }
+        )
+
+
+def test_transitions_from_json(tmp_path):
+    path = tmp_path / "transitions.json"
+    path.write_text(json.dumps({"AddToCartState": {"PlaceOrder": 1}}))
+    table = TransitionTable.from_json(str(path))
+
+    assert table.probabilities()["AddToCartState"] == {"PlaceOrder": 1.0}
+    assert table.probabilities()["BrowsingState"] == pytest.approx(
+        TransitionTable(DEFAULT_TRANSITIONS).probabilities()["BrowsingState"]
+    )
+
+    path.write_text(json.dumps({"BrowsingState": {"BrowsingState": 1}}))
+    with pytest.raises(ValueError, match="can't reach"):
+        TransitionTable.from_json(str(path))
@@ -0,0 +1,156 @@
+import logging
+import uuid
+
+import pytest
+
+from generator.catalog import Catalog
+from generator.config import GeneratorConfig
+from generator.generator import Generator
+from generator.snapshot import CatalogSnapshot, remove_snapshot, write_snapshot
+
+
+def test_round_trip_keeps_order_and_text(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    ids = [uuid.uuid4() for _ in range(3)]
+    write_snapshot(
+        path,
+        "test",
+        {
+            "USER": {"id": ids, "username": ["ана", "", "bob"]},
+            "PRODUCT": {"id": []},
+        },
+    )
+
+    snapshot = CatalogSnapshot(path)
+    assert snapshot.schema == "test"
+    assert snapshot.rows("USER") == 3 and snapshot.rows("PRODUCT") == 0
+    assert snapshot.has("USER", ["id", "username"])
+    assert not snapshot.has("USER", ["ip_address"])
+    columns = snapshot.columns("USER")
+    assert list(columns["id"]) == [str(i) for i in ids]
+    assert columns["username"][0] == "ана"
+    assert columns["username"][-1] == "bob"
+    assert len(snapshot.columns("PRODUCT")["id"]) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        CatalogSnapshot(str(path))
+
+
+def test_attached_catalog_copies_on_extend(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    write_snapshot(path, "test", {"ORDER": {"id": ["a", "b"], "u_id": ["u1", "u2"]}})
+    catalog = Catalog(table="ORDER", columns=["id", "u_id"])
+    catalog.attach(CatalogSnapshot(path).columns("ORDER"))
+
+    assert catalog.row(1) == {"id": "b", "u_id": "u2"}
+    catalog.extend([{"id": "c", "u_id": "u3"}])
+    assert len(catalog) == 3
+    assert catalog.row(2) == {"id": "c", "u_id": "u3"}
+
+
+class FakeDatabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.iterated = 0
+
+    async def select(self, table, columns=None, order_by=None, limit=None, **_):
+        rows = self.tables[table]
+        if columns == ["count(*) AS count"]:
+            return [{"count": len(rows)}]
+        (key,) = columns
+        rows = sorted(rows, key=lambda row: row[key], reverse="DESC" in order_by[0])
+        return [{key: row[key]} for row in rows[:limit]]
+
+    async def iterate(self, table, columns, **_):
+        self.iterated += 1
+        for row in self.tables[table]:
+            yield row
+
+
+def make_tables(users: int, prefix: str = "u"):
+    return {
+        "USER": [
+            {
+                "id": f"{prefix}{i}",
+                "username": f"user{i}",
+                "ip_address": "127.0.0.1",
+                "user_agent": "agent",
+            }
+            for i in range(users)
+        ],
+        "PRODUCT": [
+            {"id": f"p{i}", "main_category": "main", "sub_category": "sub"}
+            for i in range(4)
+        ],
+    }
+
+
+def make_generator(db, path):
+    generator = Generator(
+        GeneratorConfig(catalog_snapshot=path), logging.getLogger("test")
+    )
+    generator.db_writer = db
+    return generator
+
+
+@pytest.mark.asyncio
+async def test_load_catalogs_maps_snapshot_while_counts_match(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    db = FakeDatabase(make_tables(users=5))
+
+    await make_generator(db, path).load_catalogs()
+    assert db.iterated == 2
+
+    generator = make_generator(db, path)
+    await generator.load_catalogs()
+    assert db.iterated == 2
+    assert len(generator.users) == 5
+    assert generator.users.row(4)["username"] == "user4"
+
+    # a row was added behind the snapshot's back
+    db.tables = make_tables(users=6)
+    generator = make_generator(db, path)
+    await generator.load_catalogs()
+    assert db.iterated == 4
+    assert len(generator.users) == 6
+
+
+@pytest.mark.asyncio
+async def test_recreated_rows_with_the_same_count_are_reloaded(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    db = FakeDatabase(make_tables(users=5))
+    await make_generator(db, path).load_catalogs()
+
+    # truncated and created again, same counts with new ids
+    db.tables = make_tables(users=5, prefix="v")
+    generator = make_generator(db, path)
+    await generator.load_catalogs()
+    assert db.iterated == 4
+    assert generator.users.row(0)["id"] == "v0"
+
+    # the rewritten snapshot is mapped again
+    await make_generator(db, path).load_catalogs()
+    assert db.iterated == 4
+
+
+def test_remove_snapshot(tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    write_snapshot(str(path), "test", {"USER": {"id": ["a"]}})
+    remove_snapshot(str(path))
+    assert not path.exists()
+    remove_snapshot(str(path))
+    remove_snapshot(None)
+
+
+@pytest.mark.asyncio
+async def test_workers_load_without_writing_the_snapshot(tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    db = FakeDatabase(make_tables(users=3))
+    generator = make_generator(db, str(path))
+    await generator.load_catalogs(save=False)
+    assert len(generator.users) == 3
+    assert not path.exists()
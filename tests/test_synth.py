@@ -0,0 +1,74 @@
+import ipaddress
+import uuid
+from datetime import datetime, timedelta
+
+from faker import Faker
+
+from generator.catalog import Catalog
+from generator.synth import SessionSynthesizer, UserSynthesizer, records
+from utils.models import Event, User
+
+
+def test_batch_has_user_columns():
+    synth = UserSynthesizer(faker=Faker(), pool_size=20)
+    columns = synth.batch(500)
+
+    assert list(columns) == list(User.__dataclass_fields__)
+    assert all(len(values) == 500 for values in columns.values())
+    assert len(set(columns["id"])) == 500
+    assert uuid.UUID(columns["id"][0]).version == 4
+    ipaddress.IPv4Address(columns["ip_address"][0])
+    assert set(columns["gender"]) <= {"M", "F", "O"}
+    for gender, first_name in zip(columns["gender"], columns["first_name"]):
+        pool = synth.male_first_names if gender == "M" else synth.female_first_names
+        assert first_name in pool
+
+
+def test_records_are_rows_in_column_order():
+    assert records({"a": [1, 2], "b": ["x", "y"]}) == [(1, "x"), (2, "y")]
+
+
+def make_catalogs():
+    users = Catalog(
+        table="USER", columns=["id", "username", "ip_address", "user_agent"]
+    )
+    users.extend(
+        [
+            {"id": "u1", "username": "a", "ip_address": "1.1.1.1", "user_agent": "x"},
+            {"id": "u2", "username": "b", "ip_address": "2.2.2.2", "user_agent": "y"},
+        ]
+    )
+    products = Catalog(table="PRODUCT", columns=["id", "main_category", "sub_category"])
+    products.extend(
+        [{"id": f"p{i}", "main_category": "m", "sub_category": "s"} for i in range(10)]
+    )
+    return users, products
+
+
+def test_session_paths_end_in_terminal():
+    users, products = make_catalogs()
+    synth = SessionSynthesizer(users=users, products=products, max_steps=5)
+    paths = synth.paths(1000)
+
+    table = synth.transitions
+    assert all(path[0] == table.entry and path[-1] == table.terminal for path in paths)
+    assert all(len(path) <= 7 for path in paths)
+
+
+def test_session_batch_rows_are_consistent():
+    users, products = make_catalogs()
+    synth = SessionSynthesizer(users=users, products=products)
+    start = datetime(2026, 1, 1)
+    tables = synth.batch(500, start=start, span=timedelta(hours=1))
+
+    events, orders, lines = tables["EVENT"], tables["ORDER"], tables["ORDERLINE"]
+    assert list(events) == list(Event.__dataclass_fields__)
+    assert events["event_type"].count("USER_ENTRY") == 500
+    assert events["event_type"].count("USER_EXIT") == 500
+    assert events["event_type"].count("PLACE_ORDER") == len(orders["id"]) > 0
+    assert set(lines["order_id"]) == set(orders["id"])
+    assert all(start <= at for at in events["created_at"])
+    assert set(orders["u_id"]) <= {"u1", "u2"}
+    # objects like the live path, encoding is left to the sink
+    metadata = [m for m in events["metadata"] if m is not None]
+    assert metadata and all(isinstance(m, dict) for m in metadata)
@@ -0,0 +1,90 @@
+import logging
+import os
+
+from generator.config import GeneratorConfig
+from generator.load import ConstantProfile
+from generator.workers import (
+    _report,
+    _share,
+    _worker_config,
+    _worker_path,
+    _worker_sink,
+)
+
+
+def test_share_splits_evenly_first_workers_take_the_rest():
+    assert [_share(10, 3, i) for i in range(3)] == [4, 3, 3]
+    assert [_share(2, 3, i) for i in range(3)] == [1, 1, 0]
+    assert sum(_share(1001, 7, i) for i in range(7)) == 1001
+
+
+def test_worker_path_and_sink():
+    assert _worker_path("out/metrics.json", 2) == "out/metrics.2.json"
+    assert _worker_path("stamps", 0) == "stamps.0"
+    assert _worker_path(None, 1) is None
+
+    assert _worker_sink(("jsonl", "out"), 1) == (
+        "jsonl",
+        os.path.join("out", "worker1"),
+    )
+    assert _worker_sink(("postgres", None), 1) == ("postgres", None)
+
+
+def test_worker_config_takes_a_share_and_its_own_files():
+    config = GeneratorConfig(
+        user_count=10,
+        sessions=7,
+        concurrency=3,
+        max_concurrency=100,
+        profile=ConstantProfile(target=30),
+        metrics_path="metrics.json",
+        sink=("csv", "out"),
+        catalog_snapshot="catalog.snapshot",
+        seed=5,
+    )
+    shares = [_worker_config(config, 3, i) for i in range(3)]
+
+    assert [c.worker for c in shares] == [0, 1, 2]
+    assert [c.user_count for c in shares] == [4, 3, 3]
+    assert [c.sessions for c in shares] == [3, 2, 2]
+    assert [c.concurrency for c in shares] == [1, 1, 1]
+    assert shares[0].profile.rate(0) == 10
+    assert shares[2].metrics_path == "metrics.2.json"
+    assert shares[2].sink == ("csv", os.path.join("out", "worker2"))
+    # shared between the workers
+    assert {c.catalog_snapshot for c in shares} == {"catalog.snapshot"}
+    assert {c.seed for c in shares} == {5}
+    # the original is left alone
+    assert config.user_count == 10 and config.worker == 0
+
+
+def test_report_sums_workers(caplog):
+    reports = [
+        {
+            "worker": 1,
+            "status": "ok",
+            "elapsed": 2.0,
+            "sessions": 3,
+            "events": 40,
+            "events_dropped": 1,
+            "rows": {"event": 40, "order": 2},
+        },
+        {
+            "worker": 0,
+            "status": "failed",
+            "elapsed": 0,
+            "sessions": 1,
+            "events": 10,
+            "events_dropped": 0,
+            "rows": {"event": 10},
+        },
+    ]
+    with caplog.at_level(logging.INFO):
+        _report(reports, elapsed=5.0, logger=logging.getLogger("test"))
+
+    lines = caplog.messages
+    assert lines[0].startswith("worker 0 (failed)") and "events/s: 0.0" in lines[0]
+    assert "events/s: 20.0" in lines[1]
+    assert "sessions: 4, events: 50, dropped: 1" in lines[2]
+    assert "events/s: 10.0" in lines[2]
+    assert lines[3] == "rows written per table: event: 50, order: 2"
@@ -1,43 +1,48 @@
-from utils import Database
+from utils import EventBatcher, PendingWrites, Sink
 from faker import Faker
 from utils.models import EventType, Order, Event, OrderLine, Product
 import random
 from random import randint
+from typing import Callable
 
 
 class UserStateHandlers:
     def __init__(
         self,
-        db: Database,
+        sink: Sink,
         faker: Faker,
         products: list[Product],
         username: str,
         user_id: str,
         ip_address: str,
         user_agent: str,
-        event_buffer_limit: int = 5,
+        events: EventBatcher,
+        pending: PendingWrites,
+        rng: random.Random | None = None,
+        on_order: Callable[[str, list[str]], None] | None = None,
     ):
-        self.db: Database = db
+        self.sink: Sink = sink
         self.username = username
         self.user_id = user_id
         self.ip_address = ip_address
         self.user_agent = user_agent
-        self.event_buffer_limit = event_buffer_limit
-        self.event_buffer = []
+        self.events = events
+        self.events_emitted = 0
+        self.pending = pending
         self.faker = faker
         self.products = products
+        # per session stream, seeded when the run is
+        self.rng = rng or random.Random()
+        # told (order id, line ids) once an order is written
+        self.on_order = on_order
 
     async def _buffer_event(self, event: Event):
-        self.event_buffer.append(event)
-        if len(self.event_buffer) >= self.event_buffer_limit:
-            await self.db.upsert(table="EVENT", data=self.event_buffer)
-            self.event_buffer.clear()
+        self.events_emitted += 1
+        await self.events.add(event)
 
     async def _force_flush(self):
-        if not self.event_buffer:
-            return
-        await self.db.upsert(table="EVENT", data=self.event_buffer)
-        self.event_buffer.clear()
+        # the shared batcher owns the writes, only ask it to flush early
+        self.events.flush()
 
     async def on_process_entry(self, context_id: str):
         event = Event.new(
@@ -46,6 +51,7 @@ class UserStateHandlers:
             event_type=EventType.ENTRY,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
 
@@ -56,6 +62,7 @@ class UserStateHandlers:
             event_type=EventType.LOGIN,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
 
@@ -66,11 +73,12 @@ class UserStateHandlers:
             event_type=EventType.BROWSING,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         event.metadata = {
-            "page": random.choice(["home", "search", "product", "cart", "checkout"]),
-            "scroll_depth": random.randint(0, 1),
-            "duration_ms": random.randint(0, 4000),
+            "page": self.rng.choice(["home", "search", "product", "cart", "checkout"]),
+            "scroll_depth": self.rng.randint(0, 1),
+            "duration_ms": self.rng.randint(0, 4000),
         }
         await self._buffer_event(event)
 
@@ -81,6 +89,7 @@ class UserStateHandlers:
             event_type=EventType.LOGOUT,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
 
@@ -92,25 +101,27 @@ class UserStateHandlers:
             event_type=EventType.EXIT,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
         await self._force_flush()
 
     async def on_process_view_product(self, context_id: str):
-        product = random.choice(self.products)
+        product = self.rng.choice(self.products)
         event = Event.new(
             user_agent=self.user_agent,
             user_name=self.username,
             event_type=EventType.VIEW_PRODUCT,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         event.metadata = {
             "product_id": str(product["id"]),
             "main_category": product["main_category"],
             "sub_category": product["sub_category"],
-            "referrer": random.choice(["home", "search", "recommendation"]),
-            "duration_ms": random.randint(1000, 30000),
+            "referrer": self.rng.choice(["home", "search", "recommendation"]),
+            "duration_ms": self.rng.randint(1000, 30000),
         }
         await self._buffer_event(event)
 
@@ -121,6 +132,7 @@ class UserStateHandlers:
             event_type=EventType.ADD_TO_CART,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
 
@@ -131,6 +143,7 @@ class UserStateHandlers:
             event_type=EventType.REMOVE_FROM_CART,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
         await self._buffer_event(event)
 
@@ -141,21 +154,34 @@ class UserStateHandlers:
             event_type=EventType.PLACE_ORDER,
             context_id=context_id,
             ip_address=self.ip_address,
+            rng=self.rng,
         )
-        await self._buffer_event(event)
         # create order
-        order = Order.new(u_id=self.user_id)
-        await self.db.upsert(table="order", data=[order])
+        order = Order.new(u_id=self.user_id, rng=self.rng)
 
         order_lines = []
-        products = random.choices(self.products, k=random.randint(1, 5))
+        products = self.rng.choices(self.products, k=self.rng.randint(1, 5))
 
         for prod in products:
             order_lines.append(
                 OrderLine.new(
                     order_id=order.id,
                     product_id=prod["id"],
-                    quantity=random.randint(1, 20),
+                    quantity=self.rng.randint(1, 20),
+                    rng=self.rng,
                 )
             )
-        await self.db.upsert(table="orderline", data=order_lines)
+
+        # order, lines and the event land in one statement, so CDC never sees
+        # an order without its lines. it also outlives a cancelled session
+        self.events_emitted += 1
+        await self.pending.run(self._write_order(order, order_lines, event))
+
+    async def _write_order(
+        self, order: Order, order_lines: list[OrderLine], event: Event
+    ):
+        await self.sink.write_atomic(
+            [("order", [order]), ("orderline", order_lines), ("EVENT", [event])]
+        )
+        if self.on_order:
+            self.on_order(order.id, [line.id for line in order_lines])
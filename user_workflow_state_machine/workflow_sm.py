@@ -10,99 +10,209 @@ from .state import (
     ViewProductState,
     AddToCartState,
 )
-from collections import deque
+from bisect import bisect
+from itertools import accumulate
+from typing import Type
+import json
 import random
-import uuid
+import time
 
+from utils.metrics import REGISTRY, MetricsRegistry
+from utils.rng import random_uuid
 
-class UserWorkflowStateMachine:
-    def __init__(self, handlers):
-        self.state_mappings = {
-            EntryState: {
-                "states": [AuthenticatedState],
-                "on_process": getattr(handlers, "on_process_entry", None),
-            },
-            AuthenticatedState: {
-                "states": [BrowsingState],
-                "on_process": getattr(handlers, "on_process_authenticate", None),
-            },
-            BrowsingState: {
-                "states": [
-                    BrowsingState,
-                    ViewProductState,
-                    UnauthenticatedState,
-                ],
-                "on_process": getattr(handlers, "on_process_browsing", None),
-            },
-            ViewProductState: {
-                "states": [
-                    BrowsingState,
-                    ViewProductState,
-                    UnauthenticatedState,
-                    AddToCartState,
-                    RemoveFromCart,
-                ],
-                "on_process": getattr(handlers, "on_process_view_product", None),
-            },
-            AddToCartState: {
-                "states": [
-                    BrowsingState,
-                    ViewProductState,
-                    UnauthenticatedState,
-                    RemoveFromCart,
-                    PlaceOrder,
-                ],
-                "on_process": getattr(handlers, "on_process_add_to_cart", None),
-            },
-            PlaceOrder: {
-                "states": [
-                    BrowsingState,
-                ],
-                "on_process": getattr(handlers, "on_process_place_order", None),
-            },
-            RemoveFromCart: {
-                "states": [
-                    BrowsingState,
-                    UnauthenticatedState,
-                ],
-                "on_process": getattr(handlers, "on_process_remove_from_cart", None),
-            },
-            UnauthenticatedState: {
-                "states": [TerminalState],
-                "on_process": getattr(handlers, "on_process_unauthenticated", None),
-            },
-            TerminalState: {
-                "states": [],
-                "on_process": getattr(handlers, "on_process_terminal", None),
-            },
-        }
+# relative weights of the next state, they do not need to add up to 1.
+# roughly a browse -> view -> cart -> order funnel
+DEFAULT_TRANSITIONS: dict[Type[StateInterface], dict[Type[StateInterface], float]] = {
+    EntryState: {AuthenticatedState: 1},
+    AuthenticatedState: {BrowsingState: 1},
+    BrowsingState: {
+        BrowsingState: 0.45,
+        ViewProductState: 0.4,
+        UnauthenticatedState: 0.15,
+    },
+    ViewProductState: {
+        BrowsingState: 0.3,
+        ViewProductState: 0.3,
+        UnauthenticatedState: 0.15,
+        AddToCartState: 0.2,
+        RemoveFromCart: 0.05,
+    },
+    AddToCartState: {
+        BrowsingState: 0.2,
+        ViewProductState: 0.2,
+        UnauthenticatedState: 0.1,
+        RemoveFromCart: 0.1,
+        PlaceOrder: 0.4,
+    },
+    PlaceOrder: {BrowsingState: 1},
+    RemoveFromCart: {BrowsingState: 0.7, UnauthenticatedState: 0.3},
+    UnauthenticatedState: {TerminalState: 1},
+    TerminalState: {},
+}
 
-    async def handle(self) -> StateInterface:
-        # used for propagation
-        self.context_id = uuid.uuid4()
+HANDLERS: dict[Type[StateInterface], str] = {
+    EntryState: "on_process_entry",
+    AuthenticatedState: "on_process_authenticate",
+    BrowsingState: "on_process_browsing",
+    ViewProductState: "on_process_view_product",
+    AddToCartState: "on_process_add_to_cart",
+    PlaceOrder: "on_process_place_order",
+    RemoveFromCart: "on_process_remove_from_cart",
+    UnauthenticatedState: "on_process_unauthenticated",
+    TerminalState: "on_process_terminal",
+}
+
+
+class TransitionTable:
+    """state graph compiled to indexes and cumulative weights, one bisect per step"""
+
+    def __init__(
+        self,
+        transitions: dict[Type[StateInterface], dict[Type[StateInterface], float]],
+        entry: Type[StateInterface] = EntryState,
+        terminal: Type[StateInterface] = TerminalState,
+    ):
+        self.states: list[Type[StateInterface]] = list(transitions)
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.entry = self.index[entry]
+        self.terminal = self.index[terminal]
 
-        state_objs_mapper = {}
-        for state, info in self.state_mappings.items():
-            state_objs_mapper[state.__name__] = state(
-                next_states=info["states"], on_process=info["on_process"]
+        self.next_states: list[list[int]] = []
+        self.cum_weights: list[list[float]] = []
+        for state, edges in transitions.items():
+            if any(weight < 0 for weight in edges.values()):
+                raise ValueError(f"negative transition weight from {state.__name__}")
+            edges = {nxt: weight for nxt, weight in edges.items() if weight > 0}
+            for nxt in edges:
+                if nxt not in self.index:
+                    raise ValueError(
+                        f"{state.__name__} moves to unknown state {nxt.__name__}"
+                    )
+            if not edges and state is not terminal:
+                raise ValueError(f"{state.__name__} has no way out")
+            self.next_states.append([self.index[nxt] for nxt in edges])
+            self.cum_weights.append(list(accumulate(edges.values())))
+        self._check_terminal_reachable()
+
+    def _check_terminal_reachable(self):
+        """every state a session can get to needs a path to terminal, or it never ends"""
+        reachable = {self.entry}
+        todo = [self.entry]
+        while todo:
+            for nxt in self.next_states[todo.pop()]:
+                if nxt not in reachable:
+                    reachable.add(nxt)
+                    todo.append(nxt)
+
+        previous = [[] for _ in self.states]
+        for i, nexts in enumerate(self.next_states):
+            for nxt in nexts:
+                previous[nxt].append(i)
+        finishing = {self.terminal}
+        todo = [self.terminal]
+        while todo:
+            for prev in previous[todo.pop()]:
+                if prev not in finishing:
+                    finishing.add(prev)
+                    todo.append(prev)
+
+        stuck = sorted(self.states[i].__name__ for i in reachable - finishing)
+        if stuck:
+            raise ValueError(
+                f"{', '.join(stuck)} can't reach {self.states[self.terminal].__name__}"
             )
 
-        start_state_obj = state_objs_mapper[EntryState.__name__]
+    def step(self, i: int, rand: float) -> int:
+        """next state of i, rand is uniform in [0, 1)"""
+        cum = self.cum_weights[i]
+        nxt = self.next_states[i]
+        # min guards against rand * total rounding up to total
+        return nxt[min(bisect(cum, rand * cum[-1]), len(nxt) - 1)]
 
-        queue = deque([start_state_obj])
-        state_obj = None
+    def probabilities(self) -> dict[str, dict[str, float]]:
+        table = {}
+        for i, state in enumerate(self.states):
+            cum = self.cum_weights[i]
+            weights = [b - a for a, b in zip([0.0] + cum, cum)]
+            table[state.__name__] = {
+                self.states[nxt].__name__: weight / cum[-1]
+                for nxt, weight in zip(self.next_states[i], weights)
+            }
+        return table
 
-        # bfs traversal
-        while queue:
-            state_obj = queue.popleft()
-            # sentinal
-            if isinstance(state_obj, TerminalState):
+    @classmethod
+    def from_json(cls, path: str) -> "TransitionTable":
+        """
+        overrides weights per state, {"BrowsingState": {"ViewProductState": 0.6, ....}}
+        """
+        by_name = {state.__name__: state for state in DEFAULT_TRANSITIONS}
+        with open(path) as fp:
+            overrides = json.load(fp)
+
+        transitions = dict(DEFAULT_TRANSITIONS)
+        for state_name, edges in overrides.items():
+            if state_name not in by_name:
+                raise ValueError(f"unknown state {state_name}")
+            try:
+                transitions[by_name[state_name]] = {
+                    by_name[nxt]: float(weight) for nxt, weight in edges.items()
+                }
+            except KeyError as e:
+                raise ValueError(f"unknown state {e.args[0]}") from e
+        return cls(transitions)
+
+
+DEFAULT_TABLE = TransitionTable(DEFAULT_TRANSITIONS)
+
+
+class UserWorkflowStateMachine:
+    def __init__(
+        self,
+        handlers,
+        transitions: TransitionTable | None = None,
+        metrics: MetricsRegistry | None = None,
+        rng: random.Random | None = None,
+    ):
+        self.transitions = transitions or DEFAULT_TABLE
+        self.rng = rng or random.Random()
+        metrics = metrics or REGISTRY
+        # indexed like states, so counting a visit is a list lookup
+        self.visits = [
+            metrics.counter("sm_state_visits_total", "states entered", state=s.__name__)
+            for s in self.transitions.states
+        ]
+        self.duration = metrics.histogram(
+            "sm_session_seconds", "time from entry to terminal state"
+        )
+        # one state object per compiled state, bound to this session's handlers
+        self.state_objs: list[StateInterface] = [
+            state(
+                next_states=[self.transitions.states[nxt] for nxt in next_states],
+                on_process=getattr(handlers, HANDLERS.get(state, ""), None),
+            )
+            for state, next_states in zip(
+                self.transitions.states, self.transitions.next_states
+            )
+        ]
+
+    async def handle(self) -> StateInterface:
+        # used for propagation
+        self.context_id = random_uuid(self.rng)
+
+        transitions = self.transitions
+        visits = self.visits
+        start = time.perf_counter()
+        i = transitions.entry
+        while True:
+            state_obj = self.state_objs[i]
+            visits[i].value += 1
+            # states without a handler are passed through
+            if state_obj.on_process is not None:
                 await state_obj.on_process(self.context_id)
+            # sentinal
+            if i == transitions.terminal:
                 break
-            await state_obj.on_process(self.context_id)
-            next_states = [
-                state_objs_mapper[state.__name__] for state in state_obj.next_states
-            ]
-            queue.extend(random.choices(next_states))
+            i = transitions.step(i, self.rng.random())
 
+        self.duration.observe(time.perf_counter() - start)
         return state_obj
@@ -1 +1,4 @@
 from .database import Database
+from .batcher import EventBatcher
+from .writes import PendingWrites
+from .sinks import FileSink, NullSink, PostgresSink, Sink
@@ -0,0 +1,177 @@
+import asyncio
+import dataclasses
+from logging import Logger
+
+from .database import T
+from .models import Row
+from .sinks import Sink
+
+
+class EventBatcher:
+    """
+    write-behind buffer shared by every session, add() blocks once max_pending wait
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        logger: Logger,
+        table: str = "EVENT",
+        max_rows: int = 500,
+        max_bytes: int = 1 << 20,
+        linger: float = 0.05,
+        max_pending: int = 5000,
+        max_in_flight: int = 4,
+    ):
+        self.sink = sink
+        self.logger = logger
+        self.table = table
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.linger = linger
+
+        self._buffer: list[tuple[T, int]] = []
+        self._buffer_bytes = 0
+        self._first_at = 0.0
+        self._flush_requested = False
+        self._closing = False
+
+        self._space = asyncio.Semaphore(max_pending)
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._wakeup = asyncio.Event()
+        self._writes: set[asyncio.Task] = set()
+        self._runner: asyncio.Task | None = None
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.batches = 0
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def add(self, item: T):
+        await self._space.acquire()
+        if not self._buffer:
+            self._first_at = asyncio.get_running_loop().time()
+            self._wakeup.set()
+
+        size = self._estimate_size(item)
+        self._buffer.append((item, size))
+        self._buffer_bytes += size
+        if self._full():
+            self._wakeup.set()
+
+    def flush(self):
+        """ask the runner to write whatever is buffered without waiting on linger"""
+        self._flush_requested = True
+        self._wakeup.set()
+
+    async def close(self, timeout: float | None = None) -> bool:
+        """drains the buffer, drops what is left after timeout, True if all was written"""
+        self._closing = True
+        self._wakeup.set()
+        if self._buffer:
+            self.start()
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except TimeoutError:
+            lost = len(self._buffer)
+            self.rows_dropped += lost
+            self._buffer.clear()
+            self.logger.error(
+                f"{self.table} batcher did not drain in {timeout}s, dropped {lost} buffered rows"
+            )
+            return False
+        return True
+
+    async def _drain(self):
+        if self._runner:
+            await self._runner
+            self._runner = None
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def _full(self) -> bool:
+        return (
+            len(self._buffer) >= self.max_rows or self._buffer_bytes >= self.max_bytes
+        )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._buffer:
+                if self._closing:
+                    return
+                self._flush_requested = False
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            timeout = self._first_at + self.linger - loop.time()
+            if (
+                timeout > 0
+                and not self._full()
+                and not self._flush_requested
+                and not self._closing
+            ):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            batch = self._take()
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def _take(self) -> list[T]:
+        batch = []
+        size = 0
+        count = 0
+        for item, item_size in self._buffer:
+            if count and (count >= self.max_rows or size >= self.max_bytes):
+                break
+            batch.append(item)
+            size += item_size
+            count += 1
+
+        del self._buffer[:count]
+        self._buffer_bytes -= size
+        self._first_at = asyncio.get_running_loop().time()
+        return batch
+
+    async def _write(self, batch: list[T]):
+        try:
+            await self.sink.write(table=self.table, data=batch)
+            self.rows_written += len(batch)
+            self.batches += 1
+        except asyncio.CancelledError:
+            self.rows_dropped += len(batch)
+            raise
+        except Exception as e:
+            self.rows_dropped += len(batch)
+            self.logger.error(f"error writing {len(batch)} rows to {self.table}: {e}")
+        finally:
+            self._in_flight.release()
+            for _ in batch:
+                self._space.release()
+
+    @staticmethod
+    def _estimate_size(item: T) -> int:
+        if isinstance(item, (dict, Row)):
+            values = item.values()
+        else:
+            values = (getattr(item, f.name) for f in dataclasses.fields(item))
+        size = 0
+        for value in values:
+            if isinstance(value, str):
+                size += len(value)
+            elif isinstance(value, dict):
+                size += 32 * len(value)
+            else:
+                size += 16
+        return size
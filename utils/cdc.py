@@ -0,0 +1,264 @@
+"""end to end cdc latency from write stamps and debezium envelopes"""
+
+import glob
+import json
+import os
+import sys
+import time
+from logging import Logger
+from typing import IO, Iterable, Iterator
+
+from .metrics import Histogram
+from .models import Row
+from .sinks import Sink
+
+# 8 buckets per doubling from 1ms to ~18 minutes, ~9% wide
+CDC_BUCKETS = [0.001 * 2 ** (i / 8) for i in range(8 * 20 + 1)]
+
+
+class StampingSink(Sink):
+    """passes writes on to inner and stamps one row in every step of them"""
+
+    def __init__(self, inner: Sink, path: str, rate: float = 0.01):
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError("stamp rate must be in (0, 1]")
+        self.inner = inner
+        self.rows_written = inner.rows_written
+        self.step = round(1 / rate)
+        # rows to skip before the next stamp, carried across writes
+        self._skip = 0
+        self.stamped = 0
+        self._fp = open(path, "w", buffering=1 << 16)
+
+    def _stamp(self, table: str, ids: list):
+        if not ids:
+            return
+        start = self._skip
+        picked = ids[start :: self.step]
+        self._skip = (start - len(ids)) % self.step
+        if not picked:
+            return
+        at = time.time_ns() // 1000
+        table = table.lower()
+        self._fp.write("".join(f"{table},{i},{at}\n" for i in picked))
+        self.stamped += len(picked)
+
+    async def write(self, table, data, conflict_keys=None):
+        await self.inner.write(table, data, conflict_keys)
+        self._stamp(table, _ids(data))
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        await self.inner.write_records(table, columns, records, conflict_keys)
+        if "id" in columns:
+            key = columns.index("id")
+            self._stamp(table, [r[key] for r in records])
+
+    async def write_atomic(self, writes):
+        await self.inner.write_atomic(writes)
+        for table, data in writes:
+            self._stamp(table, _ids(data))
+
+    async def write_atomic_records(self, writes):
+        await self.inner.write_atomic_records(writes)
+        for table, columns, records in writes:
+            if "id" in columns:
+                key = columns.index("id")
+                self._stamp(table, [r[key] for r in records])
+
+    async def close(self):
+        await self.inner.close()
+        self._fp.close()
+
+
+def _ids(data: list) -> list:
+    if not data:
+        return []
+    if isinstance(data[0], Row):
+        return [d.id for d in data]
+    if isinstance(data[0], dict):
+        return [d.get("id") for d in data]
+    return [getattr(d, "id", None) for d in data]
+
+
+def stamp_files(path: str | None) -> list[str]:
+    """path itself, or the stamps.0.csv, stamps.1.csv .... written by workers"""
+    if not path:
+        return []
+    if os.path.exists(path):
+        return [path]
+    root, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(root)}.[0-9]*{ext}"))
+
+
+def read_stamps(paths: Iterable[str]) -> dict[str, int]:
+    """id -> stamp in epoch microseconds"""
+    stamps = {}
+    for path in paths:
+        with open(path) as fp:
+            for line in fp:
+                _, row_id, at = line.rstrip("\n").rsplit(",", 2)
+                stamps[row_id] = int(at)
+    return stamps
+
+
+def _micros(obj: dict) -> int | None:
+    """highest resolution timestamp debezium put on obj, in microseconds"""
+    if obj.get("ts_us") is not None:
+        return obj["ts_us"]
+    if obj.get("ts_ns") is not None:
+        return obj["ts_ns"] // 1000
+    if obj.get("ts_ms") is not None:
+        return obj["ts_ms"] * 1000
+    return None
+
+
+class LatencyAnalyzer:
+    """takes envelopes in capture order, windows are cut on the envelope's ts"""
+
+    def __init__(self, stamps: dict[str, int] | None = None, window: float = 10.0):
+        self.stamps = stamps or {}
+        self.window_us = int(window * 1_000_000)
+        # commit (source.ts) to the envelope's ts, for every row
+        self.capture = Histogram(CDC_BUCKETS)
+        # our stamp to the envelope's ts, stamped rows only. needs synced clocks
+        self.end_to_end = Histogram(CDC_BUCKETS)
+        self.max = {"capture": 0.0, "end_to_end": 0.0}
+        self.envelopes = 0
+        self.skipped = 0
+        self.first_us: int | None = None
+        self.last_us: int | None = None
+        self._window_start: int | None = None
+        self._window = Histogram(CDC_BUCKETS)
+
+    def feed(self, envelope: dict | None) -> dict | None:
+        """returns the summary of a window when this envelope closes one"""
+        payload = envelope.get("payload", envelope) if envelope else None
+        if not payload or "source" not in payload:
+            # tombstones and non change messages
+            self.skipped += 1
+            return None
+        seen = _micros(payload)
+        committed = _micros(payload["source"])
+        if seen is None or committed is None:
+            self.skipped += 1
+            return None
+
+        closed = None
+        if self._window_start is None:
+            self._window_start = seen - seen % self.window_us
+        elif seen >= self._window_start + self.window_us:
+            closed = self._close_window()
+            self._window_start = seen - seen % self.window_us
+
+        self.envelopes += 1
+        self.first_us = seen if self.first_us is None else min(self.first_us, seen)
+        self.last_us = seen if self.last_us is None else max(self.last_us, seen)
+        capture = max(0, seen - committed) / 1_000_000
+        self.capture.observe(capture)
+        self.max["capture"] = max(self.max["capture"], capture)
+        self._window.observe(capture)
+
+        row = payload.get("after") or payload.get("before") or {}
+        stamp = self.stamps.pop(str(row.get("id")), None)
+        if stamp is not None:
+            latency = max(0, seen - stamp) / 1_000_000
+            self.end_to_end.observe(latency)
+            self.max["end_to_end"] = max(self.max["end_to_end"], latency)
+        return closed
+
+    def _close_window(self) -> dict:
+        window = {
+            "start": self._window_start / 1_000_000,
+            "events": self._window.count,
+            "events_per_sec": self._window.count / (self.window_us / 1_000_000),
+            "capture_p50": self._window.quantile(0.5),
+            "capture_p99": self._window.quantile(0.99),
+        }
+        self._window = Histogram(CDC_BUCKETS)
+        return window
+
+    def finish(self) -> dict:
+        """summary over the whole capture, closes the last window"""
+        last = self._close_window() if self._window.count else None
+        span = (self.last_us - self.first_us) / 1_000_000 if self.envelopes > 1 else 0.0
+        summary = {
+            "envelopes": self.envelopes,
+            "skipped": self.skipped,
+            "span": span,
+            "events_per_sec": self.envelopes / span if span else 0.0,
+            "last_window": last,
+        }
+        for name, histogram in (
+            ("capture", self.capture),
+            ("end_to_end", self.end_to_end),
+        ):
+            # bucket bounds can overshoot the largest value actually seen
+            summary[name] = {
+                "count": histogram.count,
+                "p50": min(histogram.quantile(0.5), self.max[name]),
+                "p99": min(histogram.quantile(0.99), self.max[name]),
+                "max": self.max[name],
+            }
+        # stamped rows that never showed up, e.g. tables outside the capture
+        summary["end_to_end"]["unmatched"] = len(self.stamps)
+        return summary
+
+
+def read_envelopes(fp: IO[str]) -> Iterator[dict | None]:
+    """one json document per line, blank and unparsable lines are skipped"""
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # e.g. a key printed before the value by the console consumer
+            _, _, value = line.partition("\t")
+            try:
+                yield json.loads(value)
+            except json.JSONDecodeError:
+                yield None
+
+
+def analyze(
+    path: str,
+    logger: Logger,
+    stamp_paths: list[str] = (),
+    window: float = 10.0,
+) -> dict:
+    """reads envelopes from path, - for stdin, logs every window and the summary"""
+    analyzer = LatencyAnalyzer(read_stamps(stamp_paths), window=window)
+    fp = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for envelope in read_envelopes(fp):
+            closed = analyzer.feed(envelope)
+            if closed:
+                logger.info(_window_line(closed))
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+    summary = analyzer.finish()
+    if summary["last_window"]:
+        logger.info(_window_line(summary["last_window"]))
+    for name in ("capture", "end_to_end"):
+        s = summary[name]
+        if s["count"]:
+            logger.info(
+                f"{name}: {s['count']} rows, p50 {s['p50'] * 1000:.1f}ms, "
+                f"p99 {s['p99'] * 1000:.1f}ms, max {s['max'] * 1000:.1f}ms"
+            )
+    logger.info(
+        f"{summary['envelopes']} envelopes over {summary['span']:.1f}s "
+        f"({summary['events_per_sec']:.0f}/s), {summary['skipped']} skipped"
+    )
+    return summary
+
+
+def _window_line(window: dict) -> str:
+    return (
+        f"{time.strftime('%H:%M:%S', time.gmtime(window['start']))} "
+        f"{window['events_per_sec']:.0f} events/s, capture p50 "
+        f"{window['capture_p50'] * 1000:.1f}ms p99 {window['capture_p99'] * 1000:.1f}ms"
+    )
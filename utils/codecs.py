@@ -0,0 +1,67 @@
+"""binary jsonb and cidr codecs, registered on every pool connection"""
+
+import json
+import socket
+from typing import Any
+
+from asyncpg import Connection
+
+# jsonb binary format is a version byte followed by the json text
+_JSONB_VERSION = b"\x01"
+_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+# postgres' own family numbers, not the platform's AF_INET / AF_INET6
+_PGSQL_AF_INET = 2
+_PGSQL_AF_INET6 = 3
+
+
+class JsonText(str):
+    """json that is already encoded, sent as it is. a plain str is a json string"""
+
+    __slots__ = ()
+
+
+def encode_jsonb(value: Any) -> bytes:
+    if isinstance(value, JsonText):
+        return _JSONB_VERSION + value.encode()
+    return _JSONB_VERSION + _dumps(value).encode()
+
+
+def decode_jsonb(data: bytes) -> Any:
+    return json.loads(data[1:])
+
+
+def encode_cidr(value: Any) -> bytes:
+    """'10.0.0.1', '10.0.0.0/8' or an ipaddress object"""
+    address, _, bits = str(value).partition("/")
+    if ":" in address:
+        family, packed = _PGSQL_AF_INET6, socket.inet_pton(socket.AF_INET6, address)
+    else:
+        family, packed = _PGSQL_AF_INET, socket.inet_aton(address)
+    bits = int(bits) if bits else 8 * len(packed)
+    # family, bits, is_cidr, address length, address
+    return bytes((family, bits, 1, len(packed))) + packed
+
+
+def decode_cidr(data: bytes) -> str:
+    family, bits, _, length = data[:4]
+    af = socket.AF_INET if family == _PGSQL_AF_INET else socket.AF_INET6
+    return f"{socket.inet_ntop(af, data[4 : 4 + length])}/{bits}"
+
+
+async def register_codecs(conn: Connection):
+    """pool init hook, runs once per new connection"""
+    await conn.set_type_codec(
+        "jsonb",
+        schema="pg_catalog",
+        encoder=encode_jsonb,
+        decoder=decode_jsonb,
+        format="binary",
+    )
+    await conn.set_type_codec(
+        "cidr",
+        schema="pg_catalog",
+        encoder=encode_cidr,
+        decoder=decode_cidr,
+        format="binary",
+    )
@@ -1,11 +1,20 @@
 import dataclasses
-from typing import Protocol, TypeVar
+import time
+from datetime import datetime
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Protocol, TypeVar
 import asyncpg
-from asyncpg import Connection
+from asyncpg import Connection, Record
 from logging import Logger
 from typing import Any
 import json
 
+from .codecs import JsonText, register_codecs
+from .metrics import REGISTRY, ROW_BUCKETS, Histogram, MetricsRegistry
+from .models import Row
+from .statements import StatementCache
+
 
 class DataclassProtocol(Protocol):
     __dataclass_fields__: dict
@@ -15,10 +24,30 @@ T = TypeVar("T", bound=DataclassProtocol)
 
 
 class Database:
-    def __init__(self, logger: Logger, schema: str, conn: Connection | None = None):
+    def __init__(
+        self,
+        logger: Logger,
+        schema: str,
+        conn: Connection | None = None,
+        metrics: MetricsRegistry | None = None,
+        native_json: bool = False,
+    ):
         self.conn: Connection | None = conn
+        # connections encode dicts into jsonb themselves, see codecs.py
+        self.native_json = native_json
         self.logger: Logger = logger
         self.schema = schema
+        self.statements = StatementCache()
+        self.metrics = metrics or REGISTRY
+        self.pool_wait = self.metrics.histogram(
+            "db_pool_acquire_seconds", "time spent waiting for a pool connection"
+        )
+        # (op, table) -> (latency, rows per statement)
+        self._series: dict[tuple[str, str], tuple[Histogram, Histogram]] = {}
+        # rows successfully written, keyed on lower case table name
+        self.rows_written: Counter[str] = Counter()
+        # table -> {column: sql type}, read once from the catalog
+        self._column_types: dict[str, dict[str, str]] = {}
 
     @classmethod
     async def create(
@@ -30,6 +59,9 @@ class Database:
         host: str,
         schema: str,
         logger: Logger,
+        statement_cache_size: int = 1024,
+        min_size: int = 10,
+        max_size: int = 10,
     ):
         pool = await asyncpg.create_pool(
             user=user,
@@ -37,8 +69,13 @@ class Database:
             password=password,
             port=port,
             host=host,
+            # prepared statements are cached per connection, keyed on query text
+            statement_cache_size=statement_cache_size,
+            min_size=min_size,
+            max_size=max_size,
+            init=register_codecs,
         )
-        return cls(logger=logger, conn=pool, schema=schema)
+        return cls(logger=logger, conn=pool, schema=schema, native_json=True)
 
     async def select(
         self,
@@ -48,22 +85,49 @@ class Database:
         order_by: list[str] | None = None,
         limit: int | None = None,
     ):
-        """
-        select columns.... from schema.table where .... order by .... limit ....
-        """
+        """select columns.... from schema.table where .... order by .... limit ...."""
+        where_keys = tuple(where_clause) if where_clause else ()
+        key = (
+            "select",
+            table,
+            tuple(columns or ()),
+            where_keys,
+            tuple(order_by or ()),
+            bool(limit),
+        )
+        query = self.statements.get(
+            key,
+            lambda: self._select_query(table, columns, where_keys, order_by, limit),
+        )
+
+        args = [where_clause[k] for k in where_keys]
+        if limit:
+            args.append(limit)
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            res = await conn.fetch(query, *args)
+            self._observe("select", table, start, len(res))
+        return res
+
+    def _select_query(
+        self,
+        table: str,
+        columns: list[str] | None,
+        where_keys: tuple[str, ...],
+        order_by: list[str] | None,
+        limit: int | None,
+    ) -> str:
         columns_placeholder = ""
         if not columns:
             columns_placeholder = "*"
         else:
             columns_placeholder = ",".join(columns)
 
-        temp_where_placeholder = ""
-        if where_clause:
+        where_placeholder = ""
+        if where_keys:
             temp_where_placeholder = " AND ".join(
-                [f"{key} = {value}" for key, value in where_clause.items()]
+                [f"{key} = ${i + 1}" for i, key in enumerate(where_keys)]
             )
-        where_placeholder = ""
-        if temp_where_placeholder:
             where_placeholder = f"WHERE {temp_where_placeholder}"
 
         order_by_placeholder = ""
@@ -73,11 +137,26 @@ class Database:
 
         limit_placeholder = ""
         if limit:
-            limit_placeholder = f"LIMIT {limit}"
+            limit_placeholder = f"LIMIT ${len(where_keys) + 1}"
 
-        query = f"SELECT {columns_placeholder} from {self.schema}.{table} {where_placeholder} {order_by_placeholder} {limit_placeholder}"
-        res = await self.conn.fetch(query)
-        return res
+        return f"SELECT {columns_placeholder} from {self.schema}.{table} {where_placeholder} {order_by_placeholder} {limit_placeholder}"
+
+    async def iterate(
+        self,
+        table: str,
+        columns: list[str] | None = None,
+        prefetch: int = 10000,
+        order_by: list[str] | None = None,
+    ) -> AsyncIterator[Record]:
+        """streams every row of schema.table through a server side cursor"""
+        columns_placeholder = ",".join(columns) if columns else "*"
+        query = f"SELECT {columns_placeholder} from {self.schema}.{table}"
+        if order_by:
+            query += f" ORDER BY {', '.join(order_by)}"
+        async with self.conn.acquire() as conn:
+            async with conn.transaction():
+                async for record in conn.cursor(query, prefetch=prefetch):
+                    yield record
 
     async def upsert(
         self,
@@ -86,34 +165,363 @@ class Database:
         conflict_keys: list[str] | None = None,
         update_fields: list[str] | None = None,
     ) -> None:
+        columns, values = self._rows(data, encode_json=not self.native_json)
+        await self.upsert_records(
+            table=table,
+            columns=columns,
+            records=values,
+            conflict_keys=conflict_keys,
+            update_fields=update_fields,
+            json_encoded=True,
+        )
+
+    async def upsert_records(
+        self,
+        table: str,
+        columns: list[str],
+        records: list[tuple],
+        conflict_keys: list[str] | None = None,
+        update_fields: list[str] | None = None,
+        json_encoded: bool = False,
+    ) -> None:
+        """same as upsert, for rows that are already tuples in columns order"""
         if conflict_keys == None:
             conflict_keys = []
+        if not records:
+            return
+        if not json_encoded:
+            records = await self._json_records(table, columns, records)
+        key = (
+            "upsert",
+            table,
+            tuple(columns),
+            tuple(conflict_keys),
+            tuple(update_fields or ()),
+        )
+        query = self.statements.get(
+            key,
+            lambda: self._upsert_query(table, columns, conflict_keys, update_fields),
+        )
 
-        norm = self._normalize(data)
-        columns = list(norm[0].keys())
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            await conn.executemany(query, records)
+            self._observe("upsert", table, start, len(records))
+        self.rows_written[table.lower()] += len(records)
+
+    def _upsert_query(
+        self,
+        table: str,
+        columns: list[str],
+        conflict_keys: list[str],
+        update_fields: list[str] | None,
+    ) -> str:
         columns_str = ", ".join(columns)
 
         insert_placeholders = ", ".join(f"${i + 1}" for i in range(len(columns)))
 
-        if not update_fields:
-            update_placeholders = ", ".join(
-                [
-                    f"{col} = EXCLUDED.{col}"
-                    for col in columns
-                    if col not in conflict_keys
-                ]
+        update_placeholders = self._update_placeholders(
+            columns, conflict_keys, update_fields
+        )
+        conflict_placeholders = ",".join(conflict_keys)
+
+        if conflict_placeholders == "":
+            return f"INSERT INTO {self.schema}.{table} ({columns_str}) VALUES ({insert_placeholders})"
+        return f"INSERT INTO {self.schema}.{table} ({columns_str}) VALUES ({insert_placeholders}) ON CONFLICT ({conflict_placeholders}) DO UPDATE SET {update_placeholders}"
+
+    async def bulk_upsert(
+        self,
+        table: str,
+        data: list[dict | T],
+        conflict_keys: list[str] | None = None,
+        update_fields: list[str] | None = None,
+    ) -> None:
+        """
+        COPY instead of one INSERT per row, merged from a temp table on conflict keys
+        """
+        columns, values = self._rows(data, encode_json=not self.native_json)
+        await self.bulk_upsert_records(
+            table=table,
+            columns=columns,
+            records=values,
+            conflict_keys=conflict_keys,
+            update_fields=update_fields,
+            json_encoded=True,
+        )
+
+    async def bulk_upsert_records(
+        self,
+        table: str,
+        columns: list[str],
+        records: list[tuple],
+        conflict_keys: list[str] | None = None,
+        update_fields: list[str] | None = None,
+        json_encoded: bool = False,
+    ) -> None:
+        """same as bulk_upsert, for rows that are already tuples in columns order"""
+        if not records:
+            return
+        if not json_encoded:
+            records = await self._json_records(table, columns, records)
+
+        # COPY quotes identifiers, so fold to the name postgres created
+        table_name = table.lower()
+
+        if not conflict_keys:
+            async with self._acquire() as conn:
+                start = time.perf_counter()
+                await conn.copy_records_to_table(
+                    table_name,
+                    records=records,
+                    columns=columns,
+                    schema_name=self.schema,
+                )
+                self._observe("copy", table, start, len(records))
+            self.rows_written[table_name] += len(records)
+            return
+
+        temp_table = f"_bulk_{table_name}"
+        key = (
+            "merge",
+            table,
+            tuple(columns),
+            tuple(conflict_keys),
+            tuple(update_fields or ()),
+        )
+        merge_query = self.statements.get(
+            key,
+            lambda: self._merge_query(
+                table, temp_table, columns, conflict_keys, update_fields
+            ),
+        )
+
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE TEMP TABLE {temp_table} (LIKE {self.schema}.{table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                await conn.copy_records_to_table(
+                    temp_table, records=records, columns=columns
+                )
+                await conn.execute(merge_query)
+            self._observe("merge", table, start, len(records))
+        self.rows_written[table_name] += len(records)
+
+    async def insert_atomic(self, writes: list[tuple[str, list[dict | T]]]) -> None:
+        """inserts into several tables in one statement, every row lands or none does"""
+        await self.insert_atomic_records(
+            [
+                (table, *self._rows(data, encode_json=not self.native_json))
+                for table, data in writes
+            ],
+            json_encoded=True,
+        )
+
+    async def insert_atomic_records(
+        self,
+        writes: list[tuple[str, list[str], list[tuple]]],
+        json_encoded: bool = False,
+    ) -> None:
+        """same as insert_atomic, for (table, columns, records) already in tuples"""
+        tables = []
+        args = []
+        counts = Counter()
+        for table, columns, values in writes:
+            if not columns:
+                continue
+            types = await self.column_types(table)
+            tables.append((table, tuple(columns), tuple(types[c] for c in columns)))
+            if not json_encoded:
+                values = await self._json_records(table, columns, values)
+            # unnest takes one array per column
+            args.extend(list(col) for col in zip(*values))
+            counts[table.lower()] += len(values)
+        if not tables:
+            return
+
+        query = self.statements.get(
+            ("atomic", tuple(tables)), lambda: self._atomic_query(tables)
+        )
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            await conn.execute(query, *args)
+            self._observe("atomic", "+".join(counts), start, sum(counts.values()))
+        self.rows_written.update(counts)
+
+    def _atomic_query(self, tables: list[tuple[str, tuple, tuple]]) -> str:
+        ctes = []
+        param = 1
+        for i, (table, columns, types) in enumerate(tables):
+            arrays = []
+            for col_type in types:
+                arrays.append(f"${param}::{col_type}[]")
+                param += 1
+            ctes.append(
+                f"w{i} AS (INSERT INTO {self.schema}.{table} ({', '.join(columns)}) "
+                f"SELECT * FROM unnest({', '.join(arrays)}))"
             )
-        else:
-            update_placeholders = ", ".join(
-                [f"{field} = EXCLUDED.{field}" for field in update_fields]
+        return f"WITH {', '.join(ctes)} SELECT 1"
+
+    async def update_records(
+        self, table: str, key: str, columns: list[str], records: list[tuple]
+    ) -> int:
+        """one UPDATE .... FROM unnest(....) for (key, *columns), returns rows updated"""
+        if not records:
+            return 0
+        types = await self.column_types(table)
+        names = (key, *columns)
+        query = self.statements.get(
+            ("update", table, names),
+            lambda: self._update_query(table, names, [types[c] for c in names]),
+        )
+        args = [list(col) for col in zip(*records)]
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            status = await conn.execute(query, *args)
+            self._observe("update", table, start, len(records))
+        return _affected(status, len(records))
+
+    def _update_query(self, table: str, names: tuple, types: list[str]) -> str:
+        key, *columns = names
+        arrays = ", ".join(f"${i}::{t}[]" for i, t in enumerate(types, start=1))
+        assignments = ", ".join(f"{col} = u.{col}" for col in columns)
+        return (
+            f"UPDATE {self.schema}.{table} AS t SET {assignments} "
+            f"FROM unnest({arrays}) AS u({', '.join(names)}) WHERE t.{key} = u.{key}"
+        )
+
+    async def delete_records(
+        self,
+        table: str,
+        key: str,
+        keys: list,
+        children: list[tuple[str, str]] = (),
+    ) -> int:
+        """
+        deletes keys with their children's rows in one statement, returns rows deleted
+        """
+        if not keys:
+            return 0
+        key_type = (await self.column_types(table))[key]
+        query = self.statements.get(
+            ("delete", table, key, tuple(children)),
+            lambda: self._delete_query(table, key, key_type, children),
+        )
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            status = await conn.execute(query, list(keys))
+            self._observe("delete", table, start, len(keys))
+        return _affected(status, len(keys))
+
+    def _delete_query(
+        self, table: str, key: str, key_type: str, children: list[tuple[str, str]]
+    ) -> str:
+        ctes = [
+            f"c{i} AS (DELETE FROM {self.schema}.{child} WHERE {column} = ANY($1::{key_type}[]))"
+            for i, (child, column) in enumerate(children)
+        ]
+        query = f"DELETE FROM {self.schema}.{table} WHERE {key} = ANY($1::{key_type}[])"
+        return f"WITH {', '.join(ctes)} {query}" if ctes else query
+
+    async def column_types(self, table: str) -> dict[str, str]:
+        table_name = table.lower()
+        types = self._column_types.get(table_name)
+        if types is None:
+            rows = await self.conn.fetch(
+                "SELECT a.attname AS name, format_type(a.atttypid, NULL) AS type "
+                "FROM pg_attribute a WHERE a.attrelid = $1::regclass "
+                "AND a.attnum > 0 AND NOT a.attisdropped",
+                f'{self.schema}."{table_name}"',
             )
+            types = {row["name"]: row["type"] for row in rows}
+            self._column_types[table_name] = types
+        return types
+
+    async def _json_records(
+        self, table: str, columns: list[str], records: list[tuple]
+    ) -> list[tuple]:
+        # without the jsonb codec, json columns have to be sent as text
+        if self.native_json:
+            return records
+        types = await self.column_types(table)
+        indexes = tuple(
+            i for i, col in enumerate(columns) if types.get(col) in ("json", "jsonb")
+        )
+        if not indexes:
+            return records
+        return [self._encode_json(r, indexes) for r in records]
 
+    @asynccontextmanager
+    async def _acquire(self):
+        start = time.perf_counter()
+        async with self.conn.acquire() as conn:
+            self.pool_wait.observe(time.perf_counter() - start)
+            yield conn
+
+    def _observe(self, op: str, table: str, start: float, rows: int):
+        series = self._series.get((op, table))
+        if series is None:
+            labels = {"op": op, "table": table.lower()}
+            series = self._series[(op, table)] = (
+                self.metrics.histogram(
+                    "db_statement_seconds", "statement latency", **labels
+                ),
+                self.metrics.histogram(
+                    "db_statement_rows",
+                    "rows per statement",
+                    buckets=ROW_BUCKETS,
+                    **labels,
+                ),
+            )
+        latency, batch = series
+        latency.observe(time.perf_counter() - start)
+        batch.observe(rows)
+
+    def _merge_query(
+        self,
+        table: str,
+        temp_table: str,
+        columns: list[str],
+        conflict_keys: list[str],
+        update_fields: list[str] | None,
+    ) -> str:
+        columns_str = ", ".join(columns)
         conflict_placeholders = ",".join(conflict_keys)
+        update_placeholders = self._update_placeholders(
+            columns, conflict_keys, update_fields
+        )
+        # DISTINCT ON keeps a single row per key, ON CONFLICT cannot touch a row twice
+        return (
+            f"INSERT INTO {self.schema}.{table} ({columns_str}) "
+            f"SELECT DISTINCT ON ({conflict_placeholders}) {columns_str} FROM {temp_table} "
+            f"ON CONFLICT ({conflict_placeholders}) DO UPDATE SET {update_placeholders}"
+        )
 
-        if conflict_placeholders == "":
-            query = f"INSERT INTO {self.schema}.{table} ({columns_str}) VALUES ({insert_placeholders})"
-        else:
-            query = f"INSERT INTO {self.schema}.{table} ({columns_str}) VALUES ({insert_placeholders}) ON CONFLICT ({conflict_placeholders}) DO UPDATE SET {update_placeholders}"
+    @staticmethod
+    def _rows(
+        data: list[dict | T], encode_json: bool = True
+    ) -> tuple[list[str], list[tuple]]:
+        """
+        column names and one tuple per row, dicts dumped to json text with encode_json
+        """
+        if data and isinstance(data[0], Row):
+            # models hand out tuples in column order, no dict per row
+            model = type(data[0])
+            values = model._values
+            records = [values(d) for d in data]
+            if model.JSON_INDEXES and encode_json:
+                records = [
+                    Database._encode_json(r, model.JSON_INDEXES) for r in records
+                ]
+            return list(model.COLUMNS), records
+
+        norm = Database._normalize(data)
+        if not norm:
+            return [], []
+        columns = list(norm[0].keys())
+        if not encode_json:
+            return columns, [tuple(row.get(col) for col in columns) for row in norm]
 
         # values = [tuple(row.get(col) for col in columns) for row in norm]
         values = []
@@ -125,8 +533,33 @@ class Database:
                     item = json.dumps(item)
                 items.append(item)
             values.append(tuple(items))
+        return columns, values
 
-        await self.conn.executemany(query, values)
+    @staticmethod
+    def _encode_json(record: tuple, indexes: tuple[int, ...]) -> tuple:
+        items = None
+        for i in indexes:
+            if record[i] is not None and not isinstance(record[i], JsonText):
+                if items is None:
+                    items = list(record)
+                items[i] = json.dumps(record[i])
+        return record if items is None else tuple(items)
+
+    def _update_placeholders(
+        self,
+        columns: list[str],
+        conflict_keys: list[str],
+        update_fields: list[str] | None = None,
+    ) -> str:
+        if not update_fields:
+            return ", ".join(
+                [
+                    f"{col} = EXCLUDED.{col}"
+                    for col in columns
+                    if col not in conflict_keys
+                ]
+            )
+        return ", ".join([f"{field} = EXCLUDED.{field}" for field in update_fields])
 
     async def truncate_tables(self, table_names):
         if not table_names:
@@ -137,9 +570,13 @@ class Database:
 
         await self.conn.execute(query)
 
-    def _normalize(self, data: list[dict | T]):
+    @staticmethod
+    def _normalize(data: list[dict | T]):
         if len(data) == 0:
             return []
+        if isinstance(data[0], Row):
+            columns = data[0].COLUMNS
+            return [dict(zip(columns, d.values())) for d in data]
         if dataclasses.is_dataclass(data[0]):
             return [dataclasses.asdict(d) for d in data]
         elif isinstance(data[0], dict):
@@ -152,6 +589,64 @@ class Database:
         for ddl in ddls:
             await self.conn.execute(ddl)
 
+    async def partitions(self, table: str) -> list[str] | None:
+        """names of the table's partitions, None when it is not partitioned"""
+        parent = f"{self.schema}.{table}"
+        kind = await self.conn.fetchval(
+            "SELECT relkind FROM pg_class WHERE oid = $1::regclass", parent
+        )
+        if kind != "p":
+            return None
+        rows = await self.conn.fetch(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = $1::regclass ORDER BY c.relname",
+            parent,
+        )
+        return [row["relname"] for row in rows]
+
+    async def create_partition(
+        self, table: str, partition: str, start: datetime, end: datetime
+    ):
+        """range partition [start, end) of table"""
+        query = (
+            f"CREATE TABLE IF NOT EXISTS {self.schema}.{partition} "
+            f"PARTITION OF {self.schema}.{table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        await self.conn.execute(query)
+
+    async def detach_partition(self, table: str, partition: str):
+        # CONCURRENTLY is not allowed next to a default partition
+        query = f"ALTER TABLE {self.schema}.{table} DETACH PARTITION {self.schema}.{partition}"
+        await self.conn.execute(query)
+
+    async def drop_tables(self, table_names):
+        if not table_names:
+            return
+        query_input = [f"{self.schema}.{table_name}" for table_name in table_names]
+        await self.conn.execute(f"DROP TABLE IF EXISTS {','.join(query_input)}")
+
+    async def replication_slots(self, slot: str | None = None) -> list[Record]:
+        """logical slots and the bytes of wal each one retains and lags behind"""
+        query = self.statements.get(
+            ("replication_slots", bool(slot)),
+            lambda: (
+                "SELECT s.slot_name, s.active, "
+                "pg_wal_lsn_diff(pg_current_wal_lsn(), s.restart_lsn)::bigint AS retained_bytes, "
+                "pg_wal_lsn_diff(pg_current_wal_lsn(), s.confirmed_flush_lsn)::bigint AS lag_bytes, "
+                "extract(epoch FROM r.flush_lag)::float8 AS flush_lag_seconds "
+                "FROM pg_replication_slots s "
+                "LEFT JOIN pg_stat_replication r ON r.pid = s.active_pid "
+                "WHERE s.slot_type = 'logical'"
+                + (" AND s.slot_name = $1" if slot else "")
+            ),
+        )
+        async with self._acquire() as conn:
+            start = time.perf_counter()
+            res = await conn.fetch(query, *([slot] if slot else []))
+            self._observe("select", "pg_replication_slots", start, len(res))
+        return res
+
     async def drop_schema(self):
         query = f"DROP SCHEMA IF EXISTS {self.schema} CASCADE"
         await self.conn.execute(query)
@@ -159,3 +654,11 @@ class Database:
     async def close(self):
         if self.conn:
             await self.conn.close()
+
+
+def _affected(status: str | None, default: int) -> int:
+    """row count from a command tag such as 'UPDATE 5'"""
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return default
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import math
+import os
+from bisect import bisect_left
+from logging import Logger
+
+# 50us doubling up to ~6.5s
+LATENCY_BUCKETS = [0.00005 * 2**i for i in range(18)]
+ROW_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000]
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """fixed buckets, observe() is a bisect and two additions"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        # last slot counts everything above the highest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """upper bound of the bucket holding the q-th observation"""
+        return bucket_quantile(self.buckets, self.counts, q)
+
+
+def bucket_quantile(buckets: list[float], counts: list[int], q: float) -> float:
+    """quantile over bucket counts, or over the difference of two snapshots"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(counts):
+        seen += c
+        if seen >= rank and c:
+            return buckets[i] if i < len(buckets) else math.inf
+    return math.inf
+
+
+class MetricsRegistry:
+    """named counters and histograms, one series per label set"""
+
+    def __init__(self):
+        self._help: dict[str, str] = {}
+        self._types: dict[str, str] = {}
+        self._series: dict[str, dict[tuple, Counter | Gauge | Histogram]] = {}
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        return self._get(name, "counter", help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", **labels: str) -> Gauge:
+        return self._get(name, "gauge", help, labels, Gauge)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = "",
+        buckets: list[float] = LATENCY_BUCKETS,
+        **labels: str,
+    ) -> Histogram:
+        return self._get(name, "histogram", help, labels, lambda: Histogram(buckets))
+
+    def _get(self, name, kind, help, labels, factory):
+        if self._types.setdefault(name, kind) != kind:
+            raise ValueError(f"metric {name} is a {self._types[name]}, not a {kind}")
+        if help:
+            self._help.setdefault(name, help)
+        series = self._series.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        metric = series.get(key)
+        if metric is None:
+            metric = series[key] = factory()
+        return metric
+
+    def series(
+        self, name: str
+    ) -> list[tuple[dict[str, str], Counter | Gauge | Histogram]]:
+        """every label set registered under name, with its metric"""
+        return [(dict(key), m) for key, m in self._series.get(name, {}).items()]
+
+    def snapshot(self) -> dict:
+        out = {}
+        for name, series in self._series.items():
+            entries = []
+            for key, metric in series.items():
+                entry = {"labels": dict(key)}
+                if isinstance(metric, (Counter, Gauge)):
+                    entry["value"] = metric.value
+                else:
+                    entry.update(
+                        count=metric.count,
+                        sum=metric.sum,
+                        p50=metric.quantile(0.5),
+                        p99=metric.quantile(0.99),
+                    )
+                entries.append(entry)
+            out[name] = {"type": self._types[name], "series": entries}
+        return out
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, series in self._series.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            for key, metric in series.items():
+                if isinstance(metric, (Counter, Gauge)):
+                    lines.append(f"{name}{_labels(key)} {metric.value}")
+                    continue
+                cumulative = 0
+                for le, c in zip(metric.buckets + [math.inf], metric.counts):
+                    cumulative += c
+                    le_str = "+Inf" if le == math.inf else repr(le)
+                    lines.append(
+                        f"{name}_bucket{_labels(key + (('le', le_str),))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_labels(key)} {metric.sum}")
+                lines.append(f"{name}_count{_labels(key)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """json when path ends in .json, prometheus text format otherwise"""
+        if path.endswith(".json"):
+            body = json.dumps(self.snapshot(), indent=2, default=str)
+        else:
+            body = self.to_prometheus()
+        # readers never see a half written file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fp:
+            fp.write(body)
+        os.replace(tmp, path)
+
+    async def export_periodically(self, path: str, interval: float, logger: Logger):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    logger.warning(f"error writing metrics to {path}: {e}")
+        finally:
+            # last snapshot on the way out
+            try:
+                self.write(path)
+            except OSError as e:
+                logger.warning(f"error writing metrics to {path}: {e}")
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in key)
+    return "{" + inner + "}"
+
+
+# process wide registry, used unless a component is given its own
+REGISTRY = MetricsRegistry()
@@ -1,14 +1,42 @@
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from operator import attrgetter
 import random
 from datetime import datetime
 from faker import Faker
-import uuid
-from typing import Any
+from typing import Any, ClassVar, get_origin
 
+from .rng import random_uuid
 
-@dataclass
-class User:
+
+class Row:
+    """base of the table models, a row turns into a tuple in column order in one call"""
+
+    __slots__ = ()
+
+    # field names, in table column order
+    COLUMNS: ClassVar[tuple[str, ...]] = ()
+    # positions of dict valued columns, they are sent as json
+    JSON_INDEXES: ClassVar[tuple[int, ...]] = ()
+    _values: ClassVar[attrgetter]
+
+    def values(self) -> tuple:
+        return self._values(self)
+
+
+def row(cls):
+    """fills in the Row class attributes of a model"""
+    cls.COLUMNS = tuple(f.name for f in fields(cls))
+    cls.JSON_INDEXES = tuple(
+        i for i, f in enumerate(fields(cls)) if (get_origin(f.type) or f.type) is dict
+    )
+    cls._values = attrgetter(*cls.COLUMNS)
+    return cls
+
+
+@row
+@dataclass(slots=True)
+class User(Row):
     id: str
     username: str
     first_name: str
@@ -21,8 +49,8 @@ class User:
     user_agent: str
 
     @classmethod
-    def new(cls, faker: Faker):
-        gender: str = random.choice(["M", "F", "O"])
+    def new(cls, faker: Faker, rng: random.Random | None = None):
+        gender: str = (rng or random).choice(["M", "F", "O"])
         if gender == "M":
             first_name = faker.first_name_male()
             last_name = faker.last_name_male()
@@ -31,7 +59,7 @@ class User:
             last_name = faker.last_name_female()
 
         return User(
-            id=str(uuid.uuid4()),
+            id=random_uuid(rng),
             username=faker.user_name(),
             first_name=first_name,
             last_name=last_name,
@@ -62,8 +90,9 @@ class User:
         """
 
 
-@dataclass
-class Product:
+@row
+@dataclass(slots=True)
+class Product(Row):
     id: str
     name: str
     main_category: str
@@ -87,9 +116,10 @@ class Product:
         no_of_ratings: int,
         discount_price: float,
         actual_price: float,
+        rng: random.Random | None = None,
     ):
         return Product(
-            id=str(uuid.uuid4()),
+            id=random_uuid(rng),
             name=name,
             main_category=main_category,
             sub_category=sub_category,
@@ -134,8 +164,9 @@ class EventType(Enum):
     REMOVE_FROM_CART = "REMOVE_FROM_CART"
 
 
-@dataclass
-class Event:
+@row
+@dataclass(slots=True)
+class Event(Row):
     id: str
     context_id: str  # for context propagation
     ip_address: str
@@ -154,9 +185,10 @@ class Event:
         event_type: EventType,
         metadata: dict[str, Any] | None = None,
         context_id: str | None = None,
+        rng: random.Random | None = None,
     ):
         return Event(
-            id=str(uuid.uuid4()),
+            id=random_uuid(rng),
             ip_address=ip_address,
             context_id=context_id,
             user_name=user_name,
@@ -167,31 +199,54 @@ class Event:
         )
 
     @classmethod
-    def ddl(cls, schema):
-        return f"""
-            CREATE TABLE IF NOT EXISTS {schema}.{cls.__name__} (
-                id UUID PRIMARY KEY,
+    def ddl(cls, schema, partitioned: bool = False, brin: bool = False):
+        """
+        partitioned ranges by created_at, the partitions come from generator.partitions
+        """
+        table = f"{schema}.{cls.__name__}"
+        if partitioned:
+            key = "PRIMARY KEY (id, created_at)"
+            partition_by = "PARTITION BY RANGE (created_at)"
+        else:
+            key = "PRIMARY KEY (id)"
+            partition_by = ""
+        ddl = f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id UUID NOT NULL,
                 event_type VARCHAR(20) NOT NULL,
                 ip_address CIDR NOT NULL,
                 context_id UUID,
                 user_name VARCHAR(40),
                 created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_DATE,
                 user_agent TEXT,
-                metadata JSONB
-            )
+                metadata JSONB,
+                {key}
+            ) {partition_by};
+        """
+        if partitioned:
+            ddl += f"""
+            CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;
         """
+        if brin:
+            # a few pages per block range, next to nothing to maintain on insert
+            ddl += f"""
+            CREATE INDEX IF NOT EXISTS {cls.__name__}_created_at_brin
+                ON {table} USING brin (created_at);
+        """
+        return ddl
 
 
-@dataclass
-class Order:
+@row
+@dataclass(slots=True)
+class Order(Row):
     id: str
     u_id: str
     created_at: datetime
 
     @classmethod
-    def new(cls, u_id: str):
+    def new(cls, u_id: str, rng: random.Random | None = None):
         return Order(
-            id=str(uuid.uuid4()),
+            id=random_uuid(rng),
             u_id=u_id,
             created_at=datetime.now(),
         )
@@ -204,12 +259,17 @@ class Order:
                 u_id UUID NOT NULL,
                 created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_DATE,
                 FOREIGN KEY (u_id) REFERENCES {schema}.USER(id)
-            )
+            );
+            -- set by generator.mutations, inserts leave the defaults
+            ALTER TABLE {schema}.{cls.__name__}
+                ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'PLACED',
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
         """
 
 
-@dataclass
-class OrderLine:
+@row
+@dataclass(slots=True)
+class OrderLine(Row):
     id: str
     order_id: str
     product_id: str
@@ -217,9 +277,15 @@ class OrderLine:
     created_at: datetime
 
     @classmethod
-    def new(cls, order_id: str, product_id: str, quantity: float):
+    def new(
+        cls,
+        order_id: str,
+        product_id: str,
+        quantity: float,
+        rng: random.Random | None = None,
+    ):
         return OrderLine(
-            id=str(uuid.uuid4()),
+            id=random_uuid(rng),
             order_id=order_id,
             product_id=product_id,
             quantity=quantity,
@@ -0,0 +1,182 @@
+"""binary log of every write a run made, to be replayed into postgres later"""
+
+import asyncio
+import gzip
+import pickle
+import struct
+import time
+from logging import Logger
+from typing import Iterator
+
+from .database import Database
+from .sinks import Sink
+
+MAGIC = b"ECDCLOG1"
+# per sink call: seconds since recording started, payload length, then the
+# pickled (atomic, writes). only replay logs you recorded yourself
+_FRAME = struct.Struct("<dI")
+
+Write = tuple[str, list[str], list[tuple], list[str] | None]
+
+
+class WriteLog:
+    def __init__(self, path: str):
+        self.path = path
+        self._fp = gzip.open(path, "wb", compresslevel=1)
+        self._fp.write(MAGIC)
+        self._start = time.monotonic()
+        self.frames = 0
+
+    def now(self) -> float:
+        return time.monotonic() - self._start
+
+    def append(self, offset: float, atomic: bool, writes: list[Write]):
+        payload = pickle.dumps((atomic, writes), protocol=pickle.HIGHEST_PROTOCOL)
+        self._fp.write(_FRAME.pack(offset, len(payload)))
+        self._fp.write(payload)
+        self.frames += 1
+
+    def close(self):
+        self._fp.close()
+
+
+def read_log(path: str) -> Iterator[tuple[float, bool, list[Write]]]:
+    """frames in recorded order, a log cut short ends at its last complete frame"""
+    with gzip.open(path, "rb") as fp:
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a write log")
+        while True:
+            try:
+                header = fp.read(_FRAME.size)
+                if len(header) < _FRAME.size:
+                    return
+                offset, length = _FRAME.unpack(header)
+                payload = fp.read(length)
+                if len(payload) < length:
+                    return
+            except EOFError:
+                return
+            atomic, writes = pickle.loads(payload)
+            yield offset, atomic, writes
+
+
+class RecordingSink(Sink):
+    """passes writes on to inner and logs the ones that succeeded"""
+
+    def __init__(self, inner: Sink, path: str):
+        super().__init__()
+        self.inner = inner
+        self.log = WriteLog(path)
+        self.rows_written = inner.rows_written
+
+    async def write(self, table, data, conflict_keys=None):
+        # dicts stay dicts, inner and the replay target encode them
+        columns, records = Database._rows(data, encode_json=False)
+        await self.write_records(table, columns, records, conflict_keys)
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        if not records:
+            return
+        # offset of when the write was issued, logged once it went through
+        offset = self.log.now()
+        await self.inner.write_records(table, columns, records, conflict_keys)
+        self.log.append(offset, False, [(table, columns, records, conflict_keys)])
+
+    async def write_atomic(self, writes):
+        await self.write_atomic_records(
+            [
+                (table, *Database._rows(data, encode_json=False))
+                for table, data in writes
+            ]
+        )
+
+    async def write_atomic_records(self, writes):
+        offset = self.log.now()
+        await self.inner.write_atomic_records(writes)
+        self.log.append(
+            offset,
+            True,
+            [(table, columns, records, None) for table, columns, records in writes],
+        )
+
+    async def close(self):
+        await self.inner.close()
+        self.log.close()
+
+
+async def replay(
+    path: str,
+    sink: Sink,
+    logger: Logger,
+    speed: float = 1.0,
+    batch_rows: int = 10000,
+) -> dict:
+    """
+    writes a recorded log into sink at speed times its pace, 0 for as fast as it goes
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    frames = 0
+    rows = 0
+    max_lag = 0.0
+
+    group_key = None
+    group: list[list] = []
+    group_rows = 0
+
+    async def flush():
+        nonlocal group_key, group, group_rows
+        if group_key is None:
+            return
+        atomic = group_key[0]
+        if atomic:
+            await sink.write_atomic_records(
+                [(table, columns, records) for table, columns, records, _ in group]
+            )
+        else:
+            table, columns, records, conflict_keys = group[0]
+            await sink.write_records(table, columns, records, conflict_keys)
+        group_key, group, group_rows = None, [], 0
+
+    for offset, atomic, writes in read_log(path):
+        if speed:
+            delay = start + offset / speed - loop.time()
+            if delay > 0:
+                # nothing else is due yet, write what is merged and wait
+                await flush()
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+
+        key = (
+            atomic,
+            tuple(
+                (table, tuple(columns), tuple(conflict_keys or ()))
+                for table, columns, _, conflict_keys in writes
+            ),
+        )
+        n = sum(len(records) for _, _, records, _ in writes)
+        if key != group_key or group_rows + n > batch_rows:
+            await flush()
+            group_key = key
+            group = [[table, columns, [], ck] for table, columns, _, ck in writes]
+        for merged, (_, _, records, _) in zip(group, writes):
+            merged[2].extend(records)
+        group_rows += n
+        frames += 1
+        rows += n
+    await flush()
+
+    elapsed = loop.time() - start
+    summary = {
+        "frames": frames,
+        "rows": rows,
+        "elapsed": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "max_lag": max_lag,
+    }
+    logger.info(
+        f"replayed {frames} frames, {rows} rows in {elapsed:.1f}s "
+        f"({summary['rows_per_sec']:.0f} rows/s), max lag behind schedule {max_lag:.3f}s"
+    )
+    return summary
@@ -0,0 +1,23 @@
+import hashlib
+import random
+import uuid
+
+
+def derive_seed(seed: int, *path) -> int:
+    """seed of an independent stream, e.g. derive_seed(seed, worker, "session", 12)"""
+    digest = hashlib.blake2b(repr((seed, *path)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def new_rng(seed: int | None, *path) -> random.Random:
+    """a stream for path, or an unseeded one when there is no run seed"""
+    if seed is None:
+        return random.Random()
+    return random.Random(derive_seed(seed, *path))
+
+
+def random_uuid(rng: random.Random | None = None) -> str:
+    """uuid4, drawn from rng when given so seeded runs get the same ids"""
+    if rng is None:
+        return str(uuid.uuid4())
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
@@ -0,0 +1,235 @@
+import csv
+import dataclasses
+import io
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import date, datetime
+from enum import Enum
+from typing import IO, Any
+
+from .database import Database, T
+from .models import Row
+
+SINK_KINDS = ("postgres", "jsonl", "csv", "null")
+
+
+class Sink(ABC):
+    """where generated rows end up"""
+
+    def __init__(self):
+        # rows accepted, keyed on lower case table name
+        self.rows_written: Counter[str] = Counter()
+
+    @abstractmethod
+    async def write(
+        self,
+        table: str,
+        data: list[dict | T],
+        conflict_keys: list[str] | None = None,
+    ) -> None:
+        pass
+
+    @abstractmethod
+    async def write_records(
+        self,
+        table: str,
+        columns: list[str],
+        records: list[tuple],
+        conflict_keys: list[str] | None = None,
+    ) -> None:
+        """same as write, for rows that are already tuples in columns order"""
+
+    async def write_atomic(self, writes: list[tuple[str, list[dict | T]]]) -> None:
+        """several tables that belong together, written in order"""
+        for table, data in writes:
+            await self.write(table, data)
+
+    async def write_atomic_records(
+        self, writes: list[tuple[str, list[str], list[tuple]]]
+    ) -> None:
+        """same as write_atomic, for (table, columns, records) already in tuples"""
+        for table, columns, records in writes:
+            await self.write_records(table, columns, records)
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresSink(Sink):
+    """upserts through Database, batches over bulk_threshold rows go over COPY"""
+
+    def __init__(self, db: Database, bulk_threshold: int = 1000):
+        super().__init__()
+        self.db = db
+        self.bulk_threshold = bulk_threshold
+        # counts live on the database, they include writes made outside the sink
+        self.rows_written = db.rows_written
+
+    async def write(self, table, data, conflict_keys=None):
+        if len(data) > self.bulk_threshold:
+            await self.db.bulk_upsert(
+                table=table, data=data, conflict_keys=conflict_keys
+            )
+        else:
+            await self.db.upsert(table=table, data=data, conflict_keys=conflict_keys)
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        if len(records) > self.bulk_threshold:
+            await self.db.bulk_upsert_records(
+                table=table,
+                columns=columns,
+                records=records,
+                conflict_keys=conflict_keys,
+            )
+        else:
+            await self.db.upsert_records(
+                table=table,
+                columns=columns,
+                records=records,
+                conflict_keys=conflict_keys,
+            )
+
+    async def write_atomic(self, writes):
+        await self.db.insert_atomic(writes)
+
+    async def write_atomic_records(self, writes):
+        await self.db.insert_atomic_records(writes)
+
+
+class NullSink(Sink):
+    """counts rows and drops them, for measuring the generator on its own"""
+
+    async def write(self, table, data, conflict_keys=None):
+        self.rows_written[table.lower()] += len(data)
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        self.rows_written[table.lower()] += len(records)
+
+
+class FileSink(Sink):
+    """
+    appends rows to <table>.jsonl or <table>.csv in directory, ignores conflict keys
+    """
+
+    def __init__(self, directory: str, fmt: str = "jsonl", buffer_size: int = 1 << 22):
+        super().__init__()
+        if fmt not in ("jsonl", "csv"):
+            raise ValueError(f"unknown file format {fmt}")
+        self.directory = directory
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._files: dict[str, IO[str]] = {}
+        self._columns: dict[str, list[str]] = {}
+        self._buffers: dict[str, io.StringIO] = {}
+
+    async def write(self, table, data, conflict_keys=None):
+        if not data:
+            return
+        if isinstance(data[0], Row):
+            columns = list(data[0].COLUMNS)
+            records = [d.values() for d in data]
+        elif dataclasses.is_dataclass(data[0]):
+            columns = list(data[0].__dataclass_fields__)
+            records = [tuple(getattr(d, col) for col in columns) for d in data]
+        else:
+            columns = list(data[0].keys())
+            records = [tuple(row.get(col) for col in columns) for row in data]
+        await self.write_records(table, columns, records)
+
+    async def write_records(self, table, columns, records, conflict_keys=None):
+        if not records:
+            return
+        table_name = table.lower()
+        buffer = self._buffer(table_name, columns)
+        if self.fmt == "jsonl":
+            for record in records:
+                buffer.write(json.dumps(dict(zip(columns, record)), default=_encode))
+                buffer.write("\n")
+        else:
+            csv.writer(buffer).writerows(
+                [_csv_value(value) for value in record] for record in records
+            )
+        self.rows_written[table_name] += len(records)
+        if buffer.tell() >= self.buffer_size:
+            self._flush(table_name)
+
+    async def close(self):
+        for table_name in list(self._files):
+            self._flush(table_name)
+            self._files[table_name].close()
+        self._files.clear()
+        self._buffers.clear()
+
+    def _buffer(self, table_name: str, columns: list[str]) -> io.StringIO:
+        known = self._columns.get(table_name)
+        if known is None:
+            path = os.path.join(self.directory, f"{table_name}.{self.fmt}")
+            fp = open(path, "a", newline="")
+            self._files[table_name] = fp
+            self._columns[table_name] = known = list(columns)
+            self._buffers[table_name] = io.StringIO()
+            if self.fmt == "csv" and fp.tell() == 0:
+                csv.writer(self._buffers[table_name]).writerow(columns)
+        elif self.fmt == "csv" and known != list(columns):
+            # a csv file has one header
+            raise ValueError(f"columns of {table_name} changed from {known}")
+        return self._buffers[table_name]
+
+    def _flush(self, table_name: str):
+        buffer = self._buffers[table_name]
+        if buffer.tell():
+            fp = self._files[table_name]
+            fp.write(buffer.getvalue())
+            fp.flush()
+            self._buffers[table_name] = io.StringIO()
+
+
+def _encode(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _csv_value(value: Any):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_encode)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def parse_sink(spec: str) -> tuple[str, str | None]:
+    """ "postgres", "null", "jsonl:DIR" or "csv:DIR" as (kind, directory)"""
+    kind, _, path = spec.partition(":")
+    if kind not in SINK_KINDS:
+        raise ValueError(
+            f"unknown sink {kind}, expected one of {', '.join(SINK_KINDS)}"
+        )
+    if kind in ("jsonl", "csv") and not path:
+        raise ValueError(f"{kind} sink needs a directory, {kind}:DIR")
+    if kind in ("postgres", "null") and path:
+        raise ValueError(f"{kind} sink takes no directory")
+    return kind, path or None
+
+
+def open_sink(
+    kind: str,
+    path: str | None = None,
+    db: Database | None = None,
+    bulk_threshold: int = 1000,
+) -> Sink:
+    if kind == "postgres":
+        if db is None:
+            raise ValueError("postgres sink needs a database connection")
+        return PostgresSink(db, bulk_threshold=bulk_threshold)
+    if kind == "null":
+        return NullSink()
+    return FileSink(path, fmt=kind)
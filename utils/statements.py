@@ -0,0 +1,31 @@
+from typing import Callable, Hashable
+
+
+class StatementCache:
+    """sql text per statement shape, a stable text lets asyncpg reuse its plan"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._queries: dict[Hashable, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def get(self, key: Hashable, build: Callable[[], str]) -> str:
+        query = self._queries.get(key)
+        if query is not None:
+            self.hits += 1
+            return query
+
+        self.misses += 1
+        query = build()
+        if len(self._queries) >= self.max_size:
+            # drop the oldest shape, dicts keep insertion order
+            self._queries.pop(next(iter(self._queries)))
+        self._queries[key] = query
+        return query
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
@@ -1,15 +1,39 @@
 from functools import wraps
+import inspect
 import time
 
+from .metrics import REGISTRY, MetricsRegistry
+
+
+def timeit(
+    func=None, *, name: str | None = None, metrics: MetricsRegistry | None = None
+):
+    """records call durations into function_seconds, @timeit or @timeit(name=...)"""
+    if func is None:
+        return lambda f: timeit(f, name=name, metrics=metrics)
+
+    histogram = (metrics or REGISTRY).histogram(
+        "function_seconds", "wall time per call", function=name or func.__qualname__
+    )
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_timeit_wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start_time)
+
+        return async_timeit_wrapper
 
-def timeit(func):
     @wraps(func)
     def timeit_wrapper(*args, **kwargs):
         start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        total_time = end_time - start_time
-        print(f"Function {func.__name__} Took {total_time:.10f} seconds")
-        return result
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start_time)
 
     return timeit_wrapper
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Coroutine
+
+
+class PendingWrites:
+    """writes that must complete even if the session that started them is cancelled"""
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return await asyncio.shield(task)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    async def drain(self, timeout: float | None = None) -> int:
+        """waits for pending writes, returns how many were cancelled at the deadline"""
+        if not self._tasks:
+            return 0
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return len(pending)